@@ -0,0 +1,77 @@
+# quantize_reward_model.py - Dynamic int8 reward model for CPU inference
+"""
+Quantize a trained reward model and report its accuracy drift on stored
+preference pairs
+
+Usage:
+    python quantize_reward_model.py reward_model.pth preference_pairs.jsonl [-o reward_model.int8.pth]
+
+Preference pairs are {"state", "preferred", "rejected"} objects as produced
+by DemonstrationCollector, one per line (.jsonl) or as a JSON list.
+"""
+import argparse
+import io
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from reward_model import (RewardModel, StateEncoder, ActionEncoder, quantize_reward_model,
+                          quantization_drift, logger)
+
+
+def load_pairs(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        if str(path).endswith('.jsonl'):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def state_dict_bytes(model):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dynamic int8 quantization of the RLHF reward model")
+    parser.add_argument('checkpoint', help="checkpoint written by RLHFTrainer.save_model")
+    parser.add_argument('pairs', help="preference pairs (.jsonl or JSON list) for the drift report")
+    parser.add_argument('-o', '--output', default=None, help="quantized state dict (default: <checkpoint>.int8.pth)")
+    args = parser.parse_args()
+    
+    checkpoint = torch.load(args.checkpoint, map_location='cpu')
+    weights = checkpoint['model_state_dict']
+    model = RewardModel(state_dim=weights['state_encoder.0.weight'].shape[1],
+                        action_dim=weights['action_encoder.0.weight'].shape[1],
+                        hidden_dim=weights['state_encoder.0.weight'].shape[0])
+    model.load_state_dict(weights)
+    
+    quantized = quantize_reward_model(model)
+    pairs = load_pairs(args.pairs)
+    report = quantization_drift(model, quantized, pairs)
+    
+    # Latency on one batch of the stored pairs (states, preferred actions), CPU
+    state_encoder, action_encoder = StateEncoder(), ActionEncoder()
+    states = torch.FloatTensor(np.array([state_encoder.encode(p['state']) for p in pairs]))
+    actions = torch.FloatTensor(np.array([action_encoder.encode(p['preferred']) for p in pairs]))
+    model_cpu = model.cpu().eval()
+    for name, candidate in (('fp32', model_cpu), ('int8', quantized)):
+        with torch.no_grad():
+            candidate(states, actions)
+            start = time.perf_counter()
+            for _ in range(20):
+                candidate(states, actions)
+        report[f'latency_ms_{name}'] = (time.perf_counter() - start) / 20 * 1e3
+        report[f'size_kb_{name}'] = state_dict_bytes(candidate) / 1024
+    
+    output = args.output or str(Path(args.checkpoint).with_suffix('.int8.pth'))
+    torch.save(quantized.state_dict(), output)
+    logger.info(f"Quantized reward model saved to {output}")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
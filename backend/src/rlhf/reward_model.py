@@ -4,6 +4,7 @@ import torch.nn as nn
 import torch.optim as optim
 import numpy as np
 from typing import Dict, List, Tuple
+import copy
 import json
 import logging
 from datetime import datetime
@@ -88,6 +89,62 @@ class RewardModel(nn.Module):
         return loss, preferred_rewards.mean(), rejected_rewards.mean()
 
 
+def quantize_reward_model(model: RewardModel) -> RewardModel:
+    """
+    Dynamic int8 copy of the reward model for CPU inference
+    Linear weights are stored as int8 and activations are quantized per
+    batch at run time, so no calibration pass is needed. The fp32 model is
+    left untouched.
+    """
+    model_cpu = copy.deepcopy(model).cpu().eval()
+    quantized = torch.ao.quantization.quantize_dynamic(model_cpu, {nn.Linear}, dtype=torch.qint8)
+    quantized.device = torch.device("cpu")
+    return quantized
+
+
+def load_quantized_reward_model(path, state_dim=657, action_dim=128, hidden_dim=256) -> RewardModel:
+    """
+    Load a state dict saved from quantize_reward_model's output
+    """
+    quantized = quantize_reward_model(RewardModel(state_dim, action_dim, hidden_dim))
+    quantized.load_state_dict(torch.load(path, map_location="cpu"))
+    return quantized
+
+
+def quantization_drift(model: RewardModel, quantized: RewardModel, preference_pairs: List[Dict]) -> Dict:
+    """
+    Compare a quantized reward model against its fp32 original on
+    preference pairs: preference accuracy of both, how often they rank a
+    pair the same way, and the absolute reward difference
+    """
+    state_encoder = StateEncoder()
+    action_encoder = ActionEncoder()
+    states = torch.FloatTensor(np.array([state_encoder.encode(p['state']) for p in preference_pairs]))
+    preferred = torch.FloatTensor(np.array([action_encoder.encode(p['preferred']) for p in preference_pairs]))
+    rejected = torch.FloatTensor(np.array([action_encoder.encode(p['rejected']) for p in preference_pairs]))
+    
+    was_training = model.training
+    model.eval()
+    with torch.no_grad():
+        fp32 = [model(states.to(model.device), actions.to(model.device)).cpu()
+                for actions in (preferred, rejected)]
+        int8 = [quantized(states, actions) for actions in (preferred, rejected)]
+    model.train(was_training)
+    
+    fp32_prefers = fp32[0] > fp32[1]
+    int8_prefers = int8[0] > int8[1]
+    reward_diff = torch.cat([(a - b).abs() for a, b in zip(fp32, int8)])
+    
+    return {
+        'pairs': len(preference_pairs),
+        'accuracy_fp32': fp32_prefers.float().mean().item(),
+        'accuracy_int8': int8_prefers.float().mean().item(),
+        'ranking_agreement': (fp32_prefers == int8_prefers).float().mean().item(),
+        'mean_abs_reward_diff': reward_diff.mean().item(),
+        'max_abs_reward_diff': reward_diff.max().item()
+    }
+
+
 class StateEncoder:
     """
     Encodes 3D scene state into fixed-size vector
@@ -0,0 +1,178 @@
+"""
+LOLA Intention Analyzer Benchmark
+Measures per-attempt cost of IntentionAnalyzer as history_size grows
+
+Usage:
+    python benchmarks/lola-analyzer-benchmark.py [section ...]
+"""
+
+import sys
+import time
+import subprocess
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_math_intent_system import IntentionAnalyzer, LatentRepresentation
+
+LATENT_DIM = 64
+
+
+def make_latents(n, seed=0):
+    """Noisy latents converging towards a fixed target"""
+    rng = np.random.default_rng(seed)
+    target = rng.standard_normal(LATENT_DIM)
+    types = ['shape', 'function', 'parametric']
+    latents = []
+    for i in range(n):
+        vector = target + rng.standard_normal(LATENT_DIM) / (1 + 0.05 * i)
+        latents.append(LatentRepresentation(
+            vector=vector / np.linalg.norm(vector),
+            compression_rate=256,
+            physical_properties={},
+            mathematical_type=types[i % 3 if i % 4 else 0]
+        ))
+    return latents
+
+
+# ---------------------------------------------------------------------------
+# Statistics: list + full recompute vs ring buffer + running statistics
+# ---------------------------------------------------------------------------
+
+def _legacy_statistics(history):
+    """Per-attempt work of the list-based analyzer, excluding clustering"""
+    vectors = np.array([a.vector for a in history])
+
+    distances = [np.linalg.norm(vectors[i] - vectors[i-1]) for i in range(1, len(vectors))]
+    decreasing = sum(1 for i in range(1, len(distances))
+                     if distances[i] < distances[i-1]) / max(1, len(distances) - 1)
+
+    weights = np.exp(np.linspace(-1, 0, len(vectors)))
+    weights /= weights.sum()
+    trend = np.average(vectors, axis=0, weights=weights) + 0.2 * (vectors[-1] - vectors[-5])
+
+    predicted = vectors[0].copy()
+    for i in range(1, len(vectors)):
+        predicted = 0.3 * vectors[i] + 0.7 * predicted
+
+    recent_std = np.mean(np.std(vectors[-5:], axis=0))
+    types = [a.mathematical_type for a in history]
+    return decreasing, trend, predicted, recent_std, max(set(types), key=types.count)
+
+
+def _new_statistics(analyzer):
+    convergence = analyzer._analyze_convergence()
+    trend = analyzer._analyze_trend()
+    return convergence, trend, analyzer._predict_target_latent(trend)
+
+
+def bench_statistics(n_attempts=500):
+    print(f"\n[statistics] add_attempt + analysis statistics per attempt "
+          f"({n_attempts} attempts, clustering excluded)")
+    print(f"  {'history':>7} {'legacy us':>10} {'ring us':>8} {'speedup':>8}")
+
+    latents = make_latents(n_attempts)
+    for history_size in [10, 100, 1000, 10000]:
+        history = []
+        start = time.perf_counter()
+        for latent in latents:
+            history.append(latent)
+            if len(history) > history_size:
+                history.pop(0)
+            if len(history) >= 5:
+                _legacy_statistics(history)
+        legacy = (time.perf_counter() - start) / n_attempts * 1e6
+
+        analyzer = IntentionAnalyzer(history_size=history_size, latent_dim=LATENT_DIM)
+        start = time.perf_counter()
+        for latent in latents:
+            analyzer.add_attempt(latent)
+            if analyzer._count >= 5:
+                _new_statistics(analyzer)
+        ring = (time.perf_counter() - start) / n_attempts * 1e6
+
+        print(f"  {history_size:>7} {legacy:>10.1f} {ring:>8.1f} {legacy / ring:>7.1f}x")
+
+
+# ---------------------------------------------------------------------------
+# Clustering: KMeans refit per attempt vs online k-means
+# ---------------------------------------------------------------------------
+
+def make_clustered_latents(n, seed=1):
+    """Latents drawn around three prototypes with unequal frequency"""
+    rng = np.random.default_rng(seed)
+    prototypes = rng.standard_normal((3, LATENT_DIM))
+    latents = []
+    for _ in range(n):
+        vector = prototypes[rng.choice(3, p=[0.6, 0.3, 0.1])] + 0.3 * rng.standard_normal(LATENT_DIM)
+        latents.append(LatentRepresentation(vector / np.linalg.norm(vector), 256, {}, 'shape'))
+    return latents
+
+
+def _first_analysis_ms(clustering):
+    """analyze_intent on a fresh interpreter, including lazy imports"""
+    code = (
+        "import sys, time; sys.path.insert(0, %r)\n"
+        "import numpy as np\n"
+        "from lola_math_intent_system import IntentionAnalyzer, LatentRepresentation\n"
+        "a = IntentionAnalyzer(clustering=%r)\n"
+        "for v in np.random.default_rng(0).standard_normal((10, 64)):\n"
+        "    a.add_attempt(LatentRepresentation(v, 256, {}, 'shape'))\n"
+        "t = time.perf_counter(); a.analyze_intent(); print((time.perf_counter() - t) * 1e3)\n"
+    ) % (str(ROOT / "src" / "lola-integration"), clustering)
+    return float(subprocess.run([sys.executable, "-c", code], capture_output=True,
+                                text=True, check=True).stdout)
+
+
+def bench_clustering(n_attempts=300, history_size=100):
+    print(f"\n[clustering] add_attempt + analyze_intent per attempt "
+          f"({n_attempts} attempts, history_size={history_size})")
+
+    latents = make_clustered_latents(n_attempts)
+    analyzers = {mode: IntentionAnalyzer(history_size=history_size, latent_dim=LATENT_DIM,
+                                         clustering=mode)
+                 for mode in ['kmeans', 'online']}
+    timings = {mode: 0.0 for mode in analyzers}
+    results = {mode: [] for mode in analyzers}
+
+    for latent in latents:
+        for mode, analyzer in analyzers.items():
+            start = time.perf_counter()
+            analyzer.add_attempt(latent)
+            result = analyzer.analyze_intent()
+            timings[mode] += time.perf_counter() - start
+            if result:
+                results[mode].append(result['clusters'])
+
+    for mode in analyzers:
+        print(f"  {mode:>7}: {timings[mode] / n_attempts * 1e3:8.3f} ms/attempt, "
+              f"first analysis {_first_analysis_ms(mode):8.1f} ms (cold process)")
+
+    same_sizes = np.mean([sorted(a['cluster_sizes']) == sorted(b['cluster_sizes'])
+                          for a, b in zip(results['kmeans'], results['online'])])
+    center_gap = [np.linalg.norm(a['main_cluster'] - b['main_cluster'])
+                  for a, b in zip(results['kmeans'], results['online'])]
+    print(f"  identical cluster sizes: {same_sizes:.0%} of analyses; "
+          f"main-cluster distance median {np.median(center_gap):.2e}, max {np.max(center_gap):.2f}")
+
+
+SECTIONS = {
+    'statistics': bench_statistics,
+    'clustering': bench_clustering,
+}
+
+
+def main():
+    selected = sys.argv[1:] or list(SECTIONS)
+    print("=" * 60)
+    print("  LOLA Intention Analyzer Benchmark")
+    print("=" * 60)
+    for name in selected:
+        SECTIONS[name]()
+
+
+if __name__ == '__main__':
+    main()
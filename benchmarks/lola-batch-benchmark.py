@@ -0,0 +1,126 @@
+"""
+LOLA Batch Ingestion Benchmark
+Measures encode_batch against per-stroke encode, and classroom replay
+through POST /attempts against one POST /attempt per stroke
+
+Usage:
+    python benchmarks/lola-batch-benchmark.py [n_students] [attempts_per_student]
+"""
+
+import sys
+import json
+import time
+import tempfile
+import threading
+import http.client
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_math_intent_system import (LOLAMathEncoder, LOLAMathematicalIntentSystem, LOLAMathServer,
+                                     LOLAMathHTTPServer, MathematicalStroke)
+
+DATA_DIR = ROOT / "lola_math_data"
+
+
+def load_strokes():
+    """Stroke payloads stored by LOLAMathematicalIntentSystem"""
+    strokes = []
+    for file in sorted(DATA_DIR.glob("session_*.json")):
+        with open(file, 'r') as f:
+            stroke = json.load(f)['stroke']
+        strokes.append({'points': stroke['points'], 'context': stroke['context']})
+    return strokes
+
+
+def make_stroke(rng, n_points):
+    """Noisy closed curve with per-segment velocity"""
+    t = np.linspace(0, 2 * np.pi, n_points)
+    radius = 1 + 0.2 * np.sin(rng.integers(2, 6) * t)
+    points = np.column_stack([radius * np.cos(t), radius * np.sin(t)]) + rng.normal(0, 0.005, (n_points, 2))
+    return MathematicalStroke(points.tolist(), 0.0, [], rng.random(n_points - 1).tolist(), 'geometry', 2)
+
+
+def bench_encoder(rng):
+    print("\n[encoder] strokes/s")
+    print(f"  {'points':>7} {'batch':>6} {'encode':>9} {'encode_batch':>13} {'speedup':>8}")
+    encoder = LOLAMathEncoder()
+    encoder.encode_batch([make_stroke(rng, 64)] * 2)  # warm-up (projection matrix, scipy import)
+
+    for n_points in [32, 64, 256]:
+        for batch in [16, 128]:
+            strokes = [make_stroke(rng, n_points) for _ in range(batch)]
+            start = time.perf_counter()
+            for stroke in strokes:
+                encoder.encode(stroke)
+            single = time.perf_counter() - start
+            start = time.perf_counter()
+            encoder.encode_batch(strokes)
+            batched = time.perf_counter() - start
+            print(f"  {n_points:>7} {batch:>6} {batch / single:>9.0f} {batch / batched:>13.0f} "
+                  f"{single / batched:>7.1f}x")
+
+
+def bench_replay(strokes, n_students, attempts_per_student):
+    total = n_students * attempts_per_student
+    print(f"\n[replay] {n_students} students x {attempts_per_student} attempts over HTTP "
+          f"({len(strokes)} stored strokes)")
+    print(f"  {'mode':<26} {'attempts/s':>11} {'speedup':>8}")
+
+    # Replay order: attempt by attempt across the class, as recorded
+    # (/attempt routes by session_id, /attempts by each stroke's client_id)
+    payloads = [dict(strokes[(s + a) % len(strokes)], session_id=f"student{s:03d}", client_id=f"student{s:03d}")
+                for a in range(attempts_per_student) for s in range(n_students)]
+
+    baseline = None
+    for label, batch in [('POST /attempt', None), ('POST /attempts x32', 32), ('POST /attempts x256', 256)]:
+        with tempfile.TemporaryDirectory() as tmp:
+            system = LOLAMathematicalIntentSystem(save_dir=tmp)
+            LOLAMathServer.set_system(system)
+            server = LOLAMathHTTPServer(('localhost', 0), LOLAMathServer)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            connection = http.client.HTTPConnection('localhost', server.server_address[1])
+            headers = {'Content-Type': 'application/json'}
+
+            start = time.perf_counter()
+            if batch is None:
+                for payload in payloads:
+                    connection.request('POST', '/attempt', json.dumps(payload), headers)
+                    response = connection.getresponse()
+                    response.read()
+                    assert response.status == 200
+                    connection.close()
+            else:
+                for i in range(0, total, batch):
+                    connection.request('POST', '/attempts', json.dumps({'strokes': payloads[i:i + batch]}), headers)
+                    response = connection.getresponse()
+                    results = json.loads(response.read())['results']
+                    assert response.status == 200 and len(results) == len(payloads[i:i + batch])
+                    connection.close()
+            elapsed = time.perf_counter() - start
+
+            server.shutdown()
+            system.close()
+
+        rate = total / elapsed
+        baseline = baseline or rate
+        print(f"  {label:<26} {rate:>11.0f} {rate / baseline:>7.1f}x")
+
+
+def main():
+    n_students = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    attempts_per_student = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rng = np.random.default_rng(0)
+
+    print("=" * 60)
+    print("  LOLA Batch Ingestion Benchmark")
+    print("=" * 60)
+    bench_encoder(rng)
+    bench_replay(load_strokes(), n_students, attempts_per_student)
+
+
+if __name__ == '__main__':
+    main()
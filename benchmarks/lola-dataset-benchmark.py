@@ -0,0 +1,92 @@
+"""
+LOLA Stroke Dataset Benchmark
+Measures how long training takes to get at every stroke: parsing the
+attempt log record by record versus opening the columnar dataset
+
+Usage:
+    python benchmarks/lola-dataset-benchmark.py [n_strokes] [points_per_stroke]
+"""
+
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_attempt_log import AttemptLog
+from lola_stroke_dataset import export_dataset, StrokeDataset
+
+LATENT_DIM = 64
+
+
+def make_records(rng, n_strokes, n_points):
+    """Attempt records in the shape written by LOLAMathematicalIntentSystem"""
+    for i in range(n_strokes):
+        points = np.cumsum(rng.normal(0, 0.01, (n_points, 2)), axis=0)
+        yield {
+            'session_id': f"{i // 20:08x}",
+            'client_id': 'student',
+            'attempt': i % 20 + 1,
+            'timestamp': 1.7e9 + i,
+            'stroke': {'points': points.tolist(), 'timestamp': 1.7e9 + i, 'pressure': [],
+                       'velocity': [], 'context': 'geometry', 'dimension': 2},
+            'input_points': n_points,
+            'latent_vector': rng.standard_normal(LATENT_DIM).tolist(),
+            'compression_rate': 256,
+            'properties': {'continuity': 1.0},
+            'type': 'shape'
+        }
+
+
+def main():
+    n_strokes = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    n_points = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+
+    print("=" * 60)
+    print("  LOLA Stroke Dataset Benchmark")
+    print(f"  {n_strokes} strokes x {n_points} points")
+    print("=" * 60)
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        log = AttemptLog(Path(tmp) / "attempt_log", max_segment_bytes=64 * 1024 * 1024)
+        records = make_records(rng, n_strokes, n_points)
+        while True:
+            batch = [record for _, record in zip(range(4096), records)]
+            if not batch:
+                break
+            log.append_many(batch)
+        log.flush()
+
+        # Attempt log: parse every record, keep strokes as Python lists
+        start = time.perf_counter()
+        strokes = [record['stroke'] for record in log.iter_records()]
+        n_log_points = sum(len(stroke['points']) for stroke in strokes)
+        log_load = time.perf_counter() - start
+        del strokes
+
+        start = time.perf_counter()
+        export_dataset(tmp, log=log)
+        export = time.perf_counter() - start
+        log.close()
+
+        # Columnar dataset: open memory-mapped, touch every stroke
+        start = time.perf_counter()
+        dataset = StrokeDataset(Path(tmp) / "stroke_dataset")
+        n_dataset_points = sum(len(dataset.stroke_points(i)) for i in range(len(dataset)))
+        checksum = float(dataset.points[:, 0].sum())
+        dataset_load = time.perf_counter() - start
+        assert n_dataset_points == n_log_points
+
+        size_mb = sum(p.stat().st_size for p in (Path(tmp) / "stroke_dataset").iterdir()) / 2**20
+        print(f"  attempt log parse:   {log_load:>8.2f} s")
+        print(f"  export (one-off):    {export:>8.2f} s   ({size_mb:.1f} MB, checksum {checksum:.1f})")
+        print(f"  dataset open + scan: {dataset_load:>8.2f} s   ({log_load / dataset_load:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+LOLA Decoder Cache Benchmark
+Measures decode() with and without the LRU memo, and /suggestion polling
+
+Usage:
+    python benchmarks/lola-decoder-benchmark.py [n_polls]
+"""
+
+import sys
+import json
+import time
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_math_intent_system import LOLAMathDecoder, LOLAMathematicalIntentSystem
+
+DATA_DIR = ROOT / "lola_math_data"
+PROPERTIES = {'continuity': 0.91, 'smoothness': 0.73, 'periodicity': 0.12,
+              'symmetry': {'reflection': 0.31, 'rotation': 0.18, 'rotation_order': 1}}
+
+
+def load_strokes():
+    strokes = []
+    for file in sorted(DATA_DIR.glob("session_*.json")):
+        with open(file, 'r') as f:
+            strokes.append({'points': json.load(f)['stroke']['points']})
+    return strokes
+
+
+def bench_decode(repeat=500):
+    print(f"\n[decode] per call, resolution=200 ({repeat} calls on one latent)")
+    print(f"  {'type':<11} {'uncached us':>12} {'hit us':>8} {'speedup':>8}")
+    latent = np.random.default_rng(0).standard_normal(64)
+    latent /= np.linalg.norm(latent)
+
+    for math_type in ['function', 'shape', 'parametric', 'surface']:
+        timings = []
+        for decoder in [LOLAMathDecoder(cache_size=0), LOLAMathDecoder()]:
+            decoder.decode(latent, math_type, PROPERTIES, 200)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                decoder.decode(latent, math_type, PROPERTIES, 200)
+            timings.append((time.perf_counter() - start) / repeat * 1e6)
+        print(f"  {math_type:<11} {timings[0]:>12.1f} {timings[1]:>8.1f} {timings[0] / timings[1]:>7.1f}x")
+
+
+def bench_polling(n_polls):
+    strokes = load_strokes()
+    print(f"\n[polling] GET /suggestion handler work, {n_polls} polls between attempts "
+          f"({len(strokes)} stored strokes)")
+    print(f"  {'mode':<22} {'per poll us':>12} {'decodes':>8}")
+
+    for label, cache_size, memo in [('recompute (before)', 0, False), ('memoized', 256, True)]:
+        with tempfile.TemporaryDirectory() as tmp:
+            system = LOLAMathematicalIntentSystem(save_dir=tmp, write_behind=False)
+            system.decoder = LOLAMathDecoder(cache_size=cache_size)
+            decodes = 0
+            original = system.decoder._decode
+
+            def counting_decode(*args):
+                nonlocal decodes
+                decodes += 1
+                return original(*args)
+            system.decoder._decode = counting_decode
+
+            elapsed, polls = 0.0, 0
+            for stroke in strokes[:8]:
+                system.add_drawing_attempt(stroke, 'student')
+                session = system.sessions.get('student')
+                session.last_suggestion = None  # exercise the regenerate path
+                for _ in range(n_polls):
+                    if not memo:
+                        session.polled_version = -1
+                    start = time.perf_counter()
+                    system.get_optimized_result('student')
+                    elapsed += time.perf_counter() - start
+                    polls += 1
+        print(f"  {label:<22} {elapsed / polls * 1e6:>12.1f} {decodes:>8}")
+
+
+def main():
+    n_polls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print("=" * 60)
+    print("  LOLA Decoder Cache Benchmark")
+    print("=" * 60)
+    bench_decode()
+    bench_polling(n_polls)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+LOLA v2 Diffusion Sampling Benchmark
+Measures suggestion sampling latency against sample quality: the legacy
+five sequential 100-step DDPM chains, one batched DDPM chain, and batched
+DDIM at a few step counts
+
+The diffusion model is first fitted on clustered synthetic latents, so
+quality is the mean distance of a sample to its nearest cluster centre
+(lower is better; the noise floor of the training data is printed too).
+
+Usage:
+    python benchmarks/lola-diffusion-benchmark.py [train_iterations]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_v2_enhanced import DiffusionModel
+
+LATENT_DIM = 64
+N_CENTRES = 8
+N_CANDIDATES = 5
+NOISE = 0.05
+
+
+def _legacy_sample(diffusion, shape):
+    """LOLAv2IntentSystem.analyze_intent before batching: one chain per candidate"""
+    return torch.stack([diffusion.sample(shape, 'cpu') for _ in range(N_CANDIDATES)])
+
+
+def fit(diffusion, centres, iterations):
+    """Standard epsilon-prediction training on noisy copies of the centres"""
+    optimizer = torch.optim.Adam(diffusion.parameters(), lr=1e-3)
+    diffusion.train()
+    for _ in range(iterations):
+        x0 = centres[torch.randint(N_CENTRES, (128,))] + NOISE * torch.randn(128, LATENT_DIM, 1, 1)
+        t = torch.randint(diffusion.num_steps, (128,))
+        noise = torch.randn_like(x0)
+        alpha = diffusion.alphas_cumprod[t].view(-1, 1, 1, 1)
+        xt = alpha.sqrt() * x0 + (1 - alpha).sqrt() * noise
+        loss = ((diffusion.predict_noise(xt, t) - noise) ** 2).mean()
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+    diffusion.eval()
+    return loss.item()
+
+
+def centre_distance(samples, centres):
+    """Mean RMS distance of each sample to its nearest centre"""
+    flat = samples.reshape(-1, LATENT_DIM)
+    return torch.cdist(flat, centres.reshape(N_CENTRES, LATENT_DIM)).min(dim=1).values.mean().item() / LATENT_DIM ** 0.5
+
+
+def timeit(fn, repeat):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+    torch.manual_seed(0)
+
+    centres = torch.randn(N_CENTRES, LATENT_DIM, 1, 1)
+    diffusion = DiffusionModel(latent_channels=LATENT_DIM, hidden_dim=256, num_steps=100)
+
+    print("=" * 60)
+    print("  LOLA v2 Diffusion Sampling Benchmark")
+    print(f"  {N_CANDIDATES} candidates of ({LATENT_DIM}, 1, 1), num_steps={diffusion.num_steps}, one thread for sampling")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    loss = fit(diffusion, centres, iterations)
+    print(f"  fitted in {time.perf_counter() - start:.1f} s ({iterations} iterations, final loss {loss:.3f})")
+    print(f"  training data distance: {NOISE:.3f}, untrained (pure noise): "
+          f"{centre_distance(torch.randn(256, LATENT_DIM), centres):.3f}")
+    torch.set_num_threads(1)
+    print(f"  {'sampler':<20} {'ms':>9} {'speedup':>8} {'distance':>9}")
+
+    shape = (N_CANDIDATES, LATENT_DIM, 1, 1)
+    samplers = [
+        ('5 x DDPM-100', lambda: _legacy_sample(diffusion, (1, LATENT_DIM, 1, 1))),
+        ('batched DDPM-100', lambda: diffusion.sample(shape, 'cpu')),
+    ] + [
+        (f'batched DDIM-{steps}', lambda steps=steps: diffusion.sample_ddim(shape, 'cpu', steps=steps))
+        for steps in (50, 20, 10, 5)
+    ]
+
+    baseline = None
+    for name, sample in samplers:
+        ms = timeit(sample, 10)
+        baseline = baseline or ms
+        distance = sum(centre_distance(sample(), centres) for _ in range(40)) / 40
+        print(f"  {name:<20} {ms:>9.2f} {baseline / ms:>7.1f}x {distance:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
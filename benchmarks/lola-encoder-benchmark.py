@@ -0,0 +1,264 @@
+"""
+LOLA Math Encoder Benchmark
+Measures per-encode cost of LOLAMathEncoder stages on synthetic and stored strokes
+
+Usage:
+    python benchmarks/lola-encoder-benchmark.py [section ...]
+"""
+
+import sys
+import json
+import time
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_math_intent_system import LOLAMathEncoder, MathematicalStroke
+from lola_stroke_preprocessing import StrokePreprocessor
+
+DATA_DIR = ROOT / "lola_math_data"
+
+
+def timeit(fn, repeat=200):
+    """Return mean wall time per call in microseconds"""
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def load_stroke_points():
+    """Load stroke point arrays stored by LOLAMathematicalIntentSystem"""
+    strokes = []
+    for file in sorted(DATA_DIR.glob("session_*.json")):
+        with open(file, 'r') as f:
+            strokes.append(np.array(json.load(f)['stroke']['points']))
+    return strokes
+
+
+def densify(points, factor):
+    """Linearly upsample a stroke to emulate a high-rate stylus"""
+    t = np.arange(len(points))
+    t_fine = np.linspace(0, len(points) - 1, (len(points) - 1) * factor + 1)
+    jitter = np.random.default_rng(0).normal(0, 1e-3, (len(t_fine), 2))
+    return np.column_stack([np.interp(t_fine, t, points[:, 0]),
+                            np.interp(t_fine, t, points[:, 1])]) + jitter
+
+
+# ---------------------------------------------------------------------------
+# Projection: fresh random matrix per encode vs cached seeded projection
+# ---------------------------------------------------------------------------
+
+def _legacy_compress(features, latent_dim):
+    projection = np.random.randn(latent_dim, len(features))
+    projection /= np.linalg.norm(projection, axis=1, keepdims=True)
+    latent = projection @ features
+    return latent / (np.linalg.norm(latent) + 1e-8)
+
+
+def bench_projection():
+    print("\n[projection] _compress_features per call")
+    print(f"  {'latent':>6} {'features':>8} {'legacy us':>10} {'cached us':>10} {'speedup':>8}")
+
+    for latent_dim, n_features in [(16, 32), (16, 37), (64, 256), (64, 1024)]:
+        encoder = LOLAMathEncoder(latent_dim=latent_dim)
+        features = np.random.default_rng(0).standard_normal(n_features)
+
+        legacy = timeit(lambda: _legacy_compress(features, latent_dim))
+        cached = timeit(lambda: encoder._compress_features(features))
+        print(f"  {latent_dim:>6} {n_features:>8} {legacy:>10.1f} {cached:>10.1f} {legacy / cached:>7.1f}x")
+
+    # Stability: identical latents from independent encoders ("restarts")
+    features = np.random.default_rng(1).standard_normal(37)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "encoder_projections.npz"
+        first = LOLAMathEncoder(latent_dim=16, projection_path=path)._compress_features(features)
+        restarted = LOLAMathEncoder(latent_dim=16, projection_path=path)
+        loaded = len(restarted._projections)
+        second = restarted._compress_features(features)
+    legacy_drift = np.linalg.norm(_legacy_compress(features, 16) - _legacy_compress(features, 16))
+
+    print(f"  restart drift (cached): {np.linalg.norm(first - second):.2e} "
+          f"({loaded} projection(s) loaded from disk)")
+    print(f"  repeat drift (legacy):  {legacy_drift:.2e}")
+
+
+# ---------------------------------------------------------------------------
+# Kernels: Python-loop curvature / periodicity vs vectorized NumPy
+# ---------------------------------------------------------------------------
+
+def _legacy_curvature(points):
+    curvatures = []
+    for i in range(1, len(points) - 1):
+        p1, p2, p3 = points[i-1], points[i], points[i+1]
+        area = 0.5 * np.abs((p2[0] - p1[0]) * (p3[1] - p1[1]) -
+                           (p3[0] - p1[0]) * (p2[1] - p1[1]))
+        d12 = np.linalg.norm(p2 - p1)
+        d23 = np.linalg.norm(p3 - p2)
+        d13 = np.linalg.norm(p3 - p1)
+        if d12 * d23 * d13 > 0:
+            curvatures.append(4 * area / (d12 * d23 * d13))
+        else:
+            curvatures.append(0.0)
+    return np.array([np.mean(curvatures), np.std(curvatures), np.max(curvatures)])
+
+
+def _legacy_periodicity(points):
+    y_values = points[:, 1]
+    autocorr = np.correlate(y_values, y_values, mode='full')
+    autocorr = autocorr[len(autocorr)//2:]
+    peaks = []
+    for i in range(1, len(autocorr) - 1):
+        if autocorr[i] > autocorr[i-1] and autocorr[i] > autocorr[i+1]:
+            peaks.append(i)
+    if len(peaks) > 1:
+        return 1.0 / (1.0 + np.std(np.diff(peaks)))
+    return 0.0
+
+
+def bench_kernels():
+    encoder = LOLAMathEncoder()
+    stored = load_stroke_points()
+    if not stored:
+        print(f"\n[kernels] No strokes found in {DATA_DIR}")
+        return
+
+    print(f"\n[kernels] {len(stored)} stored strokes from {DATA_DIR.name}/, "
+          "upsampled to emulate dense input")
+    print(f"  {'points':>7} {'kernel':>12} {'legacy us':>10} {'vector us':>10} "
+          f"{'speedup':>8} {'max |diff|':>11}")
+
+    for factor in [1, 4, 16, 64]:
+        strokes = [densify(p, factor) if factor > 1 else p for p in stored]
+        mean_points = int(np.mean([len(p) for p in strokes]))
+        repeat = max(3, 200 // factor)
+
+        for name, legacy, vectorized in [
+            ('curvature', _legacy_curvature, encoder._compute_curvature),
+            ('periodicity', _legacy_periodicity, encoder._detect_periodicity),
+        ]:
+            diff = max(float(np.max(np.abs(legacy(p) - vectorized(p)))) for p in strokes)
+            t_legacy = timeit(lambda: [legacy(p) for p in strokes], repeat) / len(strokes)
+            t_vector = timeit(lambda: [vectorized(p) for p in strokes], repeat) / len(strokes)
+            print(f"  {mean_points:>7} {name:>12} {t_legacy:>10.1f} {t_vector:>10.1f} "
+                  f"{t_legacy / t_vector:>7.1f}x {diff:>11.2e}")
+
+
+# ---------------------------------------------------------------------------
+# Symmetry: dense n x n distance tensor vs KD-tree nearest neighbour
+# ---------------------------------------------------------------------------
+
+def _legacy_reflection(points):
+    centered = points - np.mean(points, axis=0)
+    flipped_x = centered.copy()
+    flipped_x[:, 0] = -flipped_x[:, 0]
+    return 1.0 / (1.0 + np.mean(np.min(
+        np.linalg.norm(centered[:, np.newaxis] - flipped_x[np.newaxis, :], axis=2),
+        axis=1
+    )))
+
+
+def measure(fn, repeat):
+    """Return (mean time in ms, peak traced memory in MB) for fn"""
+    fn()  # warm-up (lazy imports)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return timeit(fn, repeat) / 1000, peak
+
+
+def bench_symmetry(max_legacy_points=4000):
+    encoder = LOLAMathEncoder()
+    rng = np.random.default_rng(0)
+
+    print("\n[symmetry] _detect_symmetry on noisy rose curves "
+          f"(legacy reflection skipped above {max_legacy_points} points)")
+    print(f"  {'points':>6} {'legacy ms':>10} {'legacy MB':>10} {'new ms':>8} {'new MB':>7} "
+          f"{'reflection':>10} {'rotation':>9} {'order':>5}")
+
+    for n in [100, 500, 1000, 2500, 5000, 10000]:
+        # 3-petal rose: rotationally symmetric of order 3
+        t = np.linspace(0, np.pi, n)
+        r = np.cos(3 * t)
+        points = np.column_stack([r * np.cos(t), r * np.sin(t)]) + rng.normal(0, 1e-3, (n, 2))
+        repeat = max(1, 2000 // n)
+
+        new_ms, new_mb = measure(lambda: encoder._detect_symmetry(points), repeat)
+        result = encoder._detect_symmetry(points)
+
+        if n <= max_legacy_points:
+            legacy_ms, legacy_mb = measure(lambda: _legacy_reflection(points), repeat)
+            assert abs(_legacy_reflection(points) - result['reflection']) < 1e-9
+            legacy = f"{legacy_ms:>10.2f} {legacy_mb:>10.1f}"
+        else:
+            legacy = f"{'-':>10} {n * n * 2 * 8 / 2**20:>9.0f}*"
+
+        print(f"  {n:>6} {legacy} {new_ms:>8.2f} {new_mb:>7.2f} "
+              f"{result['reflection']:>10.4f} {result['rotation']:>9.4f} {result['rotation_order']:>5}")
+
+    print("  * estimated size of the n x n x 2 difference tensor alone")
+
+
+# ---------------------------------------------------------------------------
+# Preprocessing: raw dense strokes vs RDP / arc-length resampling before encode
+# ---------------------------------------------------------------------------
+
+def bench_preprocessing(n_points=256):
+    encoder = LOLAMathEncoder()
+    stored = load_stroke_points()
+    if not stored:
+        print(f"\n[preprocessing] No strokes found in {DATA_DIR}")
+        return
+
+    print(f"\n[preprocessing] encode per stroke, {len(stored)} stored strokes upsampled "
+          f"(resample to {n_points})")
+    print(f"  {'points':>7} {'method':>13} {'kept':>6} {'ratio':>7} {'encode ms':>10} "
+          f"{'speedup':>8} {'latent cos':>10}")
+
+    def encode(points):
+        return encoder.encode(MathematicalStroke(points.tolist(), 0.0, [], [], 'geometry', 2))
+
+    for factor in [1, 16, 64, 256]:
+        strokes = [densify(p, factor) if factor > 1 else p for p in stored]
+        mean_points = int(np.mean([len(p) for p in strokes]))
+        repeat = max(1, 64 // factor)
+        raw_latents = [encode(p).vector for p in strokes]
+        raw_ms = timeit(lambda: [encode(p) for p in strokes], repeat) / len(strokes) / 1000
+
+        for method in ['none', 'rdp', 'resample', 'rdp+resample']:
+            preprocessor = StrokePreprocessor(method, n_points=n_points)
+            run = lambda: [encode(preprocessor.process(p)[0]) for p in strokes]
+            ms = timeit(run, repeat) / len(strokes) / 1000
+            latents = [encode(preprocessor.process(p)[0]).vector for p in strokes]
+            cosine = np.mean([a @ b for a, b in zip(raw_latents, latents)])
+            kept = np.mean([len(preprocessor.process(p)[0]) for p in strokes])
+            print(f"  {mean_points:>7} {method:>13} {kept:>6.0f} {mean_points / kept:>6.1f}x "
+                  f"{ms:>10.2f} {raw_ms / ms:>7.1f}x {cosine:>10.4f}")
+
+
+SECTIONS = {
+    'projection': bench_projection,
+    'kernels': bench_kernels,
+    'symmetry': bench_symmetry,
+    'preprocessing': bench_preprocessing,
+}
+
+
+def main():
+    selected = sys.argv[1:] or list(SECTIONS)
+    print("=" * 60)
+    print("  LOLA Math Encoder Benchmark")
+    print("=" * 60)
+    for name in selected:
+        SECTIONS[name]()
+
+
+if __name__ == '__main__':
+    main()
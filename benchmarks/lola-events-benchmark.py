@@ -0,0 +1,139 @@
+"""
+LOLA Suggestion Push Benchmark
+Measures how long a suggestion takes to reach the front-end, and how many
+requests that costs, with GET /suggestion polling versus GET /events (SSE)
+
+Usage:
+    python benchmarks/lola-events-benchmark.py [n_students] [poll_interval_ms]
+"""
+
+import sys
+import json
+import time
+import tempfile
+import threading
+import http.client
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_math_intent_system import LOLAMathematicalIntentSystem, LOLAMathServer, LOLAMathHTTPServer
+
+
+def converging_strokes(rng, n_attempts=6):
+    """Circle drawn with shrinking noise: confident suggestion after 5 attempts"""
+    t = np.linspace(0, 2 * np.pi, 100)
+    circle = np.column_stack([np.cos(t), np.sin(t)])
+    return [{'points': (circle + rng.normal(0, 0.3 / (i + 1), circle.shape)).tolist()}
+            for i in range(n_attempts)]
+
+
+def poller(port, client_id, interval, received, requests, stop):
+    """Front-end polling /suggestion (with If-None-Match) until the pushed one arrives"""
+    etag = None
+    connection = http.client.HTTPConnection('localhost', port)
+    while not stop.is_set():
+        headers = {'X-Session-Id': client_id}
+        if etag:
+            headers['If-None-Match'] = etag
+        connection.request('GET', '/suggestion', headers=headers)
+        response = connection.getresponse()
+        body = response.read()
+        connection.close()
+        requests[client_id] = requests.get(client_id, 0) + 1
+        etag = response.getheader('ETag')
+        # Tags of low-confidence polled results end in -a<version>
+        if response.status == 200 and body != b'{}' and '-a' not in etag:
+            received[client_id] = time.perf_counter()
+            return
+        time.sleep(interval)
+
+
+def subscriber(port, client_id, received, requests, ready):
+    """Front-end holding a /events stream open until the first suggestion"""
+    connection = http.client.HTTPConnection('localhost', port)
+    connection.request('GET', '/events', headers={'X-Session-Id': client_id})
+    response = connection.getresponse()
+    requests[client_id] = 1
+    ready.release()
+    while True:
+        line = response.fp.readline()
+        if not line:
+            return  # server closed the stream
+        if line.startswith(b'data: '):
+            received[client_id] = time.perf_counter()
+            connection.close()
+            return
+
+
+def run(mode, n_students, interval):
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        system = LOLAMathematicalIntentSystem(save_dir=tmp)
+        LOLAMathServer.set_system(system)
+        server = LOLAMathHTTPServer(('localhost', 0), LOLAMathServer)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+
+        produced, received, requests = {}, {}, {}
+        stop = threading.Event()
+        ready = threading.Semaphore(0)
+        clients = {}
+        for s in range(n_students):
+            client_id = f"student{s:03d}"
+            system.reset_session(client_id)  # enrolled: reads of unknown sessions get 404
+            if mode == 'poll':
+                target, args = poller, (port, client_id, interval, received, requests, stop)
+            else:
+                target, args = subscriber, (port, client_id, received, requests, ready)
+            clients[client_id] = threading.Thread(target=target, args=args, daemon=True)
+            clients[client_id].start()
+        if mode == 'sse':
+            for _ in clients:
+                ready.acquire()
+
+        # Students draw; a suggestion counts as produced when the attempt
+        # that produced it was sent (SSE delivers before that response ends)
+        connection = http.client.HTTPConnection('localhost', port)
+        for client_id in clients:
+            for stroke in converging_strokes(rng):
+                sent = time.perf_counter()
+                connection.request('POST', '/attempt', json.dumps(stroke), {'X-Session-Id': client_id})
+                response = connection.getresponse()
+                body = json.loads(response.read())
+                connection.close()
+                if 'suggestion' in body and client_id not in produced:
+                    produced[client_id] = sent
+
+        for client_id in produced:
+            clients[client_id].join(10)
+        stop.set()
+        server.shutdown()
+        system.close()
+        for client in clients.values():
+            client.join(10)
+
+    delays = np.array([received[client_id] - produced[client_id] for client_id in received]) * 1e3
+    return delays, len(produced), sum(requests.values())
+
+
+def main():
+    n_students = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    interval_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    print("=" * 60)
+    print("  LOLA Suggestion Push Benchmark")
+    print(f"  {n_students} students, polling every {interval_ms:.0f} ms")
+    print("=" * 60)
+    print(f"  {'mode':<22} {'delivered':>10} {'p50 ms':>8} {'max ms':>8} {'requests':>9}")
+    for label, mode in [('GET /suggestion poll', 'poll'), ('GET /events (SSE)', 'sse')]:
+        delays, produced, requests = run(mode, n_students, interval_ms / 1e3)
+        print(f"  {label:<22} {len(delays):>4} / {produced:<3} {np.percentile(delays, 50):>8.2f} "
+              f"{delays.max():>8.2f} {requests:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+LOLA v2 Attempt History Benchmark
+Measures memory retained and per-attempt record + analysis cost over a
+teaching day of attempts: the unbounded latent / stroke lists with
+torch.stack over the last ten, against the ring buffer with running
+statistics in LOLAv2IntentSystem
+
+Usage:
+    python benchmarks/lola-history-benchmark.py [attempts] [points_per_stroke]
+"""
+
+import sys
+import time
+import tracemalloc
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import torch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_v2_enhanced import LOLAv2IntentSystem
+
+BATCH = 16  # latents arrive as views into micro-batched encoder outputs
+
+
+class _LegacyHistory:
+    """latent_history / attempt_history lists and the statistics analyze_intent took from them"""
+
+    def __init__(self):
+        self.attempt_history = []
+        self.latent_history = []
+
+    def add_attempt(self, latent, stroke_data):
+        self.latent_history.append(latent)
+        self.attempt_history.append(stroke_data)
+
+    def analyze(self, min_attempts=5):
+        if len(self.latent_history) < min_attempts:
+            return None
+        latents = torch.stack(self.latent_history[-10:])
+        return latents.mean(0), 1.0 / (1.0 + latents.std(0).mean().item())
+
+
+class _RingHistory:
+    def __init__(self, system):
+        self.system = system
+
+    def add_attempt(self, latent, stroke_data):
+        self.system.add_attempt(latent, stroke_data)
+
+    def analyze(self, min_attempts=5):
+        # analyze_intent's statistics, without the diffusion sampling
+        if self.system._count < min_attempts:
+            return None
+        mean, std = self.system.latent_statistics()
+        return mean, 1.0 / (1.0 + std.mean().item())
+
+
+def tensor_bytes(tensors):
+    storages = {t.untyped_storage().data_ptr(): t.untyped_storage().nbytes() for t in tensors}
+    return sum(storages.values())
+
+
+def run(history, shape, attempts, n_points, checkpoints, trace):
+    """Per checkpoint: traced Python MB (trace=True) or mean us/attempt over the last 500"""
+    rng = np.random.default_rng(0)
+    if trace:
+        tracemalloc.start()
+    times, rows = deque(maxlen=500), []
+    for i in range(attempts):
+        # Parsed request bodies: fresh Python lists every attempt
+        stroke = rng.random((n_points, 2)).tolist()
+        batch = torch.randn((BATCH,) + shape)
+        start = time.perf_counter()
+        history.add_attempt(batch[i % BATCH:i % BATCH + 1], {'points': stroke})
+        history.analyze()
+        times.append(time.perf_counter() - start)
+        if i + 1 in checkpoints:
+            rows.append(tracemalloc.get_traced_memory()[0] / 2**20 if trace else np.mean(times) * 1e6)
+    if trace:
+        tracemalloc.stop()
+    return rows
+
+
+def main():
+    attempts = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_points = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    torch.set_num_threads(1)
+
+    system = LOLAv2IntentSystem(compression_factor=256, device='cpu')
+    shape = tuple(system.backend.encode(torch.zeros(1, 2, 64, 64)).shape[1:])
+    checkpoints = sorted({attempts // 10, attempts // 2, attempts})
+
+    print("=" * 60)
+    print("  LOLA v2 Attempt History Benchmark")
+    print(f"  {attempts} attempts x {n_points} points, latent {shape}")
+    print("=" * 60)
+    print(f"  {'history':<8} {'attempts':>9} {'python MB':>10} {'latent MB':>10} {'us/attempt':>11}")
+
+    def legacy():
+        return _LegacyHistory()
+
+    def ring():
+        return _RingHistory(LOLAv2IntentSystem(compression_factor=256, device='cpu'))
+
+    for name, make_history in (('legacy', legacy), ('ring', ring)):
+        micros = run(make_history(), shape, attempts, n_points, checkpoints, trace=False)
+        history = make_history()
+        python_mb = run(history, shape, attempts, n_points, checkpoints, trace=True)
+        if name == 'legacy':
+            # Every kept latent pins the batch tensor it is a view of
+            latent_mb = tensor_bytes(history.latent_history) / 2**20
+        else:
+            latent_mb = (history.system._latents.numel() + 2 * history.system._sum.numel()) * 8 / 2**20
+        for i, n in enumerate(checkpoints):
+            latent = f"{latent_mb:>10.3f}" if n == attempts else f"{'':>10}"
+            print(f"  {name:<8} {n:>9} {python_mb[i]:>10.1f} {latent} {micros[i]:>11.1f}")
+        del history
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+LOLA Latent Index Benchmark
+Measures add throughput, query latency and recall@k of the LSH latent
+index against an exact scan, on clustered unit-norm latents
+
+Usage:
+    python benchmarks/lola-index-benchmark.py [n_latents] [n_queries]
+"""
+
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_latent_index import LatentIndex
+
+LATENT_DIM = 64
+N_SHAPES = 5000  # distinct drawings the students attempt
+K = 10
+
+
+def clustered_latents(rng, centers, n, noise=0.4):
+    """Noisy unit-norm variants of randomly chosen shape latents"""
+    labels = rng.integers(len(centers), size=n)
+    latents = centers[labels] + rng.normal(0, noise / np.sqrt(LATENT_DIM), (n, LATENT_DIM))
+    return (latents / np.linalg.norm(latents, axis=1, keepdims=True)).astype(np.float32)
+
+
+def main():
+    n_latents = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((N_SHAPES, LATENT_DIM))
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    latents = clustered_latents(rng, centers, n_latents)
+    queries = clustered_latents(rng, centers, n_queries)
+    sessions = [f"s{i // 20:07d}" for i in range(n_latents)]
+
+    print("=" * 60)
+    print("  LOLA Latent Index Benchmark")
+    print(f"  {n_latents} latents, {n_queries} queries, k={K}")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LatentIndex(Path(tmp) / "latent_index", dim=LATENT_DIM)
+
+        # Saved attempts arrive one at a time
+        n_single = min(n_latents, 20000)
+        start = time.perf_counter()
+        for i in range(n_single):
+            index.add(latents[i], sessions[i], i % 20 + 1, 'shape')
+        single = time.perf_counter() - start
+        start = time.perf_counter()
+        for lo in range(n_single, n_latents, 4096):
+            hi = min(lo + 4096, n_latents)
+            index.add_many(latents[lo:hi], sessions[lo:hi], [i % 20 + 1 for i in range(lo, hi)],
+                           ['shape'] * (hi - lo))
+        bulk = time.perf_counter() - start
+        print(f"  add:      {n_single / single:>10.0f} latents/s one by one, "
+              f"{(n_latents - n_single) / max(bulk, 1e-9):>10.0f} latents/s in batches of 4096")
+
+        index.flush()
+        start = time.perf_counter()
+        reopened = LatentIndex(Path(tmp) / "latent_index", dim=LATENT_DIM)
+        print(f"  reopen:   {time.perf_counter() - start:>10.2f} s")
+        reopened.close()
+
+        # Timed in separate loops: exact scans would evict the index from cache
+        approx_ms, found = [], []
+        for query in queries:
+            start = time.perf_counter()
+            found.append(index.query(query, k=K))
+            approx_ms.append(time.perf_counter() - start)
+
+        exact_ms, recall = [], []
+        for query, neighbours in zip(queries, found):
+            start = time.perf_counter()
+            exact = np.argpartition(np.linalg.norm(latents - query, axis=1), K)[:K]
+            exact_ms.append(time.perf_counter() - start)
+
+            exact_keys = {(sessions[i], i % 20 + 1) for i in exact}
+            recall.append(len(exact_keys & {(n['session_id'], n['attempt']) for n in neighbours}) / K)
+
+        approx_ms, exact_ms = np.array(approx_ms) * 1e3, np.array(exact_ms) * 1e3
+        metrics = index.metrics()
+        print(f"  {'query':<10} {'p50 ms':>8} {'p99 ms':>8}")
+        print(f"  {'LSH':<10} {np.percentile(approx_ms, 50):>8.3f} {np.percentile(approx_ms, 99):>8.3f}"
+              f"   recall@{K} {np.mean(recall):.3f}, {metrics['mean_candidates']:.0f} candidates")
+        print(f"  {'exact':<10} {np.percentile(exact_ms, 50):>8.3f} {np.percentile(exact_ms, 99):>8.3f}")
+        index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+LOLA v2 Inference Backend Benchmark
+Measures encode, denoise, decode and a whole suggestion (encode + batched
+DDIM + decode) on CPU: the legacy eager calls under torch.no_grad against
+the eval-mode eager backend, TorchScript and ONNX Runtime
+
+Usage:
+    python benchmarks/lola-inference-benchmark.py [threads] [compression_factor]
+"""
+
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import torch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_v2_enhanced import LOLAv2IntentSystem
+from lola_v2_inference import export_models, make_backend
+
+
+class _LegacyInference:
+    """encode / decode / denoise as the system called them: torch.no_grad, sampled z"""
+
+    name = 'no_grad (legacy)'
+
+    def __init__(self, system):
+        self.vae, self.diffusion = system.vae, system.diffusion
+
+    @torch.no_grad()
+    def encode(self, images):
+        return self.vae.encode(images)
+
+    @torch.no_grad()
+    def decode(self, latents):
+        return self.vae.decode(latents)
+
+    @torch.no_grad()
+    def predict_noise(self, x, t):
+        return self.diffusion.predict_noise(x, t)
+
+
+def timeit(fn, repeat):
+    fn()  # warm-up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1e3
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    compression = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    torch.manual_seed(0)
+    torch.set_num_threads(threads)
+
+    system = LOLAv2IntentSystem(compression_factor=compression, device='cpu', num_threads=threads)
+    # Batch-1 BatchNorm cannot run in train mode, so the legacy path is timed in eval mode too
+    system.vae.eval()
+    system.diffusion.eval()
+
+    images = system.stroke_to_tensor(np.random.default_rng(0).random((64, 2)) * 0.8 + 0.1)
+    latent = system.backend.encode(images)
+    candidates = latent.expand(system.n_candidates, -1, -1, -1).contiguous()
+    timesteps = torch.full((system.n_candidates,), 50, dtype=torch.long)
+
+    print("=" * 60)
+    print("  LOLA v2 Inference Backend Benchmark")
+    print(f"  compression {compression}x, latent {tuple(latent.shape[1:])}, {threads} threads, "
+          f"{system.n_candidates} candidates x DDIM-{system.sampling_steps}")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        export_models(system, Path(tmp) / "inference")
+        print(f"  export (onnx + torchscript): {time.perf_counter() - start:.1f} s")
+
+        backends = [_LegacyInference(system)] + [
+            make_backend(name, system, Path(tmp) / "inference", threads)
+            for name in ('eager', 'torchscript', 'onnx')
+        ]
+
+        print(f"  {'backend':<18} {'encode':>8} {'denoise':>8} {'decode':>8} {'suggest':>9}  (ms)")
+        baseline = None
+        for backend in backends:
+            def suggest():
+                z = backend.encode(images)
+                samples = system.diffusion.sample_ddim((system.n_candidates,) + tuple(z.shape[1:]), 'cpu',
+                                                       steps=system.sampling_steps, denoiser=backend.predict_noise)
+                best = int(((samples - z) ** 2).mean(dim=(1, 2, 3)).argmin())
+                return backend.decode(samples[best:best + 1])
+
+            encode = timeit(lambda: backend.encode(images), 50)
+            denoise = timeit(lambda: backend.predict_noise(candidates, timesteps), 50)
+            decode = timeit(lambda: backend.decode(latent), 20)
+            total = timeit(suggest, 10)
+            baseline = baseline or total
+            print(f"  {backend.name:<18} {encode:>8.2f} {denoise:>8.2f} {decode:>8.2f} {total:>9.2f}"
+                  f"  {baseline / total:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+LOLA v2 Micro-batching Benchmark
+Measures concurrent clients each encoding (and decoding) one stroke at a
+time: batch-1 calls serialized on system.model_lock, as the /attempt
+handler made them, against the InferenceScheduler's shared batches
+
+Usage:
+    python benchmarks/lola-microbatch-benchmark.py [requests_per_client] [max_wait_ms]
+"""
+
+import sys
+import time
+import threading
+from pathlib import Path
+
+import numpy as np
+import torch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_v2_enhanced import LOLAv2IntentSystem
+from lola_v2_batching import InferenceScheduler
+
+
+def _legacy_call(system, fn):
+    """One batch-1 forward pass per request under the model lock"""
+    def call(x):
+        with system.model_lock:
+            return fn(system.backend)(x)
+    return call
+
+
+def run_clients(call, inputs, n_clients, per_client):
+    latencies = [[] for _ in range(n_clients)]
+
+    def client(i):
+        for j in range(per_client):
+            start = time.perf_counter()
+            call(inputs[(i * per_client + j) % len(inputs)])
+            latencies[i].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(n_clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies = np.concatenate(latencies) * 1e3
+    return n_clients * per_client / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def bench(title, system, inputs, part, per_client, max_wait_ms, clients):
+    print(f"  {title}")
+    print(f"  {'clients':>7} {'legacy req/s':>12} {'p50 ms':>8} {'p99 ms':>8}"
+          f" {'batched req/s':>13} {'p50 ms':>8} {'p99 ms':>8} {'batch':>6} {'speedup':>8}")
+    for n_clients in clients:
+        legacy_call = _legacy_call(system, lambda backend: getattr(backend, part))
+        legacy = run_clients(legacy_call, inputs, n_clients, per_client)
+
+        scheduler = InferenceScheduler(system, max_batch=16, max_wait_ms=max_wait_ms)
+        batched = run_clients(getattr(scheduler, part), inputs, n_clients, per_client)
+        stats = getattr(scheduler, f"{part}r").stats()
+        scheduler.close()
+        print(f"  {n_clients:>7} {legacy[0]:>12.1f} {legacy[1]:>8.1f} {legacy[2]:>8.1f}"
+              f" {batched[0]:>13.1f} {batched[1]:>8.1f} {batched[2]:>8.1f}"
+              f" {stats['batch_size']['mean']:>6.1f} {batched[0] / legacy[0]:>7.2f}x")
+    return stats
+
+
+def main():
+    per_client = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    max_wait_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+    torch.manual_seed(0)
+    torch.set_num_threads(1)
+    rng = np.random.default_rng(0)
+
+    print("=" * 60)
+    print("  LOLA v2 Micro-batching Benchmark")
+    print(f"  eager backend, 1 thread, max batch 16, max wait {max_wait_ms:g} ms, "
+          f"{per_client} requests per client")
+    print("=" * 60)
+
+    clients = [1, 4, 16]
+    for compression in (256, 64):
+        system = LOLAv2IntentSystem(compression_factor=compression, device='cpu', num_threads=1)
+        t = np.linspace(0, 2 * np.pi, 64)
+        images = [system.stroke_to_tensor(rng.uniform(0.4, 0.6, 2) + rng.uniform(0.1, 0.4)
+                                          * np.column_stack([np.cos(t), np.sin(t)])) for _ in range(32)]
+        stats = bench(f"encode, compression {compression}x", system, images, 'encode', per_client,
+                      max_wait_ms, clients)
+        if compression == 64:
+            # The 256x decoder is memory-bound: batching it saves nothing (see InferenceScheduler)
+            latents = [system.backend.encode(image) for image in images]
+            stats = bench(f"decode, compression {compression}x", system, latents, 'decode', per_client,
+                          max_wait_ms, clients)
+    print(f"  last run: batch sizes {stats['batch_size']['buckets']}")
+    print(f"            queue wait ms {stats['queue_wait_ms']['buckets']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+LOLA Payload Benchmark
+Measures response size and encode time of decoder payloads per format
+
+Usage:
+    python benchmarks/lola-payload-benchmark.py [resolution ...]
+"""
+
+import sys
+import gzip
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_math_intent_system import LOLAMathDecoder
+from lola_payload import json_default, pack_binary, pack_msgpack, _msgpack_available
+
+PROPERTIES = {'continuity': 0.9, 'smoothness': 0.7, 'periodicity': 0.2,
+              'symmetry': {'reflection': 0.3, 'rotation': 0.1, 'rotation_order': 1}}
+
+
+def timeit(fn, repeat):
+    """Return (result, mean wall time per call in ms)"""
+    result = fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return result, (time.perf_counter() - start) / repeat * 1e3
+
+
+def _tolist(obj):
+    """What the decoder used to do before returning: nested Python lists"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, dict):
+        return {key: _tolist(value) for key, value in obj.items()}
+    return obj
+
+
+def formats(decoder, decoded):
+    compact = decoder.compact_result(decoded)
+    encoders = {
+        'legacy json': lambda: json.dumps(_tolist(decoded), default=json_default).encode(),
+        'json + gzip': lambda: gzip.compress(json.dumps(decoded, default=json_default).encode(), 5),
+        'compact json': lambda: json.dumps(compact, default=json_default).encode(),
+        'compact json + gzip': lambda: gzip.compress(json.dumps(compact, default=json_default).encode(), 5),
+        'binary f32': lambda: pack_binary(decoded),
+        'compact binary f32': lambda: pack_binary(compact),
+    }
+    if _msgpack_available():
+        encoders['msgpack f32'] = lambda: pack_msgpack(decoded)
+        encoders['compact msgpack f32'] = lambda: pack_msgpack(compact)
+    return encoders
+
+
+def main():
+    resolutions = [int(r) for r in sys.argv[1:]] or [200, 2000, 20000]
+    decoder = LOLAMathDecoder()
+    latent = np.random.default_rng(0).standard_normal(64)
+    latent /= np.linalg.norm(latent)
+
+    print("=" * 60)
+    print("  LOLA Payload Benchmark")
+    print("=" * 60)
+    if not _msgpack_available():
+        print("  (msgpack not installed; msgpack rows skipped)")
+
+    for math_type in ['function', 'parametric', 'surface']:
+        for resolution in resolutions:
+            decoded = decoder.decode(latent, math_type, PROPERTIES, resolution=resolution)
+            repeat = max(3, 20000 // resolution)
+            print(f"\n[{math_type}] resolution={resolution}")
+            print(f"  {'format':<22} {'bytes':>10} {'ratio':>7} {'encode ms':>10} {'speedup':>8}")
+
+            baseline_bytes = baseline_ms = None
+            for name, encode in formats(decoder, decoded).items():
+                body, ms = timeit(encode, repeat)
+                if baseline_bytes is None:
+                    baseline_bytes, baseline_ms = len(body), ms
+                print(f"  {name:<22} {len(body):>10} {baseline_bytes / len(body):>6.1f}x "
+                      f"{ms:>10.3f} {baseline_ms / ms:>7.1f}x")
+
+    # The latent echoed by every /attempt response
+    print("\n[/attempt latent echo] 64 floats")
+    for name, encode in [('json', lambda: json.dumps({'latent_vector': latent.tolist()}).encode()),
+                         ('binary f32', lambda: pack_binary({'latent_vector': latent}))]:
+        body, ms = timeit(encode, 2000)
+        print(f"  {name:<22} {len(body):>10} {'':>7} {ms * 1e3:>8.1f} us")
+
+
+if __name__ == '__main__':
+    main()
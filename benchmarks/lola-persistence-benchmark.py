@@ -0,0 +1,132 @@
+"""
+LOLA Persistence Benchmark
+Measures request-path cost of persisting drawing attempts
+
+Usage:
+    python benchmarks/lola-persistence-benchmark.py [n_attempts] [n_threads]
+"""
+
+import sys
+import json
+import time
+import pickle
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_attempt_log import AttemptLog, AttemptLogWriter
+
+DATA_DIR = ROOT / "lola_math_data"
+
+
+def load_records():
+    """Attempt records stored by LOLAMathematicalIntentSystem"""
+    records = []
+    for file in sorted(DATA_DIR.glob("session_*.json")):
+        with open(file, 'r') as f:
+            records.append(json.load(f))
+    return records
+
+
+def legacy_persist(save_dir, record):
+    """Indented JSON file per attempt plus full pickle rewrite"""
+    filename = save_dir / f"session_{record['session_id']}_attempt_{record['attempt']:06d}.json"
+    with open(filename, 'w') as f:
+        json.dump(record, f, indent=2)
+
+    history_file = save_dir / "consolidated_history.pkl"
+    history = {'sessions': {}, 'total_attempts': 0, 'mathematical_types': {}, 'latent_clusters': []}
+    if history_file.exists():
+        with open(history_file, 'rb') as f:
+            history = pickle.load(f)
+    session = history['sessions'].setdefault(record['session_id'], {'start_time': time.time(), 'attempts': []})
+    session['attempts'].append(record['attempt'])
+    history['total_attempts'] += 1
+    with open(history_file, 'wb') as f:
+        pickle.dump(history, f)
+
+
+def run(label, persist, records, n_threads):
+    """Call persist concurrently from n_threads 'drawers'; report latency"""
+    latencies = [[] for _ in range(n_threads)]
+
+    def drawer(tid):
+        for i in range(tid, len(records), n_threads):
+            start = time.perf_counter()
+            persist(records[i])
+            latencies[tid].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=drawer, args=(t,)) for t in range(n_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    all_ms = np.concatenate([np.array(l) for l in latencies]) * 1e3
+    print(f"  {label:<26} p50 {np.percentile(all_ms, 50):7.3f} ms  p99 {np.percentile(all_ms, 99):7.3f} ms  "
+          f"{len(records) / elapsed:8.0f} attempts/s")
+
+
+def main():
+    n_attempts = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    stored = load_records()
+    records = []
+    for i in range(n_attempts):
+        record = dict(stored[i % len(stored)])
+        record['session_id'] = f"bench{i % 30:03d}"
+        record['attempt'] = i // 30 + 1
+        records.append(record)
+
+    print("=" * 60)
+    print("  LOLA Persistence Benchmark")
+    print(f"  {n_attempts} attempts from {n_threads} concurrent drawers")
+    print("=" * 60)
+
+    lock = threading.Lock()  # the legacy pickle rewrite is not thread-safe
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_dir = Path(tmp) / "legacy"
+        legacy_dir.mkdir()
+
+        def legacy(record):
+            with lock:
+                legacy_persist(legacy_dir, record)
+        run("legacy json + pickle", legacy, records, n_threads)
+
+        log = AttemptLog(Path(tmp) / "sync")
+        run("sync append", log.append, records, n_threads)
+        log.close()
+
+        def sync_fsync(record):
+            log.append(record)
+            log.flush(fsync=True)
+        log = AttemptLog(Path(tmp) / "sync_fsync")
+        run("sync append + fsync", sync_fsync, records, n_threads)
+        log.close()
+
+        for policy in AttemptLogWriter.FSYNC_POLICIES:
+            log = AttemptLog(Path(tmp) / f"behind_{policy}")
+            writer = AttemptLogWriter(log, fsync_policy=policy)
+            run(f"write-behind ({policy})", writer.submit, records, n_threads)
+            start = time.perf_counter()
+            writer.close()
+            drain_ms = (time.perf_counter() - start) * 1e3
+            metrics = writer.metrics()
+            print(f"    drained in {drain_ms:.1f} ms; written {metrics['written']}, "
+                  f"dropped {metrics['dropped']}, late {metrics['late']}, batches {metrics['batches']}, "
+                  f"max latency {metrics['max_latency_ms']:.1f} ms")
+            assert len(log) == n_attempts
+            log.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+LOLA v2 Quantization Benchmark
+Measures fp32 ONNX Runtime inference against the int8 models written by
+quantize_models (static: calibrated Conv + Linear, dynamic: Linear only),
+and the fp32 RLHF reward model against its dynamic int8 copy: latency,
+size and accuracy drift
+
+Usage:
+    python benchmarks/lola-quantization-benchmark.py [threads] [calibration_samples]
+"""
+
+import io
+import sys
+import time
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import torch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+sys.path.insert(0, str(ROOT / "backend" / "src" / "rlhf"))
+
+from lola_v2_enhanced import LOLAv2IntentSystem, rasterize_strokes
+from lola_v2_inference import export_models, quantize_models, OnnxInference
+from reward_model import RewardModel, quantize_reward_model
+
+
+def make_strokes(rng, n_strokes, n_points=64):
+    """Closed noisy curves inside the unit square, as sent by the canvas"""
+    t = np.linspace(0, 2 * np.pi, n_points)
+    strokes = []
+    for _ in range(n_strokes):
+        radius = rng.uniform(0.1, 0.4)
+        centre = rng.uniform(0.4, 0.6, 2)
+        points = centre + radius * np.column_stack([np.cos(t), np.sin(rng.integers(1, 4) * t)])
+        strokes.append(points + rng.normal(0, 0.005, points.shape))
+    return strokes
+
+
+def timeit(fn, repeat):
+    fn()  # warm-up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1e3
+
+
+def model_mb(directory, suffix):
+    """On-disk size of the three parts, external weight files included"""
+    return sum(p.stat().st_size for part in ('encoder', 'decoder', 'denoiser')
+               for p in directory.glob(f"{part}{suffix}*")) / 2**20
+
+
+def state_dict_kb(model):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 1024
+
+
+def bench_lola(threads, samples):
+    torch.manual_seed(0)
+    system = LOLAv2IntentSystem(compression_factor=256, device='cpu', num_threads=threads)
+    rng = np.random.default_rng(0)
+    images = rasterize_strokes(make_strokes(rng, samples))
+    eval_images = rasterize_strokes(make_strokes(rng, 32))
+    image = eval_images[:1]
+
+    print(f"  LOLA v2: compression 256x, {samples} calibration / 32 held-out rasters, "
+          f"{system.n_candidates} candidates x DDIM-{system.sampling_steps}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        export_models(system, Path(tmp) / "fp32", ('onnx',))
+        reference = OnnxInference(Path(tmp) / "fp32", threads)
+        rows = [('fp32', reference, model_mb(Path(tmp) / "fp32", ".onnx"), None)]
+        for mode in ('static', 'dynamic'):
+            directory = Path(tmp) / mode
+            shutil.copytree(Path(tmp) / "fp32", directory)
+            start = time.perf_counter()
+            report = quantize_models(system, directory, images, eval_images, mode=mode)
+            print(f"  quantize {mode} (one-off): {time.perf_counter() - start:.1f} s")
+            rows.append((f"int8 {mode}", OnnxInference(directory, threads, quantized=True),
+                         model_mb(directory, ".int8.onnx"), report['drift']))
+
+        latent = reference.encode(image)
+        candidates = latent.expand(system.n_candidates, -1, -1, -1).contiguous()
+        timesteps = torch.full((system.n_candidates,), 50, dtype=torch.long)
+
+        print(f"  {'model':<13} {'encode':>7} {'denoise':>8} {'decode':>7} {'suggest':>8} {'MB':>6}"
+              f" {'enc err':>8} {'dec err':>8} {'den err':>8} {'sug err':>8}")
+        baseline = None
+        for name, backend, size, drift in rows:
+            def suggest():
+                z = backend.encode(image)
+                samples = system.diffusion.sample_ddim((system.n_candidates,) + tuple(z.shape[1:]), 'cpu',
+                                                       steps=system.sampling_steps, denoiser=backend.predict_noise)
+                best = int(((samples - z) ** 2).mean(dim=(1, 2, 3)).argmin())
+                return backend.decode(samples[best:best + 1])
+
+            encode = timeit(lambda: backend.encode(image), 50)
+            denoise = timeit(lambda: backend.predict_noise(candidates, timesteps), 50)
+            decode = timeit(lambda: backend.decode(latent), 20)
+            total = timeit(suggest, 10)
+            baseline = baseline or total
+            errors = ''.join(f" {drift[part]['mean_relative_error']:>8.4f}" if drift else f" {'-':>8}"
+                             for part in ('encoder', 'decoder', 'denoiser', 'suggestion'))
+            print(f"  {name:<13} {encode:>7.2f} {denoise:>8.2f} {decode:>7.2f} {total:>8.2f} {size:>6.1f}"
+                  f"{errors}  {baseline / total:.2f}x")
+        print("  (ms; errors are mean relative L2 against fp32 on the held-out rasters)")
+
+
+def bench_reward_model():
+    torch.manual_seed(0)
+    model = RewardModel(state_dim=657, action_dim=128).cpu().eval()
+    quantized = quantize_reward_model(model)
+    print(f"  Reward model: fp32 {state_dict_kb(model):.0f} KB -> int8 {state_dict_kb(quantized):.0f} KB")
+    print(f"  {'batch':>6} {'fp32 ms':>9} {'int8 ms':>9} {'speedup':>8} {'agree':>7} {'max diff':>9}")
+
+    for batch in [1, 32, 256]:
+        states = torch.randn(batch, 657)
+        preferred, rejected = torch.randn(batch, 128), torch.randn(batch, 128)
+        with torch.no_grad():
+            fp32 = timeit(lambda: model(states, preferred), 200 if batch < 256 else 50)
+            int8 = timeit(lambda: quantized(states, preferred), 200 if batch < 256 else 50)
+            rewards = [(m(states, preferred), m(states, rejected)) for m in (model, quantized)]
+        agree = ((rewards[0][0] > rewards[0][1]) == (rewards[1][0] > rewards[1][1])).float().mean().item()
+        diff = max((a - b).abs().max().item() for a, b in zip(rewards[0], rewards[1]))
+        print(f"  {batch:>6} {fp32:>9.3f} {int8:>9.3f} {fp32 / int8:>7.2f}x {agree:>7.1%} {diff:>9.1e}")
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    torch.set_num_threads(threads)
+
+    print("=" * 60)
+    print("  LOLA v2 Quantization Benchmark")
+    print(f"  CPU, {threads} threads")
+    print("=" * 60)
+    bench_lola(threads, samples)
+    print()
+    bench_reward_model()
+
+
+if __name__ == '__main__':
+    main()
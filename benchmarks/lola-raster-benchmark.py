@@ -0,0 +1,81 @@
+"""
+LOLA v2 Rasterization Benchmark
+Measures stroke -> (B, 2, H, W) tensor conversion: the per-point Python loop
+with a SciPy blur per channel versus the batched torch rasterizer
+
+Usage:
+    python benchmarks/lola-raster-benchmark.py [points_per_stroke]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from scipy.ndimage import gaussian_filter
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_v2_enhanced import rasterize_strokes
+
+
+def _legacy_stroke_to_tensor(stroke_points, size=(64, 64)):
+    """LOLAv2IntentSystem.stroke_to_tensor before batching"""
+    tensor = torch.zeros(1, 2, size[0], size[1])
+    if len(stroke_points) < 2:
+        return tensor
+    for i, point in enumerate(stroke_points):
+        x = int(point[0] * size[0])
+        y = int(point[1] * size[1])
+        if 0 <= x < size[0] and 0 <= y < size[1]:
+            tensor[0, 0, y, x] = 1.0
+            tensor[0, 1, y, x] = i / len(stroke_points)
+    tensor[0, 0] = torch.tensor(gaussian_filter(tensor[0, 0].numpy(), sigma=1.0))
+    tensor[0, 1] = torch.tensor(gaussian_filter(tensor[0, 1].numpy(), sigma=1.0))
+    return tensor
+
+
+def make_strokes(rng, n_strokes, n_points):
+    """Closed noisy curves inside the unit square, as sent by the canvas"""
+    t = np.linspace(0, 2 * np.pi, n_points)
+    strokes = []
+    for _ in range(n_strokes):
+        radius = rng.uniform(0.1, 0.4)
+        centre = rng.uniform(0.4, 0.6, 2)
+        points = centre + radius * np.column_stack([np.cos(t), np.sin(rng.integers(1, 4) * t)])
+        strokes.append((points + rng.normal(0, 0.005, points.shape)).tolist())
+    return strokes
+
+
+def timeit(fn, repeat):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def main():
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    torch.set_num_threads(1)
+    rng = np.random.default_rng(0)
+
+    print("=" * 60)
+    print("  LOLA v2 Rasterization Benchmark")
+    print(f"  {n_points} points per stroke, 64x64, one thread")
+    print("=" * 60)
+    print(f"  {'batch':>6} {'loop ms':>10} {'batched ms':>11} {'speedup':>8} {'max diff':>10}")
+
+    for batch in [1, 8, 32, 128]:
+        strokes = make_strokes(rng, batch, n_points)
+        repeat = max(3, 256 // batch)
+        legacy = timeit(lambda: torch.cat([_legacy_stroke_to_tensor(s) for s in strokes]), repeat)
+        batched = timeit(lambda: rasterize_strokes(strokes), repeat)
+        diff = (torch.cat([_legacy_stroke_to_tensor(s) for s in strokes]) - rasterize_strokes(strokes)).abs().max()
+        print(f"  {batch:>6} {legacy:>10.2f} {batched:>11.2f} {legacy / batched:>7.1f}x {diff.item():>10.1e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+LOLA Math Server Benchmark
+Measures /attempt throughput with many students drawing at once
+
+Usage:
+    python benchmarks/lola-server-benchmark.py [attempts_per_drawer] [n_drawers ...]
+"""
+
+import sys
+import json
+import time
+import tempfile
+import socket
+import threading
+import http.client
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from http.server import HTTPServer
+from lola_math_intent_system import (LOLAMathematicalIntentSystem, LOLAMathServer, LOLAMathHTTPServer,
+                                     LOLAMathEncoder, MathematicalStroke)
+
+DATA_DIR = ROOT / "lola_math_data"
+
+
+class SingleThreadedServer(HTTPServer):
+    """Previous server: one request at a time (same backlog for a fair comparison)"""
+    request_queue_size = LOLAMathHTTPServer.request_queue_size
+
+
+def load_strokes():
+    """Stroke payloads stored by LOLAMathematicalIntentSystem"""
+    strokes = []
+    for file in sorted(DATA_DIR.glob("session_*.json")):
+        with open(file, 'r') as f:
+            stroke = json.load(f)['stroke']
+        strokes.append({'points': stroke['points'], 'context': stroke['context']})
+    return strokes
+
+
+def slow_upload(port, stroke, stop, delay=0.05):
+    """Student on a slow link: the body arrives delay seconds after the headers"""
+    body = json.dumps(stroke).encode()
+    while not stop.is_set():
+        try:
+            with socket.create_connection(('localhost', port)) as sock:
+                sock.sendall(b"POST /attempt HTTP/1.0\r\nX-Session-Id: slow\r\n"
+                             b"Content-Length: %d\r\n\r\n" % len(body))
+                time.sleep(delay)
+                sock.sendall(body)
+                while sock.recv(65536):
+                    pass
+        except OSError:
+            return  # server shut down mid-request
+
+
+def run(server_cls, strokes, n_drawers, attempts_per_drawer, slow_client=False):
+    """Serve a fresh system and let n_drawers post attempts on their own session"""
+    with tempfile.TemporaryDirectory() as tmp:
+        system = LOLAMathematicalIntentSystem(save_dir=tmp)
+        LOLAMathServer.set_system(system)
+        server = server_cls(('localhost', 0), LOLAMathServer)
+        serve = threading.Thread(target=server.serve_forever, daemon=True)
+        serve.start()
+        port = server.server_address[1]
+
+        latencies = [[] for _ in range(n_drawers)]
+        suggestions = [0] * n_drawers
+
+        def drawer(tid):
+            conn = http.client.HTTPConnection('localhost', port)
+            headers = {'Content-Type': 'application/json', 'X-Session-Id': f'student{tid:03d}'}
+            for i in range(attempts_per_drawer):
+                body = json.dumps(strokes[(tid + i) % len(strokes)])
+                start = time.perf_counter()
+                conn.request('POST', '/attempt', body, headers)
+                result = json.loads(conn.getresponse().read())
+                latencies[tid].append(time.perf_counter() - start)
+                suggestions[tid] += 'suggestion' in result
+            conn.close()
+
+        stop = threading.Event()
+        if slow_client:
+            threading.Thread(target=slow_upload, args=(port, strokes[0], stop), daemon=True).start()
+
+        threads = [threading.Thread(target=drawer, args=(t,)) for t in range(n_drawers)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        stop.set()
+
+        server.shutdown()
+        server.server_close()
+        sessions = len(system.sessions) - slow_client
+        system.close()
+
+    all_ms = np.concatenate([np.array(l) for l in latencies]) * 1e3
+    return n_drawers * attempts_per_drawer / elapsed, all_ms, sessions, sum(suggestions)
+
+
+def main():
+    attempts_per_drawer = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    drawer_counts = [int(n) for n in sys.argv[2:]] or [1, 4, 16, 48]
+
+    strokes = load_strokes()
+    # Warm-up: lazy imports (scipy KD-tree) would otherwise land in the first run
+    LOLAMathEncoder().encode(MathematicalStroke(strokes[0]['points'], 0.0, [], [], 'geometry', 2))
+
+    print("=" * 60)
+    print("  LOLA Math Server Benchmark")
+    print(f"  {attempts_per_drawer} attempts per drawer, {len(strokes)} stored strokes")
+    print("=" * 60)
+
+    for slow_client in [False, True]:
+        print("\n[%s]" % ("plus one student on a slow link (50 ms uploads)" if slow_client else "drawers only"))
+        print(f"  {'server':<20} {'drawers':>7} {'attempts/s':>10} {'p50 ms':>8} {'p99 ms':>8} "
+              f"{'sessions':>8} {'suggest':>7}")
+
+        for n_drawers in drawer_counts:
+            for label, server_cls in [('HTTPServer', SingleThreadedServer),
+                                      ('LOLAMathHTTPServer', LOLAMathHTTPServer)]:
+                throughput, ms, sessions, suggested = run(server_cls, strokes, n_drawers,
+                                                          attempts_per_drawer, slow_client)
+                print(f"  {label:<20} {n_drawers:>7} {throughput:>10.0f} {np.percentile(ms, 50):>8.2f} "
+                      f"{np.percentile(ms, 99):>8.2f} {sessions:>8} {suggested:>7}")
+
+
+if __name__ == '__main__':
+    main()
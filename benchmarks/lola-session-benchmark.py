@@ -0,0 +1,100 @@
+"""
+LOLA Session Registry Benchmark
+Measures resident memory and request cost with idle sessions spilled to disk
+
+Usage:
+    python benchmarks/lola-session-benchmark.py [n_students] [attempts_per_student]
+"""
+
+import sys
+import time
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_math_intent_system import (LOLASession, SessionRegistry, SessionSpillStore,
+                                     LatentRepresentation)
+
+LATENT_DIM = 64
+
+
+def make_latent(rng):
+    """Latent with the property layout produced by LOLAMathEncoder"""
+    vector = rng.standard_normal(LATENT_DIM)
+    properties = {
+        'continuity': float(rng.random()),
+        'smoothness': float(rng.random()),
+        'symmetry': {'reflection': float(rng.random()), 'rotation': float(rng.random()),
+                     'rotation_order': int(rng.integers(1, 7))},
+        'periodicity': float(rng.random()),
+    }
+    return LatentRepresentation(vector / np.linalg.norm(vector), 256, properties, 'shape')
+
+
+def run(n_students, attempts_per_student, max_resident, n_requests=2000):
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionSpillStore(Path(tmp) / "sessions") if max_resident else None
+        registry = SessionRegistry(lambda cid: LOLASession(cid, cid, LATENT_DIM),
+                                   max_resident=max_resident, spill_store=store)
+
+        # Enroll: every student draws a full history, then goes idle
+        tracemalloc.start()
+        start = time.perf_counter()
+        for s in range(n_students):
+            session = registry.get(f"student{s:05d}")
+            for _ in range(attempts_per_student):
+                session.analyzer.add_attempt(make_latent(rng))
+        enroll = time.perf_counter() - start
+        resident_mb = tracemalloc.get_traced_memory()[0] / 2**20
+        tracemalloc.stop()
+
+        # Requests from random students: hits stay resident, misses rehydrate
+        latencies = {'hit': [], 'rehydrate': []}
+        for _ in range(n_requests):
+            client_id = f"student{rng.integers(n_students):05d}"
+            latent = make_latent(rng)
+            kind = 'rehydrate' if store is not None and client_id in store else 'hit'
+            start = time.perf_counter()
+            session = registry.get(client_id)
+            with session.lock:
+                session.analyzer.add_attempt(latent)
+                session.analyzer.analyze_intent()
+            latencies[kind].append(time.perf_counter() - start)
+
+        disk_kb = (sum(p.stat().st_size for p in store.directory.iterdir()) / max(1, len(store)) / 1024
+                   if store is not None else 0.0)
+        metrics = registry.metrics()
+
+    label = str(max_resident) if max_resident else 'unbounded'
+    for kind, values in latencies.items():
+        if not values:
+            continue
+        ms = np.array(values) * 1e3
+        print(f"  {label:>9} {resident_mb:>11.1f} {enroll:>9.2f} {kind:>10} {len(ms):>6} "
+              f"{np.percentile(ms, 50):>7.3f} {np.percentile(ms, 99):>7.3f} "
+              f"{metrics['spilled']:>7} {disk_kb:>9.1f}")
+
+
+def main():
+    n_students = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    attempts_per_student = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    print("=" * 60)
+    print("  LOLA Session Registry Benchmark")
+    print(f"  {n_students} students x {attempts_per_student} attempts, 2000 random requests")
+    print("=" * 60)
+    print(f"  {'resident':>9} {'memory MB':>11} {'enroll s':>9} {'request':>10} {'count':>6} "
+          f"{'p50 ms':>7} {'p99 ms':>7} {'spilled':>7} {'KB/spill':>9}")
+
+    for max_resident in [None, 256, 64]:
+        run(n_students, attempts_per_student, max_resident)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+LOLA Streaming Stroke Benchmark
+Measures pen-up latency of streamed strokes (POST /stroke batches while
+drawing) against posting the whole stroke to /attempt after pen-up
+
+Usage:
+    python benchmarks/lola-stream-benchmark.py [n_strokes] [batch_points]
+"""
+
+import sys
+import json
+import time
+import tempfile
+import threading
+import http.client
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_math_intent_system import (LOLAMathEncoder, LOLAMathematicalIntentSystem, LOLAMathServer,
+                                     LOLAMathHTTPServer, MathematicalStroke, StrokeAccumulator)
+
+
+def make_stroke(rng, n_points):
+    """Noisy closed curve with per-segment velocity, like a pen trace"""
+    t = np.linspace(0, 2 * np.pi, n_points)
+    radius = 1 + 0.2 * np.sin(rng.integers(2, 6) * t)
+    points = np.column_stack([radius * np.cos(t), radius * np.sin(t)])
+    points += rng.normal(0, 0.005, points.shape)
+    return {'points': points.tolist(), 'velocity': rng.random(n_points - 1).tolist(), 'context': 'geometry'}
+
+
+def batches(stroke, batch_points):
+    points, velocity = stroke['points'], stroke['velocity']
+    for start in range(0, len(points), batch_points):
+        yield {'points': points[start:start + batch_points],
+               'velocity': velocity[max(0, start - 1):start + batch_points - 1]}
+
+
+def bench_encode(rng, batch_points, repeat=200):
+    print(f"\n[encoder] pen-up work per stroke, batches of {batch_points} points")
+    print(f"  {'points':>7} {'encode ms':>10} {'finish ms':>10} {'extend us/batch':>16} {'speedup':>8}")
+    encoder = LOLAMathEncoder()
+
+    for n_points in [64, 128, 256]:
+        stroke = make_stroke(rng, n_points)
+        full = MathematicalStroke(stroke['points'], 0.0, [], stroke['velocity'], 'geometry', 2)
+        encoder.encode(full)  # warm-up (projection matrix)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            encoder.encode(full)
+        encode_ms = (time.perf_counter() - start) / repeat * 1e3
+
+        extend_s = finish_s = 0.0
+        n_batches = 0
+        for _ in range(repeat):
+            accumulator = StrokeAccumulator('geometry')
+            for batch in batches(stroke, batch_points):
+                start = time.perf_counter()
+                accumulator.extend(batch['points'], velocity=batch['velocity'])
+                extend_s += time.perf_counter() - start
+                n_batches += 1
+            start = time.perf_counter()
+            accumulator.finish(encoder)
+            finish_s += time.perf_counter() - start
+        finish_ms = finish_s / repeat * 1e3
+        print(f"  {n_points:>7} {encode_ms:>10.3f} {finish_ms:>10.3f} "
+              f"{extend_s / n_batches * 1e6:>16.1f} {encode_ms / finish_ms:>7.1f}x")
+
+
+def bench_http(rng, n_strokes, batch_points):
+    print(f"\n[http] pen-up to response, {n_strokes} strokes of 256 points")
+    print(f"  {'mode':<28} {'p50 ms':>8} {'p95 ms':>8}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        system = LOLAMathematicalIntentSystem(save_dir=tmp)
+        LOLAMathServer.set_system(system)
+        server = LOLAMathHTTPServer(('localhost', 0), LOLAMathServer)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+
+        def post(path, payload):
+            connection = http.client.HTTPConnection('localhost', port)
+            connection.request('POST', path, body=json.dumps(payload),
+                               headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            body = response.read()
+            connection.close()
+            assert response.status == 200, body
+            return body
+
+        strokes = [make_stroke(rng, 256) for _ in range(n_strokes)]
+        latencies = {'POST /attempt (whole stroke)': [], 'POST /stroke (last batch + end)': []}
+        for stroke in strokes:
+            start = time.perf_counter()
+            post('/attempt', dict(stroke, session_id='whole'))
+            latencies['POST /attempt (whole stroke)'].append(time.perf_counter() - start)
+
+            *drawing, last = batches(stroke, batch_points)
+            for batch in drawing:  # sent while the pen is down
+                post('/stroke', dict(batch, session_id='streamed'))
+            start = time.perf_counter()
+            post('/stroke', dict(last, session_id='streamed', end=True))
+            latencies['POST /stroke (last batch + end)'].append(time.perf_counter() - start)
+
+        server.shutdown()
+        system.close()
+
+    for label, values in latencies.items():
+        ms = np.array(values) * 1e3
+        print(f"  {label:<28} {np.percentile(ms, 50):>8.3f} {np.percentile(ms, 95):>8.3f}")
+
+
+def main():
+    n_strokes = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    batch_points = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    rng = np.random.default_rng(0)
+
+    print("=" * 60)
+    print("  LOLA Streaming Stroke Benchmark")
+    print("=" * 60)
+    bench_encode(rng, batch_points)
+    bench_http(rng, n_strokes, batch_points)
+
+
+if __name__ == '__main__':
+    main()
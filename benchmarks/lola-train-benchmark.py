@@ -0,0 +1,114 @@
+"""
+LOLA v2 Training Pipeline Benchmark
+Measures data-pipeline epochs/sec (everything training waits on except
+the model step) of the legacy loop, with shuffled Python slices and every
+stroke re-rasterized every epoch, against the cached raster store fed
+through a DataLoader, with and without worker processes. One model step
+is timed separately for scale.
+
+Usage:
+    python benchmarks/lola-train-benchmark.py [n_strokes] [epochs]
+"""
+
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import torch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_stroke_dataset import export_records, StrokeDataset
+from lola_v2_enhanced import LOLAv2IntentSystem, build_raster_cache, raster_loader
+
+BATCH_SIZE = 32
+# compression_factor=256 does not fit a 64x64 raster (decoder output is 256x256)
+COMPRESSION = 64
+
+
+def make_records(rng, n_strokes, n_points=128):
+    """Closed noisy curves inside the unit square, as sent by the canvas"""
+    t = np.linspace(0, 2 * np.pi, n_points)
+    for i in range(n_strokes):
+        points = rng.uniform(0.4, 0.6, 2) + rng.uniform(0.1, 0.4) * np.column_stack(
+            [np.cos(t), np.sin(rng.integers(1, 4) * t)])
+        yield {'session_id': f"{i // 20:08x}", 'attempt': i % 20 + 1,
+               'stroke': {'points': points.tolist(), 'timestamp': 1.7e9 + i},
+               'latent_vector': [0.0] * 64, 'type': 'shape'}
+
+
+def _legacy_epoch(dataset, step):
+    """train_lola_v2's epoch before the raster cache"""
+    order = np.arange(len(dataset))
+    np.random.shuffle(order)
+    for i in range(0, len(dataset), BATCH_SIZE):
+        batch = [{'points': dataset.stroke_points(j)} for j in order[i:i + BATCH_SIZE]]
+        if len(batch) < 2:
+            continue
+        step(batch)
+
+
+def _loader_epoch(loader, step):
+    for batch in loader:
+        if len(batch) < 2:
+            continue
+        step(batch)
+
+
+def epochs_per_sec(run_epoch, epochs):
+    run_epoch()  # warm-up (starts persistent workers)
+    start = time.perf_counter()
+    for _ in range(epochs):
+        run_epoch()
+    return epochs / (time.perf_counter() - start)
+
+
+def main():
+    n_strokes = int(sys.argv[1]) if len(sys.argv) > 1 else 4096
+    epochs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    torch.manual_seed(0)
+
+    print("=" * 60)
+    print("  LOLA v2 Training Pipeline Benchmark")
+    print(f"  {n_strokes} strokes, batch {BATCH_SIZE}, 64x64, {torch.get_num_threads()} threads")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        export_records(make_records(np.random.default_rng(0), n_strokes), Path(tmp) / "stroke_dataset")
+        dataset = StrokeDataset(Path(tmp) / "stroke_dataset")
+
+        start = time.perf_counter()
+        cache = build_raster_cache(dataset)
+        print(f"  raster cache (one-off): {time.perf_counter() - start:.2f} s, "
+              f"{cache.stat().st_size / 2**20:.1f} MB")
+
+        system = LOLAv2IntentSystem(compression_factor=COMPRESSION, device='cpu')
+        pipelines = [
+            ('legacy loop (rasterize per epoch)', lambda step: _legacy_epoch(
+                dataset, lambda b: step(system.strokes_to_tensor([s['points'] for s in b])))),
+        ] + [
+            (f'loader, {workers} workers{", in memory" if in_memory else ""}',
+             lambda step, loader=raster_loader(dataset, BATCH_SIZE, workers, in_memory=in_memory):
+             _loader_epoch(loader, step))
+            for workers, in_memory in [(0, False), (0, True), (2, False)]
+        ]
+
+        print(f"  {'pipeline':<34} {'epochs/s':>9} {'speedup':>8}")
+        baseline = None
+        for name, run in pipelines:
+            rate = epochs_per_sec(lambda: run(lambda batch: batch.sum()), epochs)
+            baseline = baseline or rate
+            print(f"  {name:<34} {rate:>9.2f} {rate / baseline:>7.1f}x")
+
+        batch = next(iter(raster_loader(dataset, BATCH_SIZE, 0)))
+        system.train_on_rasters(batch)
+        start = time.perf_counter()
+        system.train_on_rasters(batch)
+        print(f"  model step (compression {COMPRESSION}): {(time.perf_counter() - start) * 1e3:.0f} ms/batch")
+
+
+if __name__ == '__main__':
+    main()
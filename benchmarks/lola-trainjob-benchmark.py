@@ -0,0 +1,111 @@
+"""
+LOLA v2 Training Job Benchmark
+Measures POST /attempt latency on the v2 server while POST /train is in
+progress: the legacy handler trains inside the single HTTP thread, the
+current one queues a job for the background TrainingWorker
+
+Usage:
+    python benchmarks/lola-trainjob-benchmark.py [train_steps] [attempts]
+"""
+
+import sys
+import json
+import time
+import threading
+import urllib.request
+from http.server import HTTPServer
+from pathlib import Path
+
+import numpy as np
+import torch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "lola-integration"))
+
+from lola_v2_enhanced import LOLAv2IntentSystem, LOLAv2Server
+
+# compression_factor=256 does not fit a 64x64 raster (decoder output is 256x256)
+COMPRESSION = 64
+
+
+class _QuietServer(LOLAv2Server):
+    def log_message(self, format, *args):
+        pass
+
+
+class _LegacyServer(_QuietServer):
+    """/train as it was: train_on_batch inside the request, once per step"""
+
+    def do_POST(self):
+        if self.path != '/train':
+            return super().do_POST()
+        content_length = int(self.headers.get('Content-Length') or 0)
+        steps = json.loads(self.rfile.read(content_length) or b'{}').get('steps', 1)
+        for _ in range(steps):
+            losses = self.system.train_on_batch(self.system.recent_attempts(32))
+        self._send_json({'status': 'training', 'losses': losses})
+
+
+def post(port, path, data):
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=json.dumps(data).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        body = json.loads(response.read())
+    return body, (time.perf_counter() - start) * 1e3
+
+
+def make_stroke(rng):
+    t = np.linspace(0, 2 * np.pi, 64)
+    return {'points': (0.5 + 0.3 * np.column_stack([np.cos(t), np.sin(t)])
+                       + rng.normal(0, 0.01, (64, 2))).tolist()}
+
+
+def run(handler, train_steps, n_attempts):
+    rng = np.random.default_rng(0)
+    system = LOLAv2IntentSystem(compression_factor=COMPRESSION, device='cpu', n_candidates=2, sampling_steps=5)
+    system.vae.eval()
+    system.diffusion.eval()
+    handler.set_system(system)
+    server = HTTPServer(('127.0.0.1', 0), handler)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    for _ in range(8):
+        post(port, '/attempt', make_stroke(rng))
+    idle = [post(port, '/attempt', make_stroke(rng))[1] for _ in range(n_attempts)]
+
+    # Attempts arrive while /train is being handled
+    train = {}
+    trainer = threading.Thread(target=lambda: train.update(ms=post(port, '/train', {'steps': train_steps})[1]))
+    trainer.start()
+    time.sleep(0.05)
+    busy = []
+    for _ in range(n_attempts):
+        busy.append(post(port, '/attempt', make_stroke(rng))[1])
+        time.sleep(0.1)
+    trainer.join()
+
+    handler.trainer.close()
+    server.shutdown()
+    server.server_close()
+    return train['ms'], np.array(idle), np.array(busy)
+
+
+def main():
+    train_steps = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    n_attempts = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    torch.manual_seed(0)
+
+    print("=" * 60)
+    print("  LOLA v2 Training Job Benchmark")
+    print(f"  {train_steps} training steps on 32 attempts, {n_attempts} attempts during training")
+    print("=" * 60)
+    print(f"  {'/train':<12} {'train ms':>9} {'idle p50':>9} {'busy p50':>9} {'busy max':>9}")
+    for name, handler in [('synchronous', _LegacyServer), ('job queue', _QuietServer)]:
+        train_ms, idle, busy = run(handler, train_steps, n_attempts)
+        print(f"  {name:<12} {train_ms:>9.0f} {np.median(idle):>9.1f} {np.median(busy):>9.1f} {busy.max():>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
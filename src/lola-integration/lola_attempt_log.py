@@ -0,0 +1,621 @@
+"""
+Append-only attempt log for the LOLA Mathematical Intent system
+Replaces per-attempt JSON files and the rewritten consolidated_history.pkl
+
+Layout of the log directory:
+    MANIFEST.json        ordered segment list, active index file, id counter
+    segment_NNNNNN.jsonl one compact JSON record per line, rotated by size
+    index_NNNNNN.jsonl   one line per record: key -> (segment, offset, length)
+
+Writes only ever append. A crash can at worst leave a torn final line,
+which is truncated the next time the log is opened. Compaction writes
+new files and switches to them with a single atomic MANIFEST replace.
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+import argparse
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional, Iterator, Iterable
+
+import numpy as np
+
+# Index entry: [session_id, attempt, segment, offset, length, timestamp, type]
+IndexEntry = List
+
+
+def _json_default(value):
+    """Serialize numpy scalars/arrays that reach the log"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class AttemptLog:
+    """
+    Segmented append-only store of drawing attempts, indexed by
+    (session_id, attempt)
+    """
+
+    MANIFEST = "MANIFEST.json"
+
+    def __init__(self, directory, max_segment_bytes=8 * 1024 * 1024, compact_dead_ratio=0.5):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_segment_bytes = max_segment_bytes
+        self.compact_dead_ratio = compact_dead_ratio
+
+        self._lock = threading.RLock()
+        self._index: Dict[Tuple[str, int], IndexEntry] = {}
+        self._sessions: Dict[str, Dict] = {}
+        self._types: Dict[str, int] = {}
+        self._segment_bytes: Dict[str, int] = {}
+        self._dead_bytes = 0
+
+        self._load_manifest()
+        self._load_index()
+        self._recover_active_segment()
+        self._remove_orphans()
+
+        self._segment_file = open(self.directory / self._active_segment, 'ab')
+        self._index_file = open(self.directory / self._manifest['index'], 'a', encoding='utf-8')
+
+    # ------------------------------------------------------------------
+    # Opening and recovery
+    # ------------------------------------------------------------------
+
+    def _load_manifest(self):
+        manifest_path = self.directory / self.MANIFEST
+        if manifest_path.exists():
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                self._manifest = json.load(f)
+        else:
+            self._manifest = {'segments': [], 'index': None, 'next_id': 1}
+            self._manifest['segments'].append(self._new_name('segment'))
+            self._manifest['index'] = self._new_name('index')
+            self._write_manifest(self._manifest)
+
+        for name in self._manifest['segments']:
+            path = self.directory / name
+            self._segment_bytes[name] = path.stat().st_size if path.exists() else 0
+
+    def _new_name(self, kind: str) -> str:
+        name = f"{kind}_{self._manifest['next_id']:06d}.jsonl"
+        self._manifest['next_id'] += 1
+        return name
+
+    def _write_manifest(self, manifest: Dict):
+        tmp_path = self.directory / (self.MANIFEST + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.directory / self.MANIFEST)
+
+    @property
+    def _active_segment(self) -> str:
+        return self._manifest['segments'][-1]
+
+    def _load_index(self):
+        index_path = self.directory / self._manifest['index']
+        if not index_path.exists():
+            return
+
+        valid_bytes = 0
+        with open(index_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # torn final line
+                entry = json.loads(line)
+                valid_bytes += len(line)
+                # Skip entries whose record never reached the segment file
+                if entry[3] + entry[4] <= self._segment_bytes.get(entry[2], 0):
+                    self._register(entry)
+
+        if valid_bytes < index_path.stat().st_size:
+            with open(index_path, 'r+b') as f:
+                f.truncate(valid_bytes)
+
+    def _recover_active_segment(self):
+        """Index records written after the last index entry; drop a torn tail"""
+        name = self._active_segment
+        path = self.directory / name
+        if not path.exists():
+            path.touch()
+            return
+
+        offset = max((e[3] + e[4] for e in self._index.values() if e[2] == name), default=0)
+        recovered = []
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                recovered.append(self._index_entry(record, name, offset, len(line)))
+                offset += len(line)
+
+        if offset < path.stat().st_size:
+            print(f"[AttemptLog] Truncating torn record at {name}:{offset}")
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+        self._segment_bytes[name] = offset
+
+        if recovered:
+            with open(self.directory / self._manifest['index'], 'a', encoding='utf-8') as f:
+                for entry in recovered:
+                    self._register(entry)
+                    f.write(json.dumps(entry) + '\n')
+
+    def _remove_orphans(self):
+        """Delete files left behind by an interrupted compaction"""
+        live = set(self._manifest['segments']) | {self._manifest['index']}
+        for path in self.directory.glob('*.jsonl'):
+            if path.name not in live:
+                path.unlink()
+
+    # ------------------------------------------------------------------
+    # Index bookkeeping
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _index_entry(record: Dict, segment: str, offset: int, length: int) -> IndexEntry:
+        return [record['session_id'], int(record['attempt']), segment, offset, length,
+                record.get('timestamp', 0.0), record.get('type')]
+
+    def _register(self, entry: IndexEntry):
+        session_id, attempt, segment, offset, length, timestamp, math_type = entry
+        key = (session_id, attempt)
+        previous = self._index.get(key)
+        if previous is not None:
+            self._dead_bytes += previous[4]
+        else:
+            session = self._sessions.setdefault(session_id, {'start_time': timestamp, 'attempts': []})
+            session['start_time'] = min(session['start_time'], timestamp)
+            session['attempts'].append(attempt)
+            if math_type is not None:
+                self._types[math_type] = self._types.get(math_type, 0) + 1
+        self._index[key] = entry
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def append(self, record: Dict):
+        """Append one attempt record (must carry session_id and attempt)"""
+        self.append_many([record])
+
+    def append_many(self, records: Iterable[Dict]):
+        """Append several records with one write per file"""
+        with self._lock:
+            data = []
+            entries = []
+            segment = self._active_segment
+            offset = self._segment_bytes[segment]
+
+            for record in records:
+                line = (json.dumps(record, separators=(',', ':'), default=_json_default) + '\n').encode('utf-8')
+                if data and offset + len(line) > self.max_segment_bytes:
+                    self._write(data, entries)
+                    data, entries = [], []
+                    self._rotate()
+                    segment, offset = self._active_segment, 0
+                data.append(line)
+                entries.append(self._index_entry(record, segment, offset, len(line)))
+                offset += len(line)
+
+            if data:
+                self._write(data, entries)
+                if offset >= self.max_segment_bytes:
+                    self._rotate()
+
+    def _write(self, data: List[bytes], entries: List[List]):
+        # Segment first: an index entry never points at unwritten bytes
+        self._segment_file.write(b''.join(data))
+        self._segment_file.flush()
+        self._index_file.write(''.join(json.dumps(e) + '\n' for e in entries))
+        self._index_file.flush()
+
+        for entry in entries:
+            self._register(entry)
+        self._segment_bytes[entries[0][2]] += sum(len(line) for line in data)
+
+    def _rotate(self):
+        """Seal the active segment and start a new one"""
+        self.flush(fsync=True)
+        self._segment_file.close()
+
+        name = self._new_name('segment')
+        self._manifest['segments'].append(name)
+        self._segment_bytes[name] = 0
+        self._write_manifest(self._manifest)
+        self._segment_file = open(self.directory / name, 'ab')
+
+        total = sum(self._segment_bytes.values())
+        if total and self._dead_bytes / total > self.compact_dead_ratio:
+            self.compact()
+
+    def flush(self, fsync=False):
+        """Flush buffered writes; optionally fsync segment and index"""
+        with self._lock:
+            for f in (self._segment_file, self._index_file):
+                f.flush()
+                if fsync:
+                    os.fsync(f.fileno())
+
+    def close(self):
+        with self._lock:
+            self.flush(fsync=True)
+            self._segment_file.close()
+            self._index_file.close()
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: Tuple[str, int]) -> bool:
+        return key in self._index
+
+    @property
+    def version(self) -> List[int]:
+        """
+        [file id counter, total segment bytes]; changes with every append,
+        rotation and compaction, so equal versions mean equal contents
+        """
+        with self._lock:
+            return [self._manifest['next_id'], sum(self._segment_bytes.values())]
+
+    def get(self, session_id: str, attempt: int) -> Optional[Dict]:
+        """Read one attempt record"""
+        with self._lock:
+            entry = self._index.get((session_id, attempt))
+            if entry is None:
+                return None
+            return self._read(entry)
+
+    def _read(self, entry: IndexEntry) -> Dict:
+        segment, offset, length = entry[2:5]
+        if segment == self._active_segment:
+            self._segment_file.flush()
+        with open(self.directory / segment, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def iter_records(self, session_id: Optional[str] = None) -> Iterator[Dict]:
+        """Yield live records in write order, optionally for one session"""
+        with self._lock:
+            self._segment_file.flush()
+            segments = list(self._manifest['segments'])
+            live = {(e[2], e[3]) for e in self._index.values()
+                    if session_id is None or e[0] == session_id}
+
+        for segment in segments:
+            path = self.directory / segment
+            if not path.exists():
+                continue
+            offset = 0
+            with open(path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    if (segment, offset) in live:
+                        yield json.loads(line)
+                    offset += len(line)
+
+    def session_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._sessions)
+
+    def attempts(self, session_id: str) -> List[int]:
+        with self._lock:
+            return list(self._sessions.get(session_id, {}).get('attempts', []))
+
+    def summary(self) -> Dict:
+        """Aggregate view in the shape of the old consolidated history"""
+        with self._lock:
+            return {
+                'sessions': {sid: {'start_time': s['start_time'], 'attempts': list(s['attempts'])}
+                             for sid, s in self._sessions.items()},
+                'total_attempts': len(self._index),
+                'mathematical_types': dict(self._types),
+                'latent_clusters': []
+            }
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+
+    def compact(self):
+        """
+        Rewrite sealed segments without superseded records, coalescing them
+        into full-size segments, and start a fresh index generation
+        """
+        with self._lock:
+            self.flush(fsync=True)
+            sealed = self._manifest['segments'][:-1]
+            manifest = dict(self._manifest, segments=[])
+
+            new_index = []
+            out = None
+            out_name = None
+            out_bytes = 0
+            for segment in sealed:
+                live = {e[3]: e for e in self._index.values() if e[2] == segment}
+                offset = 0
+                with open(self.directory / segment, 'rb') as f:
+                    for line in f:
+                        if offset in live:
+                            if out is None or out_bytes + len(line) > self.max_segment_bytes:
+                                if out is not None:
+                                    out.flush()
+                                    os.fsync(out.fileno())
+                                    out.close()
+                                out_name = self._new_name('segment')
+                                manifest['segments'].append(out_name)
+                                out = open(self.directory / out_name, 'wb')
+                                out_bytes = 0
+                            out.write(line)
+                            entry = live[offset]
+                            new_index.append(entry[:2] + [out_name, out_bytes, len(line)] + entry[5:])
+                            out_bytes += len(line)
+                        offset += len(line)
+            if out is not None:
+                out.flush()
+                os.fsync(out.fileno())
+                out.close()
+
+            # Records in the active segment keep their location
+            active = self._active_segment
+            manifest['segments'].append(active)
+            new_index.extend(e for e in self._index.values() if e[2] == active)
+
+            index_name = self._new_name('index')
+            manifest['index'] = index_name
+            manifest['next_id'] = self._manifest['next_id']
+            with open(self.directory / index_name, 'w', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(e) + '\n' for e in new_index))
+                f.flush()
+                os.fsync(f.fileno())
+
+            # Switch over atomically, then drop the old files
+            self._write_manifest(manifest)
+            self._index_file.close()
+            self._manifest = manifest
+            self._index.clear()
+            self._sessions.clear()
+            self._types.clear()
+            self._dead_bytes = 0
+            for entry in new_index:
+                self._register(entry)
+            self._segment_bytes = {name: (self.directory / name).stat().st_size
+                                   for name in manifest['segments']}
+            self._index_file = open(self.directory / index_name, 'a', encoding='utf-8')
+            self._remove_orphans()
+
+
+class AttemptLogWriter:
+    """
+    Write-behind persistence for an AttemptLog. submit() only enqueues;
+    a background thread drains the bounded queue in batches and applies
+    the fsync policy:
+        'always'   fsync after every batch
+        'interval' fsync at most every fsync_interval seconds; writes left
+                   unsynced when the queue goes idle are fsynced once it
+                   has been idle for fsync_interval
+        'never'    leave durability to the OS page cache
+    """
+
+    FSYNC_POLICIES = ('always', 'interval', 'never')
+
+    def __init__(self, log: AttemptLog, max_queue=4096, batch_size=64,
+                 fsync_policy='interval', fsync_interval=1.0, late_after=1.0):
+        if fsync_policy not in self.FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy must be one of {self.FSYNC_POLICIES}")
+
+        self.log = log
+        self.batch_size = batch_size
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.late_after = late_after
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'late': 0,
+            'errors': 0,
+            'batches': 0,
+            'max_latency_ms': 0.0,
+        }
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
+        # Serializes submit() against close(): nothing is queued after the sentinel
+        self._close_lock = threading.Lock()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="AttemptLogWriter", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, record: Dict) -> bool:
+        """Queue a record for writing; returns False if it was dropped"""
+        with self._close_lock:
+            if self._closed:
+                return False
+            try:
+                self._queue.put_nowait((time.monotonic(), record))
+            except queue.Full:
+                with self._stats_lock:
+                    self._stats['dropped'] += 1
+                return False
+        with self._stats_lock:
+            self._stats['enqueued'] += 1
+        return True
+
+    def _run(self):
+        while True:
+            timeout = self.fsync_interval if self.fsync_policy == 'interval' and self._unsynced else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._fsync_idle()
+                continue
+            if item is None:
+                self._queue.task_done()
+                break
+
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.task_done()
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._write_batch(batch)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                break
+
+    def _write_batch(self, batch: List[Tuple[float, Dict]]):
+        try:
+            self.log.append_many(record for _, record in batch)
+            now = time.monotonic()
+            if self.fsync_policy == 'always' or (
+                    self.fsync_policy == 'interval' and now - self._last_fsync >= self.fsync_interval):
+                self.log.flush(fsync=True)
+                self._last_fsync = time.monotonic()
+                self._unsynced = False
+            else:
+                self._unsynced = self.fsync_policy == 'interval'
+        except Exception as e:
+            print(f"[AttemptLogWriter] Failed to write {len(batch)} attempts: {e}")
+            with self._stats_lock:
+                self._stats['errors'] += len(batch)
+            return
+
+        done = time.monotonic()
+        latencies = [done - enqueued for enqueued, _ in batch]
+        with self._stats_lock:
+            self._stats['written'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['late'] += sum(1 for latency in latencies if latency > self.late_after)
+            self._stats['max_latency_ms'] = max(self._stats['max_latency_ms'], max(latencies) * 1e3)
+
+    def _fsync_idle(self):
+        """The queue stayed empty for fsync_interval: sync the last burst"""
+        try:
+            self.log.flush(fsync=True)
+        except Exception as e:
+            print(f"[AttemptLogWriter] Failed to fsync attempt log: {e}")
+            return
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
+
+    def flush(self):
+        """Block until every queued record has been written and fsynced"""
+        self._queue.join()
+        self.log.flush(fsync=True)
+        self._last_fsync = time.monotonic()
+
+    def close(self):
+        """Drain the queue, stop the worker and fsync (flush-on-shutdown)"""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self.log.flush(fsync=True)
+        atexit.unregister(self.close)
+
+    def metrics(self) -> Dict:
+        with self._stats_lock:
+            metrics = dict(self._stats)
+        metrics['queue_depth'] = self._queue.qsize()
+        metrics['max_queue'] = self._queue.maxsize
+        metrics['fsync_policy'] = self.fsync_policy
+        return metrics
+
+
+def migrate_legacy_attempts(save_dir, log: Optional[AttemptLog] = None, remove=False) -> int:
+    """
+    One-shot import of session_*_attempt_*.json files into the attempt log.
+    Already imported attempts are skipped, so the migration can be re-run.
+    """
+    save_dir = Path(save_dir)
+    owns_log = log is None
+    if owns_log:
+        log = AttemptLog(save_dir / "attempt_log")
+
+    files = sorted(save_dir.glob("session_*_attempt_*.json"))
+    records = []
+    for file in files:
+        with open(file, 'r') as f:
+            record = json.load(f)
+        if (record['session_id'], int(record['attempt'])) not in log:
+            records.append(record)
+
+    records.sort(key=lambda r: (r.get('timestamp', 0.0), r['session_id'], r['attempt']))
+    log.append_many(records)
+    log.flush(fsync=True)
+
+    if remove:
+        for file in files:
+            file.unlink()
+        legacy_history = save_dir / "consolidated_history.pkl"
+        if legacy_history.exists():
+            legacy_history.unlink()
+
+    if owns_log:
+        log.close()
+
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LOLA attempt log maintenance")
+    parser.add_argument('command', choices=['migrate', 'compact', 'stats'])
+    parser.add_argument('save_dir', nargs='?', default='lola_math_data')
+    parser.add_argument('--remove', action='store_true',
+                        help='delete legacy attempt files after migrating')
+    args = parser.parse_args()
+
+    save_dir = Path(args.save_dir)
+    log = AttemptLog(save_dir / "attempt_log")
+
+    if args.command == 'migrate':
+        start = time.time()
+        migrated = migrate_legacy_attempts(save_dir, log, remove=args.remove)
+        print(f"[AttemptLog] Migrated {migrated} attempts in {time.time() - start:.2f}s")
+    elif args.command == 'compact':
+        log.compact()
+        print(f"[AttemptLog] Compacted to {len(log._manifest['segments'])} segment(s)")
+
+    summary = log.summary()
+    print(f"[AttemptLog] {summary['total_attempts']} attempts from {len(summary['sessions'])} sessions")
+    log.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+"""
+Approximate nearest-neighbour index over stored LOLA latents
+Lets a session look up similar drawings from earlier sessions right after
+its first attempt, before its own IntentionAnalyzer has enough history
+
+Random-hyperplane LSH: n_tables hash codes of n_bits sign bits each,
+taken around a fixed centre (the mean of the first BUILD_SIZE latents;
+until then queries are exact scans). Codes are tagged with their table
+number and kept in one sorted array, so looking up every bucket of a
+query is a single searchsorted call. Besides its own bucket, a query
+probes the buckets reached by flipping each of its `probes` least
+certain bits per table (multi-probe LSH). New latents go to a small
+tail, bucketed in a dict. Once it holds MAX_TAIL latents a background
+thread merges it into a copy of the sorted array and swaps the copy in,
+so adds never wait for the merge; queries scan the tail being merged
+until then.
+Candidates from all buckets are re-ranked by exact distance.
+
+Layout of the index directory:
+    INDEX.json   dimension, hash parameters and centre
+    entries.bin  fixed-size records (session_id, attempt, type, float32 vector)
+
+entries.bin is only appended to; a torn final record is truncated when
+the index is opened. Hash codes are recomputed on open.
+"""
+
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+class LatentIndex:
+    """LSH index of latent vectors keyed by (session_id, attempt)"""
+
+    CONFIG = "INDEX.json"
+    ENTRIES = "entries.bin"
+
+    # Latents seen before the hash centre is fixed (exact scans until then)
+    BUILD_SIZE = 1024
+    # Unsorted latents scanned per query before they are merged
+    MAX_TAIL = 4096
+
+    def __init__(self, directory, dim=64, n_tables=8, n_bits=16, probes=2, max_bucket=64, seed=7):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.probes = probes
+        self.max_bucket = max_bucket  # newest candidates kept per bucket
+        self.seed = seed
+
+        # Session ids and types longer than their fields are truncated
+        self.dtype = np.dtype([('session', 'S32'), ('attempt', '<i4'), ('type', 'S16'),
+                               ('vector', '<f4', (dim,))])
+        rng = np.random.default_rng([seed, dim, n_tables, n_bits])
+        self._planes = rng.standard_normal((dim, n_tables * n_bits)).astype(np.float32)
+        self._bit_weights = np.left_shift(1, np.arange(n_bits, dtype=np.int64))
+        self._table_tags = np.left_shift(np.arange(n_tables, dtype=np.int64), n_bits)
+
+        self._lock = threading.Lock()
+        # Vectors are kept apart from the labels so re-ranking gathers
+        # contiguous rows
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._labels = np.zeros(0, dtype=self.dtype.descr[:3])
+        self._codes = np.zeros((0, n_tables), dtype=np.int64)
+        self._n = 0
+        self._merged = 0  # entries [0, _merged) are in the sorted codes
+        self._sorted = np.zeros(0, dtype=np.int64)  # tagged codes of all tables
+        self._order = np.zeros(0, dtype=np.int64)  # entry id of each sorted code
+        self._tail: Dict[int, List[int]] = {}  # tagged code -> ids not merged yet
+        self._merging: Dict[int, List[int]] = {}  # tail handed to the merge thread
+        self._merge_thread: Optional[threading.Thread] = None
+        self.center: Optional[np.ndarray] = None
+        self.queries = 0
+        self.candidates = 0
+
+        self._file = None  # opened after _load; until then merges run inline
+        self._load()
+        self._file = open(self.directory / self.ENTRIES, 'ab')
+
+    # ------------------------------------------------------------------
+    # Opening and persistence
+    # ------------------------------------------------------------------
+
+    def _config(self) -> Dict:
+        return {
+            'dim': self.dim,
+            'n_tables': self.n_tables,
+            'n_bits': self.n_bits,
+            'seed': self.seed,
+            'center': None if self.center is None else self.center.tolist()
+        }
+
+    def _write_config(self):
+        tmp_path = self.directory / (self.CONFIG + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._config(), f)
+        os.replace(tmp_path, self.directory / self.CONFIG)
+
+    def _load(self):
+        config_path = self.directory / self.CONFIG
+        entries_path = self.directory / self.ENTRIES
+        if config_path.exists():
+            with open(config_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+            center = config.pop('center')
+            if config != {k: v for k, v in self._config().items() if k != 'center'}:
+                print(f"[WARN] Discarding latent index in {self.directory}: parameters changed")
+                entries_path.unlink(missing_ok=True)
+                center = None
+            self.center = None if center is None else np.array(center, dtype=np.float32)
+        self._write_config()
+
+        if not entries_path.exists():
+            return
+        size = entries_path.stat().st_size
+        valid = size - size % self.dtype.itemsize
+        if valid < size:
+            with open(entries_path, 'r+b') as f:
+                f.truncate(valid)  # torn final record
+        self._append(np.fromfile(entries_path, dtype=self.dtype))
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        while True:
+            thread = self._merge_thread
+            if thread is None:
+                break
+            thread.join()  # a finished merge may start the next one
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    # ------------------------------------------------------------------
+    # Adding
+    # ------------------------------------------------------------------
+
+    def add(self, vector: np.ndarray, session_id: str, attempt: int, math_type: str):
+        """Index one latent"""
+        self.add_many(np.asarray(vector)[None], [session_id], [attempt], [math_type])
+
+    def add_many(self, vectors: np.ndarray, session_ids: List[str], attempts: List[int],
+                 math_types: List[str]):
+        """Index a batch of latents (rows of vectors)"""
+        records = np.zeros(len(session_ids), dtype=self.dtype)
+        records['session'] = [s.encode() for s in session_ids]
+        records['attempt'] = attempts
+        records['type'] = [t.encode() for t in math_types]
+        records['vector'] = vectors
+        with self._lock:
+            self._file.write(records.tobytes())
+            self._append(records)
+
+    def _append(self, records: np.ndarray):
+        n = self._n + len(records)
+        if n > len(self._vectors):
+            capacity = max(n, 2 * len(self._vectors), 1024)
+            self._vectors = np.resize(self._vectors, (capacity, self.dim))
+            self._labels = np.resize(self._labels, capacity)
+            self._codes = np.resize(self._codes, (capacity, self.n_tables))
+        self._vectors[self._n:n] = records['vector']
+        for name in self._labels.dtype.names:
+            self._labels[name][self._n:n] = records[name]
+        start, self._n = self._n, n
+
+        if self.center is None:
+            if n >= self.BUILD_SIZE:
+                self._build()
+            return
+        self._codes[start:n] = self._hash(self._vectors[start:n])
+        if self._file is None and n - self._merged >= self.MAX_TAIL:
+            self._merge()
+            return
+        for i, codes in enumerate(self._codes[start:n].tolist(), start):
+            for code in codes:
+                self._tail.setdefault(code, []).append(i)
+        if n - self._merged >= self.MAX_TAIL and self._merge_thread is None:
+            self._start_merge()
+
+    def _hash(self, vectors: np.ndarray, chunk=65536) -> np.ndarray:
+        """(m, dim) latents -> (m, n_tables) codes tagged with their table"""
+        codes = np.empty((len(vectors), self.n_tables), dtype=np.int64)
+        for start in range(0, len(vectors), chunk):
+            bits = (vectors[start:start + chunk] - self.center) @ self._planes > 0
+            codes[start:start + chunk] = bits.reshape(-1, self.n_tables, self.n_bits) @ self._bit_weights
+        return codes + self._table_tags
+
+    def _build(self):
+        """Fix the hash centre and hash everything indexed so far"""
+        self.center = self._vectors[:self._n].mean(axis=0)
+        self._write_config()
+        self._codes[:self._n] = self._hash(self._vectors[:self._n])
+        self._merge()
+
+    def _merged_codes(self, sorted_codes: np.ndarray, order: np.ndarray, codes: np.ndarray,
+                      first: int) -> Tuple[np.ndarray, np.ndarray]:
+        """New (sorted, order) with the codes of ids first, first + 1, ... inserted (ids stay ascending per bucket)"""
+        codes = codes.ravel()
+        by_code = np.argsort(codes, kind='stable')
+        at = np.searchsorted(sorted_codes, codes[by_code], side='right')
+        return (np.insert(sorted_codes, at, codes[by_code]),
+                np.insert(order, at, by_code // self.n_tables + first))
+
+    def _merge(self):
+        """Insert the tail into the sorted codes in place (opening and the initial build)"""
+        self._sorted, self._order = self._merged_codes(
+            self._sorted, self._order, self._codes[self._merged:self._n], self._merged)
+        self._merged = self._n
+        self._tail.clear()
+
+    def _start_merge(self):
+        """Under the lock: hand the tail to a merge thread and start a new one"""
+        first, last = self._merged, self._n
+        self._merging, self._tail = self._tail, {}
+        self._merge_thread = threading.Thread(
+            target=self._merge_in_background,
+            args=(self._sorted, self._order, self._codes[first:last].copy(), first, last),
+            name="LatentIndexMerge", daemon=True)
+        self._merge_thread.start()
+
+    def _merge_in_background(self, sorted_codes: np.ndarray, order: np.ndarray, codes: np.ndarray,
+                             first: int, last: int):
+        """Build the merged arrays outside the lock, then swap them in"""
+        try:
+            merged = self._merged_codes(sorted_codes, order, codes, first)
+        except Exception as e:
+            print(f"[LatentIndex] Merge failed, keeping the tail: {e}")
+            merged = None
+        with self._lock:
+            if merged is None:
+                for code, ids in self._tail.items():
+                    self._merging.setdefault(code, []).extend(ids)
+                self._tail = self._merging
+            else:
+                self._sorted, self._order = merged
+                self._merged = last
+            self._merging = {}
+            self._merge_thread = None
+            if merged is not None and self._n - self._merged >= self.MAX_TAIL and not self._file.closed:
+                self._start_merge()
+
+    # ------------------------------------------------------------------
+    # Querying
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return self._n
+
+    def keys(self) -> Set[Tuple[str, int]]:
+        """(session_id, attempt) of every indexed latent"""
+        with self._lock:
+            labels = self._labels[:self._n]
+            return set(zip((s.decode() for s in labels['session']), labels['attempt'].tolist()))
+
+    def _candidates(self, query: np.ndarray) -> np.ndarray:
+        if self.center is None:
+            return np.arange(self._n)
+
+        # Own bucket per table, plus flips of the bits closest to their plane
+        margins = ((query - self.center) @ self._planes).reshape(self.n_tables, self.n_bits)
+        code = (margins > 0) @ self._bit_weights + self._table_tags
+        flips = np.argsort(np.abs(margins), axis=1)[:, :self.probes]
+        keys = np.column_stack([code, code[:, None] ^ self._bit_weights[flips]])  # (n_tables, 1 + probes)
+
+        # Keys ascend by table, so sorting them keeps the binary searches local
+        flat = np.sort(keys, axis=None)
+        lo = np.searchsorted(self._sorted, flat, side='left')
+        hi = np.searchsorted(self._sorted, flat, side='right')
+        parts = [self._order[max(l, h - self.max_bucket):h] for l, h in zip(lo.tolist(), hi.tolist()) if h > l]
+        for tail in (self._merging, self._tail):
+            for key in flat.tolist():
+                ids = tail.get(key)
+                if ids:
+                    parts.append(np.array(ids[-self.max_bucket:]))
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        candidates = np.sort(np.concatenate(parts))
+        return candidates[np.concatenate(([True], candidates[1:] != candidates[:-1]))]
+
+    def query(self, vector: np.ndarray, k: int = 10, exclude_session: Optional[str] = None) -> List[Dict]:
+        """
+        Approximate k nearest latents, closest first, as dicts with
+        session_id, attempt, type, distance and vector
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if self._n == 0:
+                return []
+            candidates = self._candidates(query)
+            if exclude_session is not None:
+                candidates = candidates[self._labels['session'][candidates] != exclude_session.encode()]
+            vectors = self._vectors[candidates]
+            self.queries += 1
+            self.candidates += len(candidates)
+
+            diff = vectors - query
+            distances = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+            if len(distances) > k:
+                nearest = np.argpartition(distances, k)[:k]
+                nearest = nearest[np.argsort(distances[nearest])]
+            else:
+                nearest = np.argsort(distances)
+            labels = self._labels[candidates[nearest]]
+
+        return [{
+            'session_id': label['session'].decode(),
+            'attempt': int(label['attempt']),
+            'type': label['type'].decode(),
+            'distance': float(distances[i]),
+            'vector': vectors[i]
+        } for i, label in zip(nearest, labels)]
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                'vectors': self._n,
+                'hashed': self.center is not None,
+                'unmerged': self._n - self._merged,
+                'merging': self._merge_thread is not None,
+                'queries': self.queries,
+                'mean_candidates': self.candidates / self.queries if self.queries else 0.0
+            }
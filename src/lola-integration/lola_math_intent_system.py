@@ -5,14 +5,25 @@ For mathematical education from basic to university level
 """
 
 import numpy as np
+import os
+import copy
 import json
 import time
+import threading
 from dataclasses import dataclass, asdict
-from typing import List, Dict, Tuple, Optional
-import pickle
+from typing import List, Dict, Tuple, Optional, Deque
+from collections import Counter, OrderedDict, deque
+from itertools import islice
+from contextlib import contextmanager
 from pathlib import Path
 import hashlib
 
+from lola_attempt_log import AttemptLog, AttemptLogWriter
+from lola_latent_index import LatentIndex
+from lola_payload import json_default, encode_response
+from lola_stroke_preprocessing import StrokePreprocessor
+from lola_suggestion_events import SuggestionBroker
+
 @dataclass
 class MathematicalStroke:
     """Single stroke or drawing attempt"""
@@ -37,7 +48,16 @@ class LOLAMathEncoder:
     Compresses mathematical drawings to latent space
     """
     
-    def __init__(self, latent_dim=64, compression_rate=256):
+    # Stroke length above which autocorrelation switches to FFT
+    FFT_AUTOCORR_MIN_POINTS = 512
+    # k-fold rotations tested for rotational symmetry
+    ROTATION_ORDERS = (2, 3, 4, 5, 6)
+    # Shorter strokes take the per-stroke path in encode_batch (fewer
+    # points than Fourier descriptors are padded differently)
+    BATCH_MIN_POINTS = 10
+    
+    def __init__(self, latent_dim=64, compression_rate=256,
+                 projection_seed=42, projection_path=None):
         self.latent_dim = latent_dim
         self.compression_rate = compression_rate
         self.feature_extractors = {
@@ -47,6 +67,14 @@ class LOLAMathEncoder:
             'topology': self._extract_topological_features
         }
         
+        # Projection matrices cached per feature length so latents from
+        # different attempts (and server restarts) live in the same space
+        self.projection_seed = projection_seed
+        self.projection_path = Path(projection_path) if projection_path else None
+        self._projections: Dict[int, np.ndarray] = {}
+        self._projection_lock = threading.Lock()
+        self._load_projections()
+        
     def encode(self, stroke: MathematicalStroke) -> LatentRepresentation:
         """
         Encode mathematical drawing to latent space
@@ -68,6 +96,253 @@ class LOLAMathEncoder:
             mathematical_type=self._classify_mathematical_type(stroke)
         )
     
+    def encode_batch(self, strokes: List[MathematicalStroke]) -> List[LatentRepresentation]:
+        """
+        Encode many strokes in one call; results match encode() per stroke
+        Points of all strokes are packed into one ragged array (start offset
+        and length per stroke) so every feature kernel runs once over the
+        batch. Strokes shorter than BATCH_MIN_POINTS and 3D strokes take the
+        per-stroke path; points that are not an (n, d) array raise ValueError.
+        """
+        results: List[Optional[LatentRepresentation]] = [None] * len(strokes)
+        packed, arrays = [], []
+        for i, stroke in enumerate(strokes):
+            if len(stroke.points) < self.BATCH_MIN_POINTS:
+                results[i] = self.encode(stroke)
+                continue
+            points = np.asarray(stroke.points, dtype=np.float64)
+            if points.ndim != 2 or points.shape[1] < 2:
+                raise ValueError(f"stroke points must be an (n, 2) or (n, 3) array, got shape {points.shape}")
+            if points.shape[1] == 2:
+                packed.append(i)
+                arrays.append(points)
+            else:
+                results[i] = self.encode(stroke)
+        
+        if packed:
+            latents = self._encode_packed([strokes[i] for i in packed], arrays)
+            for i, latent in zip(packed, latents):
+                results[i] = latent
+        return results
+    
+    @staticmethod
+    def _segment_mean(values: np.ndarray, starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """Mean of each contiguous segment of values"""
+        sums = np.add.reduceat(values, starts)
+        return sums / (counts[:, None] if sums.ndim > 1 else counts)
+    
+    @classmethod
+    def _segment_std(cls, values: np.ndarray, starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """Population std of each contiguous segment (two-pass, like np.std)"""
+        deviations = values - np.repeat(cls._segment_mean(values, starts, counts), counts)
+        return np.sqrt(np.add.reduceat(deviations * deviations, starts) / counts)
+    
+    def _encode_packed(self, strokes: List[MathematicalStroke],
+                       arrays: List[np.ndarray]) -> List[LatentRepresentation]:
+        """Batched encode of 2D strokes (points as (n, 2) arrays) with at least BATCH_MIN_POINTS points"""
+        n_strokes = len(strokes)
+        lengths = np.array([len(array) for array in arrays])
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        ends = starts + lengths - 1
+        points = np.concatenate(arrays)
+        ids = np.repeat(np.arange(n_strokes), lengths)
+        
+        # Segments (point pairs) and triples that stay inside one stroke;
+        # each stroke loses one segment / two triples against its point count
+        pair_mask = ids[:-1] == ids[1:]
+        triple_mask = ids[:-2] == ids[2:]
+        pair_starts = starts - np.arange(n_strokes)
+        triple_starts = starts - 2 * np.arange(n_strokes)
+        
+        steps = np.diff(points, axis=0)[pair_mask]
+        step_lengths = np.linalg.norm(steps, axis=1)
+        curvatures = self._menger_curvature(points)[triple_mask]
+        second_diff = np.linalg.norm(np.diff(points, n=2, axis=0)[triple_mask], axis=1)
+        
+        curvature = np.column_stack([
+            self._segment_mean(curvatures, triple_starts, lengths - 2),
+            self._segment_std(curvatures, triple_starts, lengths - 2),
+            np.maximum.reduceat(curvatures, triple_starts)
+        ])
+        
+        # Leading DFT coefficients of x + iy per stroke (twiddles raised by
+        # repeated multiplication instead of one FFT per stroke)
+        n_descriptors = 10
+        z = points[:, 0] + 1j * points[:, 1]
+        twiddle = np.exp(-2j * np.pi * (np.arange(len(points)) - np.repeat(starts, lengths))
+                         / np.repeat(lengths, lengths))
+        coefficients = np.empty((n_strokes, n_descriptors), dtype=complex)
+        for k in range(n_descriptors):
+            coefficients[:, k] = np.add.reduceat(z, starts)
+            z = z * twiddle
+        coefficients /= np.abs(coefficients[:, :1]) + 1e-8
+        fourier = np.hstack([coefficients.real, coefficients.imag])
+        
+        centroids = self._segment_mean(points, starts, lengths)
+        centered = points - np.repeat(centroids, lengths, axis=0)
+        moments = np.column_stack([
+            lengths,
+            np.add.reduceat(centered[:, 0], starts),
+            np.add.reduceat(centered[:, 1], starts),
+            np.add.reduceat(centered[:, 0] ** 2, starts),
+            np.add.reduceat(centered[:, 1] ** 2, starts),
+            np.add.reduceat(centered[:, 0] * centered[:, 1], starts)
+        ]) / (lengths[:, None] + 1e-8)
+        
+        base = np.hstack([curvature, fourier, moments])
+        closure = np.linalg.norm(points[starts] - points[ends], axis=1)
+        
+        # Calculus features (only computed if a stroke needs them)
+        calculus = None
+        if any(stroke.context == 'calculus' for stroke in strokes):
+            slopes = steps[:, 1] / (steps[:, 0] + 1e-8)
+            slope_ids = ids[1:][pair_mask]
+            accelerations = np.diff(slopes)[slope_ids[:-1] == slope_ids[1:]]
+            y_sums = (points[:-1, 1] + points[1:, 1])[pair_mask]
+            integral = np.add.reduceat(steps[:, 0] * y_sums / 2.0, pair_starts)
+            calculus = np.column_stack([
+                self._segment_mean(slopes, pair_starts, lengths - 1),
+                self._segment_std(slopes, pair_starts, lengths - 1),
+                self._segment_mean(accelerations, triple_starts, lengths - 2),
+                self._segment_std(accelerations, triple_starts, lengths - 2),
+                integral
+            ])
+        
+        # Feature vectors; strokes with the same length share one projection
+        features = []
+        for i, stroke in enumerate(strokes):
+            extra = []
+            if stroke.velocity:
+                extra += [np.mean(stroke.velocity), np.std(stroke.velocity)]
+            if stroke.context == 'geometry':
+                extra.append(closure[i])
+            elif stroke.context == 'calculus':
+                extra.extend(calculus[i])
+            elif stroke.context in self.feature_extractors:
+                extra.extend(self.feature_extractors[stroke.context](arrays[i]))
+            features.append(np.concatenate([base[i], np.asarray(extra, dtype=np.float64)]))
+        
+        vectors = [None] * n_strokes
+        by_length: Dict[int, List[int]] = {}
+        for i, feature in enumerate(features):
+            by_length.setdefault(len(feature), []).append(i)
+        for members in by_length.values():
+            for i, vector in zip(members, self._compress_batch(np.stack([features[i] for i in members]))):
+                vectors[i] = vector
+        
+        # Properties
+        continuity = 1.0 / (1.0 + self._segment_std(step_lengths, pair_starts, lengths - 1))
+        smoothness = 1.0 / (1.0 + self._segment_mean(second_diff, triple_starts, lengths - 2))
+        symmetry = self._detect_symmetry_packed(centered, starts, lengths)
+        periodicity = self._detect_periodicity_packed(points[:, 1], starts, lengths)
+        
+        # Single-valued in x: no repeated x inside a stroke
+        order = np.lexsort((points[:, 0], ids))
+        sorted_x, sorted_ids = points[order, 0], ids[order]
+        repeated = (sorted_x[1:] == sorted_x[:-1]) & (sorted_ids[1:] == sorted_ids[:-1])
+        has_repeat = np.bincount(sorted_ids[1:][repeated], minlength=n_strokes) > 0
+        
+        results = []
+        for i, stroke in enumerate(strokes):
+            if not has_repeat[i]:
+                math_type = 'function'
+            elif closure[i] < 0.1:
+                math_type = 'shape'
+            else:
+                math_type = 'parametric'
+            results.append(LatentRepresentation(
+                vector=vectors[i],
+                compression_rate=self.compression_rate,
+                physical_properties={
+                    'continuity': continuity[i],
+                    'smoothness': smoothness[i],
+                    'symmetry': symmetry[i],
+                    'periodicity': periodicity[i],
+                    'dimension': stroke.dimension
+                },
+                mathematical_type=math_type
+            ))
+        return results
+    
+    def _compress_batch(self, features: np.ndarray) -> np.ndarray:
+        """_compress_features for a stack of equal-length feature vectors"""
+        n_features = features.shape[1]
+        if n_features > self.latent_dim:
+            latent = features @ self._get_projection(n_features).T
+        else:
+            latent = np.pad(features, ((0, 0), (0, self.latent_dim - n_features)))
+        return latent / (np.linalg.norm(latent, axis=1, keepdims=True) + 1e-8)
+    
+    def _detect_symmetry_packed(self, centered: np.ndarray, starts: np.ndarray,
+                                lengths: np.ndarray) -> List[Dict]:
+        """
+        _detect_symmetry for packed, centroid-centered strokes
+        The reflection and all rotations are applied to the whole batch at
+        once; each stroke then answers them with one KD-tree query.
+        """
+        from scipy.spatial import cKDTree
+        transforms = [centered * [-1.0, 1.0]]
+        for order in self.ROTATION_ORDERS:
+            angle = 2 * np.pi / order
+            cos_a, sin_a = np.cos(angle), np.sin(angle)
+            transforms.append(np.column_stack([cos_a * centered[:, 0] - sin_a * centered[:, 1],
+                                               sin_a * centered[:, 0] + cos_a * centered[:, 1]]))
+        transforms = np.stack(transforms)
+        
+        distances = np.empty(transforms.shape[:2])
+        for start, n in zip(starts, lengths):
+            stroke = slice(start, start + n)
+            queries = transforms[:, stroke].reshape(-1, 2)
+            distances[:, stroke] = cKDTree(centered[stroke]).query(queries)[0].reshape(-1, n)
+        scores = 1.0 / (1.0 + np.add.reduceat(distances, starts, axis=1) / lengths)
+        
+        reflection = scores[0]
+        rotation = np.zeros(len(starts))
+        rotation_order = np.ones(len(starts), dtype=int)
+        for order, score in zip(self.ROTATION_ORDERS, scores[1:]):
+            better = score > rotation
+            rotation[better] = score[better]
+            rotation_order[better] = order
+        
+        return [{'reflection': reflection[i], 'rotation': rotation[i], 'rotation_order': int(rotation_order[i])}
+                for i in range(len(starts))]
+    
+    def _detect_periodicity_packed(self, y_values: np.ndarray, starts: np.ndarray,
+                                   lengths: np.ndarray) -> np.ndarray:
+        """_detect_periodicity for packed strokes, one batched FFT per padded size"""
+        periodicity = np.zeros(len(starts))
+        n_fft = np.array([1 << (2 * int(n) - 1).bit_length() for n in lengths])
+        
+        for size in np.unique(n_fft):
+            group = np.flatnonzero(n_fft == size)
+            group_lengths = lengths[group]
+            width = int(group_lengths.max())
+            padded = np.zeros((len(group), width))
+            mask = np.arange(width) < group_lengths[:, None]
+            padded[mask] = y_values[np.concatenate([np.arange(starts[g], starts[g] + lengths[g]) for g in group])]
+            
+            spectrum = np.fft.rfft(padded, int(size), axis=1)
+            autocorr = np.fft.irfft(spectrum * np.conj(spectrum), int(size), axis=1)[:, :width]
+            
+            # Strict local maxima at lags 1..n-2 of each stroke
+            tol = 1e-12 * np.abs(autocorr[:, :1])
+            mid = autocorr[:, 1:-1]
+            peaks = ((mid - autocorr[:, :-2] > tol) & (mid - autocorr[:, 2:] > tol)
+                     & (np.arange(1, width - 1) < group_lengths[:, None] - 1))
+            rows, lags = np.nonzero(peaks)
+            
+            counts = np.bincount(rows, minlength=len(group))
+            same_row = rows[1:] == rows[:-1]
+            periods = np.diff(lags)[same_row].astype(float)
+            period_rows = rows[1:][same_row]
+            n_periods = np.maximum(counts - 1, 1)
+            mean = np.bincount(period_rows, periods, minlength=len(group)) / n_periods
+            variance = np.bincount(period_rows, (periods - mean[period_rows]) ** 2,
+                                   minlength=len(group)) / n_periods
+            periodicity[group] = np.where(counts > 1, 1.0 / (1.0 + np.sqrt(variance)), 0.0)
+        
+        return periodicity
+    
     def _extract_features(self, stroke: MathematicalStroke) -> np.ndarray:
         """Extract mathematical features from stroke"""
         points = np.array(stroke.points)
@@ -98,10 +373,8 @@ class LOLAMathEncoder:
         """
         # Simple linear compression for now (replace with neural network)
         if len(features) > self.latent_dim:
-            # Random projection matrix (in practice, use trained weights)
-            projection = np.random.randn(self.latent_dim, len(features))
-            projection /= np.linalg.norm(projection, axis=1, keepdims=True)
-            latent = projection @ features
+            # Seeded random projection (in practice, use trained weights)
+            latent = self._get_projection(len(features)) @ features
         else:
             # Pad if features are smaller than latent dim
             latent = np.pad(features, (0, self.latent_dim - len(features)))
@@ -111,30 +384,72 @@ class LOLAMathEncoder:
         
         return latent
     
+    def _get_projection(self, n_features: int) -> np.ndarray:
+        """Return the cached projection matrix for a feature length"""
+        projection = self._projections.get(n_features)
+        if projection is not None:
+            return projection
+        
+        with self._projection_lock:
+            projection = self._projections.get(n_features)
+            if projection is not None:
+                return projection
+            # Seed from (seed, latent_dim, n_features) so the matrix is
+            # reproducible even when no projection file is available
+            rng = np.random.default_rng([self.projection_seed, self.latent_dim, n_features])
+            projection = rng.standard_normal((self.latent_dim, n_features))
+            projection /= np.linalg.norm(projection, axis=1, keepdims=True)
+            self._projections[n_features] = projection
+            self._save_projections()
+        
+        return projection
+    
+    def _load_projections(self):
+        """Load persisted projection matrices once at startup"""
+        if self.projection_path is None or not self.projection_path.exists():
+            return
+        
+        with np.load(self.projection_path) as data:
+            if int(data['seed']) != self.projection_seed:
+                print(f"[WARN] Ignoring projections in {self.projection_path}: seed mismatch")
+                return
+            for key in data.files:
+                if key.startswith('proj_') and data[key].shape[0] == self.latent_dim:
+                    self._projections[int(key[5:])] = data[key]
+    
+    def _save_projections(self):
+        """Persist all cached projection matrices"""
+        if self.projection_path is None:
+            return
+        
+        arrays = {f'proj_{n}': m for n, m in self._projections.items()}
+        tmp_path = self.projection_path.with_suffix('.tmp.npz')
+        np.savez(tmp_path, seed=self.projection_seed, **arrays)
+        tmp_path.replace(self.projection_path)
+    
     def _compute_curvature(self, points: np.ndarray) -> np.ndarray:
         """Compute curvature features"""
         if len(points) < 3:
             return np.array([0.0])
         
-        # Approximate curvature using three consecutive points
-        curvatures = []
-        for i in range(1, len(points) - 1):
-            p1, p2, p3 = points[i-1], points[i], points[i+1]
-            
-            # Menger curvature
-            area = 0.5 * np.abs((p2[0] - p1[0]) * (p3[1] - p1[1]) - 
-                               (p3[0] - p1[0]) * (p2[1] - p1[1]))
-            d12 = np.linalg.norm(p2 - p1)
-            d23 = np.linalg.norm(p3 - p2)
-            d13 = np.linalg.norm(p3 - p1)
-            
-            if d12 * d23 * d13 > 0:
-                curvatures.append(4 * area / (d12 * d23 * d13))
-            else:
-                curvatures.append(0.0)
-        
+        curvatures = self._menger_curvature(points)
         return np.array([np.mean(curvatures), np.std(curvatures), np.max(curvatures)])
     
+    @staticmethod
+    def _menger_curvature(points: np.ndarray) -> np.ndarray:
+        """Menger curvature over all consecutive point triples at once"""
+        p1, p2, p3 = points[:-2], points[1:-1], points[2:]
+        area = 0.5 * np.abs((p2[:, 0] - p1[:, 0]) * (p3[:, 1] - p1[:, 1]) - 
+                            (p3[:, 0] - p1[:, 0]) * (p2[:, 1] - p1[:, 1]))
+        d12 = np.linalg.norm(p2 - p1, axis=1)
+        d23 = np.linalg.norm(p3 - p2, axis=1)
+        d13 = np.linalg.norm(p3 - p1, axis=1)
+        
+        denom = d12 * d23 * d13
+        curvatures = np.zeros_like(denom)
+        np.divide(4 * area, denom, out=curvatures, where=denom > 0)
+        return curvatures
+    
     def _compute_fourier_descriptors(self, points: np.ndarray, n_descriptors=10) -> np.ndarray:
         """Compute Fourier descriptors for shape analysis"""
         if len(points) < 2:
@@ -266,23 +581,40 @@ class LOLAMathEncoder:
     def _detect_symmetry(self, points: np.ndarray) -> Dict:
         """Detect various types of symmetry"""
         if len(points) < 4:
-            return {'reflection': 0.0, 'rotation': 0.0}
+            return {'reflection': 0.0, 'rotation': 0.0, 'rotation_order': 1}
         
         centroid = np.mean(points, axis=0)
         centered = points - centroid
         
-        # Reflection symmetry (simplified)
+        # Both transforms are isometries, so distances from each transformed
+        # point to the original stroke can share one KD-tree over the stroke
+        # (O(n log n) time and O(n) memory instead of an n x n distance tensor)
+        from scipy.spatial import cKDTree
+        tree = cKDTree(centered)
+        
+        # Reflection symmetry (about the vertical axis through the centroid)
         flipped_x = centered.copy()
         flipped_x[:, 0] = -flipped_x[:, 0]
-        
-        reflection_score = 1.0 / (1.0 + np.mean(np.min(
-            np.linalg.norm(centered[:, np.newaxis] - flipped_x[np.newaxis, :], axis=2),
-            axis=1
-        )))
+        reflection_score = 1.0 / (1.0 + np.mean(tree.query(flipped_x)[0]))
+        
+        # Rotational symmetry: best k-fold rotation about the centroid
+        rotation_score = 0.0
+        rotation_order = 1
+        for order in self.ROTATION_ORDERS:
+            angle = 2 * np.pi / order
+            cos_a, sin_a = np.cos(angle), np.sin(angle)
+            rotated = centered.copy()
+            rotated[:, 0] = cos_a * centered[:, 0] - sin_a * centered[:, 1]
+            rotated[:, 1] = sin_a * centered[:, 0] + cos_a * centered[:, 1]
+            
+            score = 1.0 / (1.0 + np.mean(tree.query(rotated)[0]))
+            if score > rotation_score:
+                rotation_score, rotation_order = score, order
         
         return {
             'reflection': reflection_score,
-            'rotation': 0.0  # TODO: Implement rotational symmetry
+            'rotation': rotation_score,
+            'rotation_order': rotation_order
         }
     
     def _detect_periodicity(self, points: np.ndarray) -> float:
@@ -290,16 +622,22 @@ class LOLAMathEncoder:
         if len(points) < 10:
             return 0.0
         
-        # Use autocorrelation
+        # Use autocorrelation (non-negative lags only)
         y_values = points[:, 1]
-        autocorr = np.correlate(y_values, y_values, mode='full')
-        autocorr = autocorr[len(autocorr)//2:]
+        n = len(y_values)
+        if n >= self.FFT_AUTOCORR_MIN_POINTS:
+            # Zero-padded FFT: O(n log n) instead of O(n^2) direct correlation
+            n_fft = 1 << (2 * n - 1).bit_length()
+            spectrum = np.fft.rfft(y_values, n_fft)
+            autocorr = np.fft.irfft(spectrum * np.conj(spectrum), n_fft)[:n]
+        else:
+            autocorr = np.correlate(y_values, y_values, mode='full')[n - 1:]
         
-        # Find peaks in autocorrelation
-        peaks = []
-        for i in range(1, len(autocorr) - 1):
-            if autocorr[i] > autocorr[i-1] and autocorr[i] > autocorr[i+1]:
-                peaks.append(i)
+        # Find peaks in autocorrelation (strict local maxima, ignoring
+        # round-off sized differences so FFT and direct paths agree)
+        tol = 1e-12 * np.abs(autocorr[0])
+        mid = autocorr[1:-1]
+        peaks = np.flatnonzero((mid - autocorr[:-2] > tol) & (mid - autocorr[2:] > tol)) + 1
         
         if len(peaks) > 1:
             periods = np.diff(peaks)
@@ -329,48 +667,467 @@ class LOLAMathEncoder:
         return 'parametric'
 
 
+class _RunningStats:
+    """
+    Count, mean and sum of squared deviations of samples added batch by
+    batch (Chan et al. pairwise merge, numerically equivalent to the
+    one-pass statistics of all samples)
+    """
+    
+    __slots__ = ('n', 'mean', 'm2')
+    
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+    
+    def add(self, samples: np.ndarray):
+        k = len(samples)
+        if k == 0:
+            return
+        batch_mean = float(samples.sum()) / k
+        centered = samples - batch_mean
+        delta = batch_mean - self.mean
+        n = self.n + k
+        self.m2 += float(centered @ centered) + delta * delta * self.n * k / n
+        self.mean += delta * k / n
+        self.n = n
+    
+    @property
+    def std(self) -> float:
+        return (self.m2 / self.n) ** 0.5 if self.n else 0.0
+
+
+class StrokeAccumulator:
+    """
+    Stroke received in batches while the pen is still down
+    
+    extend() folds each batch into running statistics for every feature that
+    decomposes over points, segments or point triples (moments, curvature,
+    continuity, smoothness, calculus features, velocity, single-valuedness).
+    finish() only computes what needs the whole stroke - the leading Fourier
+    descriptors, symmetry and periodicity - and returns the latent that
+    LOLAMathEncoder.encode gives for the complete stroke.
+    
+    Points are (n, 2) or (n, 3) batches; the first batch fixes the width.
+    A stroke holds at most MAX_POINTS points (and samples per channel).
+    """
+    
+    MAX_POINTS = 65536
+    
+    def __init__(self, context: str = 'geometry', dimension: int = 2):
+        self.context = context
+        self.dimension = dimension
+        self.timestamp = time.time()
+        self.last_active = self.timestamp
+        self.pressure: List[float] = []
+        self.velocity: List[float] = []
+        self._points = np.empty((256, 2))
+        self._n = 0
+        
+        self._x = _RunningStats()
+        self._y = _RunningStats()
+        self._xy_comoment = 0.0
+        self._curvature = _RunningStats()
+        self._curvature_max = 0.0
+        self._segments = _RunningStats()
+        self._second_diff_total = 0.0
+        self._slopes = _RunningStats()
+        self._accelerations = _RunningStats()
+        self._last_slope = None
+        self._integral = 0.0
+        self._velocity = _RunningStats()
+        self._x_values = set()
+        self._repeated_x = False
+    
+    def __len__(self) -> int:
+        return self._n
+    
+    @property
+    def points(self) -> np.ndarray:
+        return self._points[:self._n]
+    
+    def extend(self, points, pressure=(), velocity=()):
+        """
+        Add a batch of points with their pressure / velocity samples
+        Raises ValueError, leaving the stroke unchanged, for a batch of the
+        wrong shape or one that would take the stroke past MAX_POINTS.
+        """
+        new = np.asarray(points, dtype=np.float64)
+        width = self._points.shape[1]
+        if new.size == 0:
+            new = new.reshape(0, width)
+        if new.ndim != 2 or new.shape[1] < 2:
+            raise ValueError(f"stroke points must be an (n, 2) or (n, 3) array, got shape {new.shape}")
+        if new.shape[1] != width:
+            if self._n:
+                raise ValueError(f"stroke has {width} coordinates per point, batch has {new.shape[1]}")
+            self._points = np.empty((len(self._points), new.shape[1]))
+            width = new.shape[1]
+        if max(self._n + len(new), len(self.pressure) + len(pressure),
+               len(self.velocity) + len(velocity)) > self.MAX_POINTS:
+            raise ValueError(f"open stroke would exceed {self.MAX_POINTS} points; end it first")
+        self.last_active = time.time()
+        self.pressure.extend(float(p) for p in pressure)
+        self.velocity.extend(float(v) for v in velocity)
+        self._velocity.add(np.asarray(velocity, dtype=np.float64))
+        if not len(new):
+            return
+        
+        # Up to two previous points join the batch so that segments and
+        # triples spanning the batch boundary are counted exactly once
+        tail = min(2, self._n)
+        if self._n + len(new) > len(self._points):
+            grown = np.empty((max(2 * len(self._points), self._n + len(new)), width))
+            grown[:self._n] = self.points
+            self._points = grown
+        self._points[self._n:self._n + len(new)] = new
+        self._n += len(new)
+        window = self._points[self._n - len(new) - tail:self._n]
+        
+        # Co-moment merge needs the means before this batch
+        k, n_before = len(new), self._x.n
+        delta_x = float(new[:, 0].sum()) / k - self._x.mean
+        delta_y = float(new[:, 1].sum()) / k - self._y.mean
+        centered = new - new.mean(axis=0)
+        self._xy_comoment += float(centered[:, 0] @ centered[:, 1]) + delta_x * delta_y * n_before * k / self._n
+        self._x.add(new[:, 0])
+        self._y.add(new[:, 1])
+        
+        x_values = new[:, 0].tolist()
+        if not self._repeated_x:
+            self._x_values.update(x_values)
+            self._repeated_x = len(self._x_values) < self._n
+        
+        steps = np.diff(window, axis=0)[max(0, tail - 1):]
+        if len(steps):
+            self._segments.add(np.linalg.norm(steps, axis=1))
+            slopes = steps[:, 1] / (steps[:, 0] + 1e-8)
+            self._slopes.add(slopes)
+            if self._last_slope is not None:
+                slopes = np.concatenate([[self._last_slope], slopes])
+            self._accelerations.add(np.diff(slopes))
+            self._last_slope = slopes[-1]
+            start = window[max(0, tail - 1):]
+            self._integral += float(np.sum(steps[:, 0] * (start[1:, 1] + start[:-1, 1]) / 2.0))
+        
+        if len(window) >= 3:
+            curvatures = LOLAMathEncoder._menger_curvature(window)
+            self._curvature.add(curvatures)
+            self._curvature_max = max(self._curvature_max, float(curvatures.max()))
+            self._second_diff_total += float(np.sum(np.linalg.norm(np.diff(window, n=2, axis=0), axis=1)))
+    
+    def to_stroke(self) -> MathematicalStroke:
+        return MathematicalStroke(
+            points=self.points.tolist(),
+            timestamp=self.timestamp,
+            pressure=self.pressure,
+            velocity=self.velocity,
+            context=self.context,
+            dimension=self.dimension
+        )
+    
+    def finish(self, encoder: LOLAMathEncoder) -> LatentRepresentation:
+        """Latent of the complete stroke (same layout as encoder.encode)"""
+        points = self.points
+        n = len(points)
+        if n == 0:
+            raise ValueError("Stroke has no points")
+        closure = float(np.linalg.norm(points[0] - points[-1]))
+        
+        features = [
+            np.array([self._curvature.mean, self._curvature.std, self._curvature_max])
+            if n >= 3 else np.array([0.0]),
+            encoder._compute_fourier_descriptors(points),
+            np.array([n, 0.0, 0.0, self._x.m2, self._y.m2, self._xy_comoment]) / (n + 1e-8)
+        ]
+        if self.velocity:
+            features.extend([self._velocity.mean, self._velocity.std])
+        
+        if self.context == 'geometry':
+            features.extend([closure] if n > 2 else [])
+        elif self.context == 'calculus':
+            features.extend([self._slopes.mean, self._slopes.std,
+                             self._accelerations.mean, self._accelerations.std,
+                             self._integral] if n >= 2 else [0.0] * 5)
+        elif self.context in encoder.feature_extractors:
+            features.extend(encoder.feature_extractors[self.context](points))
+        
+        properties = {
+            'continuity': 1.0 / (1.0 + self._segments.std) if n >= 2 else 1.0,
+            'smoothness': 1.0 / (1.0 + self._second_diff_total / (n - 2)) if n >= 3 else 1.0,
+            'symmetry': encoder._detect_symmetry(points),
+            'periodicity': encoder._detect_periodicity(points),
+            'dimension': self.dimension
+        }
+        
+        if n < 2:
+            math_type = 'point'
+        elif not self._repeated_x:
+            math_type = 'function'
+        elif closure < 0.1:
+            math_type = 'shape'
+        else:
+            math_type = 'parametric'
+        
+        return LatentRepresentation(
+            vector=encoder._compress_features(np.concatenate([np.array(f).flatten() for f in features])),
+            compression_rate=encoder.compression_rate,
+            physical_properties=properties,
+            mathematical_type=math_type
+        )
+
+
 class IntentionAnalyzer:
     """
     Analyzes accumulated latent representations to understand user intent
     Based on LOLA's approach to trajectory analysis
+    
+    Latents live in a preallocated float32 ring buffer and all statistics
+    used by analyze_intent are updated in O(latent_dim) per attempt, so
+    analysis cost does not grow with history_size.
     """
     
-    def __init__(self, history_size=100):
+    # Upper bound on clusters tracked for the attempts in the window
+    MAX_CLUSTERS = 3
+    
+    def __init__(self, history_size=100, latent_dim=64,
+                 clustering='online', cluster_refine_every=20):
         self.history_size = history_size
-        self.attempt_history: List[LatentRepresentation] = []
+        self.latent_dim = latent_dim
+        self.clustering = clustering  # 'online' or 'kmeans' (full refit)
+        self.cluster_refine_every = cluster_refine_every
+        self.attempt_history: Deque[LatentRepresentation] = deque(maxlen=history_size)
         self.convergence_threshold = 0.1
         
+        # Ring buffer of latent vectors (oldest at self._head once full)
+        self._latents = np.zeros((history_size, latent_dim), dtype=np.float32)
+        self._head = 0
+        self._count = 0
+        self._total_added = 0
+        self._type_counts: Counter = Counter()
+        
+        # Welford mean / sum of squared deviations over the window
+        self._mean = np.zeros(latent_dim)
+        self._m2 = np.zeros(latent_dim)
+        
+        # Successive distances and "distance decreased" flags over the window
+        self._distances: Deque[float] = deque(maxlen=max(1, history_size - 1))
+        self._decreasing: Deque[bool] = deque(maxlen=max(1, history_size - 2))
+        self._n_decreasing = 0
+        
+        # Exponentially weighted centre for the trend: the newest latent has
+        # weight 1 and the oldest in a full window exp(-1)
+        self._trend_ratio = np.exp(1.0 / max(1, history_size - 1))
+        self._trend_sum = np.zeros(latent_dim)
+        self._trend_weight = 0.0
+        
+        # Exponential smoothing for the target prediction
+        self._ema_alpha = 0.3
+        self._ema = np.zeros(latent_dim)
+        
+        # Online k-means: centres are the exact means of their members,
+        # labels are stored per ring-buffer slot
+        self._centers = np.zeros((self.MAX_CLUSTERS, latent_dim))
+        self._center_counts = np.zeros(self.MAX_CLUSTERS, dtype=np.int64)
+        self._n_centers = 0
+        self._labels = np.zeros(history_size, dtype=np.int64)
+    
     def add_attempt(self, latent: LatentRepresentation):
         """Add new attempt to history"""
+        vector = np.asarray(latent.vector, dtype=np.float64)
+        
+        # Evict the oldest attempt once the window is full
+        evicted = None
+        if self._count == self.history_size:
+            evicted = self._latents[self._head].astype(np.float64)
+            self._type_counts[self.attempt_history[0].mathematical_type] -= 1
+            self._remove_from_window(evicted)
+            if self.clustering == 'online':
+                self._remove_from_cluster(self._labels[self._head], evicted)
+        
+        # Successive-distance window
+        if self._count > 0:
+            distance = float(np.linalg.norm(vector - self._latest()))
+            if self._distances:
+                if len(self._decreasing) == self._decreasing.maxlen:
+                    self._n_decreasing -= self._decreasing[0]
+                decreased = distance < self._distances[-1]
+                self._decreasing.append(decreased)
+                self._n_decreasing += decreased
+            self._distances.append(distance)
+        
+        # Trend: decay existing weights, drop the evicted latent, add the new one
+        if evicted is not None:
+            oldest_weight = self._trend_ratio ** -(self.history_size - 1)
+            self._trend_sum -= oldest_weight * evicted
+            self._trend_weight -= oldest_weight
+        self._trend_sum = self._trend_sum / self._trend_ratio + vector
+        self._trend_weight = self._trend_weight / self._trend_ratio + 1.0
+        
+        # Running EMA (older terms than the window carry weight < 0.7**100)
+        if self._count == 0:
+            self._ema = vector.copy()
+        else:
+            self._ema = self._ema_alpha * vector + (1 - self._ema_alpha) * self._ema
+        
+        # Store
+        slot = self._head
+        self._latents[slot] = vector
+        self._head = (self._head + 1) % self.history_size
+        self._count = min(self._count + 1, self.history_size)
+        self._add_to_window(vector)
         self.attempt_history.append(latent)
+        self._type_counts[latent.mathematical_type] += 1
+        self._total_added += 1
+        
+        if self.clustering == 'online':
+            self._update_clusters(slot, vector)
         
-        # Keep only recent history
-        if len(self.attempt_history) > self.history_size:
-            self.attempt_history.pop(0)
+        # Periodically rebuild running sums from the buffer to bound drift
+        if self._head == 0:
+            self._resync_statistics()
     
+    def _add_to_window(self, vector: np.ndarray):
+        delta = vector - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (vector - self._mean)
+    
+    def _remove_from_window(self, vector: np.ndarray):
+        n = self._count - 1
+        if n == 0:
+            self._mean[:] = 0.0
+            self._m2[:] = 0.0
+            return
+        delta = vector - self._mean
+        self._mean -= delta / n
+        self._m2 -= delta * (vector - self._mean)
+        np.maximum(self._m2, 0.0, out=self._m2)
+    
+    def _resync_statistics(self):
+        """Recompute window mean/variance and trend sums exactly"""
+        vectors = self.vectors.astype(np.float64)
+        self._mean = vectors.mean(axis=0)
+        self._m2 = ((vectors - self._mean) ** 2).sum(axis=0)
+        
+        weights = self._trend_ratio ** -np.arange(len(vectors) - 1, -1, -1)
+        self._trend_sum = weights @ vectors
+        self._trend_weight = float(weights.sum())
+    
+    def _latest(self, k: int = 1) -> np.ndarray:
+        """Last k latents in chronological order, shape (k, latent_dim) or (latent_dim,)"""
+        idx = (self._head - np.arange(k, 0, -1)) % self.history_size
+        latest = self._latents[idx].astype(np.float64)
+        return latest[0] if k == 1 else latest
+    
+    @property
+    def vectors(self) -> np.ndarray:
+        """Latents currently in the window, oldest first"""
+        if self._count < self.history_size:
+            return self._latents[:self._count]
+        return np.roll(self._latents, -self._head, axis=0)
+    
+    @property
+    def mean(self) -> np.ndarray:
+        """Running mean of the latents in the window"""
+        return self._mean.copy()
+    
+    @property
+    def variance(self) -> np.ndarray:
+        """Running per-dimension variance of the latents in the window"""
+        return self._m2 / max(1, self._count)
+    
+    @property
+    def version(self) -> int:
+        """Attempts added so far; analysis results only change with it"""
+        return self._total_added
+    
+    def recent_attempts(self, n: int) -> List[LatentRepresentation]:
+        """Most recent n attempts, oldest first"""
+        start = max(0, len(self.attempt_history) - n)
+        return list(islice(self.attempt_history, start, None))
+
+    def state(self) -> Tuple[np.ndarray, Dict]:
+        """
+        Ring buffer plus JSON-serializable metadata; from_state rebuilds an
+        analyzer that continues exactly where this one stopped
+        """
+        attempts = [[a.compression_rate, a.physical_properties, a.mathematical_type]
+                    for a in self.attempt_history]
+        meta = {
+            'history_size': self.history_size,
+            'latent_dim': self.latent_dim,
+            'clustering': self.clustering,
+            'cluster_refine_every': self.cluster_refine_every,
+            'head': self._head,
+            'count': self._count,
+            'total_added': self._total_added,
+            'type_counts': dict(self._type_counts),
+            'mean': self._mean.tolist(),
+            'm2': self._m2.tolist(),
+            'distances': list(self._distances),
+            'decreasing': [bool(d) for d in self._decreasing],
+            'n_decreasing': int(self._n_decreasing),
+            'trend_sum': self._trend_sum.tolist(),
+            'trend_weight': self._trend_weight,
+            'ema': self._ema.tolist(),
+            'centers': self._centers.tolist(),
+            'center_counts': self._center_counts.tolist(),
+            'n_centers': self._n_centers,
+            'labels': self._labels.tolist(),
+            'attempts': attempts
+        }
+        return self._latents, meta
+
+    @classmethod
+    def from_state(cls, latents: np.ndarray, meta: Dict) -> 'IntentionAnalyzer':
+        """Rebuild an analyzer from state() output (latents are copied)"""
+        analyzer = cls(history_size=meta['history_size'], latent_dim=meta['latent_dim'],
+                       clustering=meta['clustering'], cluster_refine_every=meta['cluster_refine_every'])
+        analyzer._latents[:] = latents
+        analyzer._head = meta['head']
+        analyzer._count = meta['count']
+        analyzer._total_added = meta['total_added']
+        analyzer._type_counts = Counter(meta['type_counts'])
+        analyzer._mean = np.array(meta['mean'])
+        analyzer._m2 = np.array(meta['m2'])
+        analyzer._distances.extend(meta['distances'])
+        analyzer._decreasing.extend(meta['decreasing'])
+        analyzer._n_decreasing = meta['n_decreasing']
+        analyzer._trend_sum = np.array(meta['trend_sum'])
+        analyzer._trend_weight = meta['trend_weight']
+        analyzer._ema = np.array(meta['ema'])
+        analyzer._centers = np.array(meta['centers'])
+        analyzer._center_counts = np.array(meta['center_counts'], dtype=np.int64)
+        analyzer._n_centers = meta['n_centers']
+        analyzer._labels = np.array(meta['labels'], dtype=np.int64)
+
+        # Attempt vectors come back from the float32 ring buffer
+        for vector, (rate, properties, math_type) in zip(analyzer.vectors, meta['attempts']):
+            analyzer.attempt_history.append(
+                LatentRepresentation(vector.astype(np.float64), rate, properties, math_type))
+
+        return analyzer
+
     def analyze_intent(self, min_attempts=5) -> Optional[Dict]:
         """
         Analyze user intent from accumulated attempts
         Returns predicted intention and confidence
         """
-        if len(self.attempt_history) < min_attempts:
+        if self._count < min_attempts:
             return None
         
-        # Extract latent vectors
-        vectors = np.array([a.vector for a in self.attempt_history])
-        
         # Analyze convergence
-        convergence = self._analyze_convergence(vectors)
+        convergence = self._analyze_convergence()
         
         # Cluster analysis
-        clusters = self._cluster_attempts(vectors)
+        clusters = self._cluster_attempts()
         
         # Trend analysis
-        trend = self._analyze_trend(vectors)
+        trend = self._analyze_trend()
         
         # Mathematical type consensus
-        types = [a.mathematical_type for a in self.attempt_history]
-        dominant_type = max(set(types), key=types.count)
+        dominant_type = max(self._type_counts, key=self._type_counts.get)
         
         return {
             'convergence': convergence,
@@ -378,39 +1135,48 @@ class IntentionAnalyzer:
             'trend': trend,
             'dominant_type': dominant_type,
             'confidence': self._calculate_confidence(convergence, clusters),
-            'suggested_latent': self._predict_target_latent(vectors, trend)
+            'suggested_latent': self._predict_target_latent(trend)
         }
     
-    def _analyze_convergence(self, vectors: np.ndarray) -> Dict:
+    def _analyze_convergence(self) -> Dict:
         """Analyze if attempts are converging to a target"""
-        if len(vectors) < 2:
+        if self._count < 2:
             return {'converging': False, 'rate': 0.0}
         
-        # Calculate successive distances
-        distances = []
-        for i in range(1, len(vectors)):
-            dist = np.linalg.norm(vectors[i] - vectors[i-1])
-            distances.append(dist)
-        
-        # Check if distances are decreasing
-        decreasing = sum(1 for i in range(1, len(distances)) 
-                        if distances[i] < distances[i-1]) / max(1, len(distances) - 1)
+        # Fraction of successive distances that decreased
+        decreasing = self._n_decreasing / max(1, len(self._distances) - 1)
         
         return {
             'converging': decreasing > 0.6,
             'rate': decreasing,
-            'final_distance': distances[-1] if distances else 0.0
+            'final_distance': self._distances[-1] if self._distances else 0.0
         }
     
-    def _cluster_attempts(self, vectors: np.ndarray) -> Dict:
+    def _cluster_attempts(self) -> Dict:
         """Cluster attempts to find patterns"""
-        if len(vectors) < 3:
-            return {'n_clusters': 1, 'main_cluster': vectors.mean(axis=0)}
+        if self._count < 3:
+            return {'n_clusters': 1, 'main_cluster': self.mean}
+        
+        if self.clustering == 'kmeans':
+            return self._fit_kmeans(self.vectors.astype(np.float64))
+        
+        # Online centres are maintained by add_attempt; clusters emptied by
+        # eviction are not reported until the next refinement re-seeds them
+        sizes = self._center_counts[:self._n_centers]
+        active = np.flatnonzero(sizes)
+        main_cluster_idx = active[np.argmax(sizes[active])]
         
-        # Simple k-means with k=2
+        return {
+            'n_clusters': len(active),
+            'main_cluster': self._centers[main_cluster_idx].copy(),
+            'cluster_sizes': sizes[active].tolist()
+        }
+    
+    def _fit_kmeans(self, vectors: np.ndarray) -> Dict:
+        """Fit a fresh KMeans on the whole window (reference mode)"""
         from sklearn.cluster import KMeans
         
-        n_clusters = min(3, len(vectors) // 3)
+        n_clusters = min(self.MAX_CLUSTERS, len(vectors) // 3)
         kmeans = KMeans(n_clusters=n_clusters, random_state=42)
         labels = kmeans.fit_predict(vectors)
         
@@ -425,21 +1191,80 @@ class IntentionAnalyzer:
             'cluster_sizes': counts.tolist()
         }
     
-    def _analyze_trend(self, vectors: np.ndarray) -> np.ndarray:
+    def _update_clusters(self, slot: int, vector: np.ndarray):
+        """Sequential k-means step for a newly stored latent"""
+        if self._n_centers == 0:
+            self._n_centers = 1
+            self._center_counts[0] = 0
+        
+        # Assign to the nearest centre and move that centre to the new mean
+        centers = self._centers[:self._n_centers]
+        label = int(np.argmin(((centers - vector) ** 2).sum(axis=1)))
+        self._labels[slot] = label
+        self._center_counts[label] += 1
+        self._centers[label] += (vector - self._centers[label]) / self._center_counts[label]
+        
+        # Grow k with the window (min(3, n // 3) like the KMeans refit) and
+        # periodically correct stale labels and re-seed emptied clusters
+        target = max(1, min(self.MAX_CLUSTERS, self._count // 3))
+        if target > self._n_centers or self._total_added % self.cluster_refine_every == 0:
+            self._refine_clusters(target)
+    
+    def _remove_from_cluster(self, label: int, vector: np.ndarray):
+        """Remove an evicted latent from its centre's running mean"""
+        self._center_counts[label] -= 1
+        n = self._center_counts[label]
+        if n > 0:
+            self._centers[label] -= (vector - self._centers[label]) / n
+    
+    def _refine_clusters(self, n_clusters: int, iterations: int = 3):
+        """
+        Warm-started Lloyd iterations over the window. New or empty centres
+        are seeded with the latent farthest from the other centres.
+        """
+        vectors = self._latents[:self._count].astype(np.float64)
+        centers = self._centers[:n_clusters]
+        valid = np.zeros(n_clusters, dtype=bool)
+        valid[:self._n_centers] = self._center_counts[:self._n_centers] > 0
+        
+        for _ in range(iterations):
+            for j in np.flatnonzero(~valid):
+                if valid.any():
+                    sq_dist = ((vectors[:, np.newaxis] - centers[np.newaxis, valid]) ** 2).sum(axis=2)
+                    centers[j] = vectors[np.argmax(sq_dist.min(axis=1))]
+                else:
+                    centers[j] = vectors[-1]
+                valid[j] = True
+            
+            labels = np.argmin(((vectors[:, np.newaxis] - centers[np.newaxis]) ** 2).sum(axis=2), axis=1)
+            counts = np.bincount(labels, minlength=n_clusters)
+            for j in range(n_clusters):
+                if counts[j] > 0:
+                    centers[j] = vectors[labels == j].mean(axis=0)
+            valid = counts > 0
+        
+        # Final assignment; centres are exact member means
+        labels = np.argmin(((vectors[:, np.newaxis] - centers[np.newaxis]) ** 2).sum(axis=2), axis=1)
+        counts = np.bincount(labels, minlength=n_clusters)
+        for j in range(n_clusters):
+            if counts[j] > 0:
+                centers[j] = vectors[labels == j].mean(axis=0)
+        
+        self._labels[:self._count] = labels
+        self._center_counts[:n_clusters] = counts
+        self._n_centers = n_clusters
+    
+    def _analyze_trend(self) -> np.ndarray:
         """Analyze the trend direction in latent space"""
-        if len(vectors) < 2:
-            return np.zeros_like(vectors[0])
+        if self._count < 2:
+            return np.zeros(self.latent_dim)
         
         # Weighted average with more weight on recent attempts
-        weights = np.exp(np.linspace(-1, 0, len(vectors)))
-        weights /= weights.sum()
-        
-        # Calculate weighted direction
-        weighted_center = np.average(vectors, axis=0, weights=weights)
+        weighted_center = self._trend_sum / self._trend_weight
         
         # Extrapolate trend
-        if len(vectors) > 5:
-            recent = vectors[-5:]
+        if self._count > 5:
+            recent = self._latest(5)
             direction = recent[-1] - recent[0]
             trend = weighted_center + 0.2 * direction
         else:
@@ -465,24 +1290,20 @@ class IntentionAnalyzer:
                 confidence += 0.2
         
         # Recent consistency
-        if len(self.attempt_history) > 5:
-            recent_vectors = np.array([a.vector for a in self.attempt_history[-5:]])
+        if self._count > 5:
+            recent_vectors = self._latest(5)
             recent_std = np.mean(np.std(recent_vectors, axis=0))
             confidence += 0.2 * (1.0 / (1.0 + recent_std))
         
         return min(1.0, confidence)
     
-    def _predict_target_latent(self, vectors: np.ndarray, trend: np.ndarray) -> np.ndarray:
+    def _predict_target_latent(self, trend: np.ndarray) -> np.ndarray:
         """Predict the target latent vector user is trying to achieve"""
-        if len(vectors) < 3:
+        if self._count < 3:
             return trend
         
-        # Use exponential smoothing for prediction
-        alpha = 0.3  # Smoothing factor
-        
-        predicted = vectors[0].copy()
-        for i in range(1, len(vectors)):
-            predicted = alpha * vectors[i] + (1 - alpha) * predicted
+        # Exponential smoothing (maintained incrementally in add_attempt)
+        predicted = self._ema
         
         # Blend with trend
         final_prediction = 0.7 * predicted + 0.3 * trend
@@ -497,15 +1318,51 @@ class LOLAMathDecoder:
     """
     Decoder to generate optimized mathematical representations
     Based on LOLA's generative approach
+    
+    Generated curves and grids are NumPy arrays; serialization happens at
+    the server boundary (see lola_payload).
+    
+    decode() is memoized in a bounded LRU keyed on the latent rounded to
+    latent_decimals, the type, properties rounded to property_decimals and
+    the resolution. Decoding always uses the rounded inputs, so a cached
+    result is exactly what a fresh decode of the same key would return.
+    Cached arrays are read-only. cache_size=0 disables the cache.
     """
     
-    def __init__(self):
+    # Sample ranges of the evenly spaced axes, shared with compact_result
+    FUNCTION_RANGE = (-5.0, 5.0)
+    PARAMETRIC_RANGE = (0.0, 2 * np.pi)
+    SURFACE_RANGE = (-2.0, 2.0)
+    DEFAULT_RANGE = (0.0, 10.0)
+    
+    def __init__(self, cache_size=256, latent_decimals=3, property_decimals=2):
         self.generators = {
             'function': self._generate_function,
             'shape': self._generate_shape,
             'parametric': self._generate_parametric,
             'surface': self._generate_surface
         }
+        
+        self.cache_size = cache_size
+        self.latent_decimals = latent_decimals
+        self.property_decimals = property_decimals
+        self._cache: 'OrderedDict[tuple, Dict]' = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+    
+    def _round_properties(self, properties: Dict) -> Tuple[Dict, tuple]:
+        """Rounded copy of properties and a hashable key for it"""
+        rounded, key = {}, []
+        for name, value in sorted(properties.items()):
+            if isinstance(value, dict):
+                rounded[name], value_key = self._round_properties(value)
+            elif isinstance(value, (float, np.floating)):
+                rounded[name] = value_key = round(float(value), self.property_decimals)
+            else:
+                rounded[name] = value_key = value
+            key.append((name, value_key))
+        return rounded, tuple(key)
     
     def decode(self, latent_vector: np.ndarray, 
                mathematical_type: str,
@@ -514,6 +1371,46 @@ class LOLAMathDecoder:
         """
         Decode latent representation to optimized mathematical object
         """
+        if not self.cache_size:
+            return self._decode(latent_vector, mathematical_type, properties, resolution)
+        
+        latent_vector = np.round(np.asarray(latent_vector, dtype=np.float64), self.latent_decimals) + 0.0
+        properties, properties_key = self._round_properties(properties)
+        key = (latent_vector.tobytes(), mathematical_type, properties_key, resolution)
+        
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+        
+        if cached is None:
+            cached = self._decode(latent_vector, mathematical_type, properties, resolution)
+            for value in cached['data'].values():
+                if isinstance(value, np.ndarray):
+                    value.setflags(write=False)
+            with self._cache_lock:
+                self.cache_misses += 1
+                self._cache[key] = cached
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        
+        # Fresh top-level dicts so callers may add or replace keys
+        return dict(cached, data=dict(cached['data']))
+    
+    def cache_info(self) -> Dict:
+        """Hit/miss counters and occupancy of the decode cache"""
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'size': len(self._cache),
+            'max_size': self.cache_size
+        }
+    
+    def _decode(self, latent_vector: np.ndarray,
+                mathematical_type: str,
+                properties: Dict,
+                resolution: int) -> Dict:
         if mathematical_type in self.generators:
             result = self.generators[mathematical_type](
                 latent_vector, properties, resolution
@@ -541,7 +1438,7 @@ class LOLAMathDecoder:
         damping = np.abs(latent[3]) * 0.1
         
         # Generate smooth function
-        x = np.linspace(-5, 5, resolution)
+        x = np.linspace(*self.FUNCTION_RANGE, resolution)
         
         # Combine multiple basis functions based on latent
         y = amplitude * np.sin(frequency * x + phase) * np.exp(-damping * np.abs(x))
@@ -559,8 +1456,8 @@ class LOLAMathDecoder:
             y = gaussian_filter1d(y, sigma=2)
         
         return {
-            'x': x.tolist(),
-            'y': y.tolist(),
+            'x': x,
+            'y': y,
             'equation': f"{amplitude:.2f}*sin({frequency:.2f}*x + {phase:.2f})*exp(-{damping:.2f}*|x|)"
         }
     
@@ -602,8 +1499,8 @@ class LOLAMathDecoder:
             x[mid:] = -x[:mid][::-1]
         
         return {
-            'x': x.tolist(),
-            'y': y.tolist(),
+            'x': x,
+            'y': y,
             'type': shape_type
         }
     
@@ -611,7 +1508,7 @@ class LOLAMathDecoder:
                             properties: Dict, 
                             resolution: int) -> Dict:
         """Generate parametric curve from latent code"""
-        t = np.linspace(0, 2*np.pi, resolution)
+        t = np.linspace(*self.PARAMETRIC_RANGE, resolution)
         
         # Decode to Lissajous-like curve
         a = int(np.abs(latent[0]) * 5) + 1
@@ -627,9 +1524,9 @@ class LOLAMathDecoder:
             y += latent[7] * np.cos(5 * t)
         
         return {
-            'x': x.tolist(),
-            'y': y.tolist(),
-            't': t.tolist(),
+            'x': x,
+            'y': y,
+            't': t,
             'equation': f"x = sin({a}t + {delta:.2f}), y = sin({b}t)"
         }
     
@@ -638,8 +1535,8 @@ class LOLAMathDecoder:
                          resolution: int) -> Dict:
         """Generate 3D surface from latent code (for gradient visualization)"""
         res = int(np.sqrt(resolution))
-        x = np.linspace(-2, 2, res)
-        y = np.linspace(-2, 2, res)
+        x = np.linspace(*self.SURFACE_RANGE, res)
+        y = np.linspace(*self.SURFACE_RANGE, res)
         X, Y = np.meshgrid(x, y)
         
         # Decode to surface function
@@ -659,11 +1556,11 @@ class LOLAMathDecoder:
         dZ_dy = np.gradient(Z, axis=0)
         
         return {
-            'X': X.tolist(),
-            'Y': Y.tolist(),
-            'Z': Z.tolist(),
-            'gradient_x': dZ_dx.tolist(),
-            'gradient_y': dZ_dy.tolist(),
+            'X': X,
+            'Y': Y,
+            'Z': Z,
+            'gradient_x': dZ_dx,
+            'gradient_y': dZ_dy,
             'type': '3d_surface'
         }
     
@@ -672,7 +1569,7 @@ class LOLAMathDecoder:
                          resolution: int) -> Dict:
         """Default generator for unknown types"""
         # Generate a smooth curve based on latent
-        t = np.linspace(0, 10, resolution)
+        t = np.linspace(*self.DEFAULT_RANGE, resolution)
         
         # Use latent as Fourier coefficients
         signal = np.zeros(resolution)
@@ -680,10 +1577,36 @@ class LOLAMathDecoder:
             signal += coeff * np.sin((i + 1) * t * 0.5)
         
         return {
-            'x': t.tolist(),
-            'y': signal.tolist()
+            'x': t,
+            'y': signal
         }
     
+    def compact_result(self, decoded: Dict) -> Dict:
+        """
+        Copy of a decode() result with evenly spaced axes replaced by
+        {'linspace': [start, stop, num]}. Surface meshgrids X, Y are dropped
+        in favour of their axes: X[i][j] = x[j], Y[i][j] = y[i].
+        """
+        data = dict(decoded['data'])
+        generator = decoded['type'] if decoded['type'] in self.generators else 'default'
+        
+        def linspace(bounds, num):
+            return {'linspace': [bounds[0], bounds[1], int(num)]}
+        
+        if generator == 'function':
+            data['x'] = linspace(self.FUNCTION_RANGE, len(data['x']))
+        elif generator == 'parametric':
+            data['t'] = linspace(self.PARAMETRIC_RANGE, len(data['t']))
+        elif generator == 'surface':
+            res = len(data.pop('X'))
+            del data['Y']
+            data['x'] = data['y'] = linspace(self.SURFACE_RANGE, res)
+            data['grid'] = 'meshgrid'
+        elif generator == 'default':
+            data['x'] = linspace(self.DEFAULT_RANGE, len(data['x']))
+        
+        return dict(decoded, data=data)
+    
     def _assess_quality(self, result: Dict, properties: Dict) -> float:
         """Assess quality of generated result"""
         score = 0.0
@@ -712,96 +1635,569 @@ class LOLAMathDecoder:
         return min(1.0, score)
 
 
+class UnknownSessionError(KeyError):
+    """A read named a client id that has no session (reads never create one)"""
+
+
+class LOLASession:
+    """
+    Learning state of one student: analyzer, attempt counter and last
+    suggestion. All mutation happens under the session lock.
+    """
+    
+    def __init__(self, client_id: str, session_id: str, latent_dim: int, history_size: int = 100,
+                 analyzer: Optional[IntentionAnalyzer] = None):
+        self.client_id = client_id
+        self.session_id = session_id
+        self.attempt_count = 0
+        self.analyzer = analyzer or IntentionAnalyzer(history_size=history_size, latent_dim=latent_dim)
+        self.last_suggestion = None
+        self.suggestion_version = 0  # bumped whenever last_suggestion changes
+        self.last_active = time.time()
+        self.lock = threading.RLock()
+        # Answer of the last suggestion poll and the analyzer version it saw
+        self.polled_version = -1
+        self.polled_suggestion = None
+        self.spilled = False  # set once the state has moved to disk
+        self.open_stroke: Optional[StrokeAccumulator] = None  # streamed stroke, pen still down
+
+
+class SessionSpillStore:
+    """
+    Idle sessions on disk: the float32 latent ring buffer as a memory-mapped
+    .npy file next to a JSON metadata file, both named by a hash of the
+    client id. The store extends memory, not persistence, and is cleared
+    when the system starts.
+    """
+    
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for stale in self.directory.glob("session_*"):
+            stale.unlink()
+        self._spilled = set()
+    
+    def _paths(self, client_id: str) -> Tuple[Path, Path]:
+        name = "session_" + hashlib.md5(client_id.encode()).hexdigest()
+        return self.directory / f"{name}.npy", self.directory / f"{name}.json"
+    
+    def __contains__(self, client_id: str) -> bool:
+        return client_id in self._spilled
+    
+    def __len__(self) -> int:
+        return len(self._spilled)
+    
+    def spill(self, session: LOLASession):
+        """Write session state to disk (metadata last, so it marks completion)"""
+        latents, meta = session.analyzer.state()
+        ring_path, meta_path = self._paths(session.client_id)
+        
+        tmp = ring_path.with_suffix('.npy.tmp')
+        ring = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float32, shape=latents.shape)
+        ring[:] = latents
+        del ring  # no msync: the store only has to outlive this process
+        os.replace(tmp, ring_path)
+        
+        record = {
+            'client_id': session.client_id,
+            'session_id': session.session_id,
+            'attempt_count': session.attempt_count,
+            'last_suggestion': session.last_suggestion,
+            'suggestion_version': session.suggestion_version,
+            'last_active': session.last_active,
+            'analyzer': meta
+        }
+        tmp = meta_path.with_suffix('.json.tmp')
+        with open(tmp, 'w') as f:
+            f.write(json.dumps(record, default=json_default))
+        os.replace(tmp, meta_path)
+        
+        self._spilled.add(session.client_id)
+    
+    def load(self, client_id: str) -> LOLASession:
+        """Rehydrate a spilled session and remove its files"""
+        ring_path, meta_path = self._paths(client_id)
+        with open(meta_path, 'r') as f:
+            record = json.load(f)
+        
+        ring = np.load(ring_path, mmap_mode='r')
+        analyzer = IntentionAnalyzer.from_state(ring, record['analyzer'])
+        del ring
+        
+        session = LOLASession(client_id, record['session_id'], analyzer.latent_dim, analyzer=analyzer)
+        session.attempt_count = record['attempt_count']
+        session.last_suggestion = record['last_suggestion']
+        session.suggestion_version = record['suggestion_version']
+        session.last_active = record['last_active']
+        
+        self.discard(client_id)
+        return session
+    
+    def discard(self, client_id: str):
+        """Forget the spilled state of client_id, if any"""
+        for path in self._paths(client_id):
+            if path.exists():
+                path.unlink()
+        self._spilled.discard(client_id)
+
+
+class SessionRegistry:
+    """
+    Thread-safe map from client-supplied session id to LOLASession.
+    
+    With max_resident set, the least recently used idle sessions are
+    spilled to spill_store and rehydrated on their next request, so memory
+    is bounded by max_resident rather than by enrollment. Sessions with a
+    stroke still being streamed stay resident; strokes idle for longer than
+    OPEN_STROKE_GRACE seconds are treated as abandoned: they are dropped
+    when their session spills, and every OPEN_STROKE_GRACE seconds a sweep
+    drops them from resident sessions too.
+    
+    Spill and rehydration file I/O runs outside the registry lock: the
+    client id is marked pending meanwhile, and only requests for that
+    client wait for it.
+    """
+    
+    OPEN_STROKE_GRACE = 30.0
+    
+    def __init__(self, factory, max_resident: Optional[int] = None,
+                 spill_store: Optional[SessionSpillStore] = None):
+        if max_resident is not None and (max_resident < 1 or spill_store is None):
+            raise ValueError("max_resident needs a spill_store and must be at least 1")
+        self._factory = factory
+        self.max_resident = max_resident
+        self._spill_store = spill_store
+        self._sessions: 'OrderedDict[str, LOLASession]' = OrderedDict()
+        self._pending: Dict[str, threading.Event] = {}  # spill or load in flight
+        self._lock = threading.Lock()
+        self.spills = 0
+        self.rehydrations = 0
+        self.expired_strokes = 0
+        self._last_sweep = time.time()
+    
+    def get(self, client_id: str, create: bool = True) -> Optional[LOLASession]:
+        """
+        Return the session for client_id, rehydrating it if spilled and
+        creating it if unknown (with create=False, None for unknown ids)
+        """
+        loading = None
+        while True:
+            with self._lock:
+                self._expire_open_strokes()
+                pending = self._pending.get(client_id)
+                if pending is None:
+                    session = self._sessions.get(client_id)
+                    if session is not None:
+                        self._sessions.move_to_end(client_id)
+                        session.last_active = time.time()
+                        return session
+                    if self._spill_store is not None and client_id in self._spill_store:
+                        loading = self._pending[client_id] = threading.Event()
+                        break
+                    if not create:
+                        return None
+                    session = self._factory(client_id)
+                    session.last_active = time.time()
+                    self._sessions[client_id] = session
+                    victims = self._select_victims()
+                    break
+            pending.wait()
+        
+        if loading is None:
+            self._spill(victims)
+            return session
+        
+        # Rehydrate outside the registry lock
+        try:
+            session = self._spill_store.load(client_id)
+        except Exception:
+            with self._lock:
+                del self._pending[client_id]
+            loading.set()
+            raise
+        with self._lock:
+            session.last_active = time.time()
+            self._sessions[client_id] = session
+            del self._pending[client_id]
+            self.rehydrations += 1
+            victims = self._select_victims()
+        loading.set()
+        self._spill(victims)
+        return session
+    
+    def replace(self, client_id: str) -> LOLASession:
+        """Start a fresh session for client_id"""
+        while True:
+            with self._lock:
+                pending = self._pending.get(client_id)
+                if pending is None:
+                    if self._spill_store is not None:
+                        self._spill_store.discard(client_id)
+                    session = self._factory(client_id)
+                    self._sessions[client_id] = session
+                    self._sessions.move_to_end(client_id)
+                    victims = self._select_victims()
+                    break
+            pending.wait()
+        self._spill(victims)
+        return session
+    
+    def _select_victims(self) -> List[LOLASession]:
+        """
+        Under the registry lock: take least recently used sessions beyond
+        max_resident (skipping busy ones) out of the map, mark them pending
+        and return them with their session locks held, for _spill
+        """
+        victims = []
+        if self.max_resident is None:
+            return victims
+        excess = len(self._sessions) - self.max_resident
+        for client_id in list(islice(self._sessions, len(self._sessions) - 1)):
+            if excess <= 0:
+                break
+            session = self._sessions[client_id]
+            if not session.lock.acquire(blocking=False):
+                continue  # mid-request; not idle
+            if session.open_stroke is not None:
+                if time.time() - session.open_stroke.last_active < self.OPEN_STROKE_GRACE:
+                    session.lock.release()
+                    continue  # pen still down
+                session.open_stroke = None
+                self.expired_strokes += 1
+            del self._sessions[client_id]
+            self._pending[client_id] = threading.Event()
+            victims.append(session)
+            excess -= 1
+        return victims
+    
+    def _expire_open_strokes(self):
+        """
+        Under the registry lock, at most once per OPEN_STROKE_GRACE: drop
+        open strokes idle for longer than that (skipping busy sessions)
+        """
+        now = time.time()
+        if now - self._last_sweep < self.OPEN_STROKE_GRACE:
+            return
+        self._last_sweep = now
+        for session in self._sessions.values():
+            stroke = session.open_stroke
+            if stroke is None or now - stroke.last_active < self.OPEN_STROKE_GRACE:
+                continue
+            if session.lock.acquire(blocking=False):
+                if session.open_stroke is stroke:
+                    session.open_stroke = None
+                    self.expired_strokes += 1
+                session.lock.release()
+    
+    def _spill(self, victims: List[LOLASession]):
+        """Write victims to the spill store outside the registry lock, then release them"""
+        for session in victims:
+            try:
+                self._spill_store.spill(session)
+                session.spilled = True
+            except Exception as e:
+                print(f"[SessionRegistry] Failed to spill session {session.client_id}: {e}")
+            finally:
+                with self._lock:
+                    if session.spilled:
+                        self.spills += 1
+                    else:
+                        self._sessions[session.client_id] = session  # keep it resident
+                    done = self._pending.pop(session.client_id)
+                session.lock.release()
+                done.set()
+    
+    def __len__(self) -> int:
+        return len(self._sessions)
+    
+    def client_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._sessions)
+    
+    def metrics(self) -> Dict:
+        """Resident/spilled counts and spill traffic"""
+        return {
+            'resident': len(self._sessions),
+            'spilled': len(self._spill_store) if self._spill_store is not None else 0,
+            'max_resident': self.max_resident,
+            'spills': self.spills,
+            'rehydrations': self.rehydrations,
+            'expired_strokes': self.expired_strokes
+        }
+
+
 class LOLAMathematicalIntentSystem:
     """
     Complete system for learning and optimizing mathematical drawings
     Based on LOLA (Lost in Latent Space) principles
+    
+    Encoder, decoder and attempt log are shared; learning state is kept per
+    client session. Methods without a client_id use the default session.
+    At most max_resident_sessions sessions stay in memory; idle ones are
+    spilled to save_dir/sessions and rehydrated on their next attempt.
+    Strokes pass through a StrokePreprocessor ('none', 'rdp', 'resample' or
+    'rdp+resample') so encoding cost is bounded by preprocess_points.
+    Strokes can also be streamed while drawing (stream_points, then
+    end_stroke at pen-up); their features accumulate per batch.
+    Suggestions are published to suggestion_events as they are produced,
+    tagged with an ETag that changes only when the suggestion does.
+    Every saved latent also goes into latent_index; until a session has
+    enough attempts of its own, its nearest latents from other sessions
+    prime a suggestion.
     """
     
-    def __init__(self, save_dir="lola_math_data"):
-        self.encoder = LOLAMathEncoder(latent_dim=64, compression_rate=256)
-        self.analyzer = IntentionAnalyzer(history_size=100)
-        self.decoder = LOLAMathDecoder()
-        
+    DEFAULT_CLIENT = 'default'
+    # Attempts before intent analysis starts, and neighbours used to prime them
+    ANALYSIS_MIN_ATTEMPTS = 5
+    PRIME_NEIGHBOURS = 10
+    
+    def __init__(self, save_dir="lola_math_data", write_behind=True, fsync_policy='interval',
+                 max_resident_sessions=256, preprocessing='resample', preprocess_points=256):
         self.save_dir = Path(save_dir)
         self.save_dir.mkdir(exist_ok=True)
         
-        self.session_id = self._generate_session_id()
-        self.attempt_count = 0
-        self.last_suggestion = None
+        self.encoder = LOLAMathEncoder(
+            latent_dim=64,
+            compression_rate=256,
+            projection_path=self.save_dir / "encoder_projections.npz"
+        )
+        self.decoder = LOLAMathDecoder()
+        self.preprocessor = StrokePreprocessor(preprocessing, n_points=preprocess_points)
+        self.attempt_log = AttemptLog(self.save_dir / "attempt_log")
+        self.latent_index = LatentIndex(self.save_dir / "latent_index", dim=self.encoder.latent_dim)
+        self.suggestion_events = SuggestionBroker()
+        
+        # Persist attempts off the request path unless disabled
+        self.attempt_writer = (AttemptLogWriter(self.attempt_log, fsync_policy=fsync_policy)
+                               if write_behind else None)
+        
+        self.sessions = SessionRegistry(
+            self._new_session,
+            max_resident=max_resident_sessions,
+            spill_store=SessionSpillStore(self.save_dir / "sessions") if max_resident_sessions else None
+        )
         
         # Load previous sessions
         self.load_history()
     
     def _generate_session_id(self) -> str:
         """Generate unique session ID"""
-        timestamp = str(time.time())
-        return hashlib.md5(timestamp.encode()).hexdigest()[:8]
+        seed = f"{time.time()}-{os.urandom(4).hex()}"
+        return hashlib.md5(seed.encode()).hexdigest()[:8]
+    
+    def _new_session(self, client_id: str) -> LOLASession:
+        return LOLASession(client_id, self._generate_session_id(), self.encoder.latent_dim)
+    
+    def _session(self, client_id: Optional[str], create: bool = True) -> LOLASession:
+        """
+        Session of client_id (default session for None). With create=False
+        an unknown explicit id raises UnknownSessionError instead of
+        registering a new session; the default session is always created.
+        """
+        session = self.sessions.get(client_id or self.DEFAULT_CLIENT, create or client_id is None)
+        if session is None:
+            raise UnknownSessionError(client_id)
+        return session
+    
+    @contextmanager
+    def _locked_session(self, client_id: Optional[str], create: bool = True):
+        """Hold the session lock; retry if the session was spilled meanwhile"""
+        while True:
+            session = self._session(client_id, create)
+            with session.lock:
+                if not session.spilled:
+                    yield session
+                    return
     
-    def add_drawing_attempt(self, stroke_data: Dict) -> Dict:
+    # Single-session view (default client) kept for existing callers; state
+    # is read under the session lock and mutable state is returned as copies
+    @property
+    def session_id(self) -> str:
+        return self._session(None).session_id
+    
+    @property
+    def attempt_count(self) -> int:
+        with self._locked_session(None) as session:
+            return session.attempt_count
+    
+    @property
+    def analyzer(self) -> IntentionAnalyzer:
+        with self._locked_session(None) as session:
+            return copy.deepcopy(session.analyzer)
+    
+    @property
+    def last_suggestion(self) -> Optional[Dict]:
+        with self._locked_session(None) as session:
+            return copy.deepcopy(session.last_suggestion)
+    
+    def add_drawing_attempt(self, stroke_data: Dict, client_id: Optional[str] = None) -> Dict:
         """
         Process new drawing attempt
         Returns analysis results
         """
-        self.attempt_count += 1
+        # Simplify / resample dense strokes before encoding
+        points, (pressure, velocity), preprocessing = self.preprocessor.process(
+            stroke_data['points'],
+            [stroke_data.get('pressure', []), stroke_data.get('velocity', [])]
+        )
         
         # Create stroke object
         stroke = MathematicalStroke(
-            points=stroke_data['points'],
+            points=points.tolist(),
             timestamp=time.time(),
-            pressure=stroke_data.get('pressure', []),
-            velocity=stroke_data.get('velocity', []),
+            pressure=pressure,
+            velocity=velocity,
             context=stroke_data.get('context', 'geometry'),
             dimension=stroke_data.get('dimension', 2)
         )
         
-        # Encode to latent space
+        # Encode to latent space (stateless, runs outside the session lock)
         latent = self.encoder.encode(stroke)
         
-        # Add to analyzer
-        self.analyzer.add_attempt(latent)
-        
-        # Save attempt
-        self._save_attempt(stroke, latent)
-        
-        # Analyze intent after N attempts
-        analysis = None
-        if self.attempt_count >= 5:  # Analyze after every attempt once we have 5+
-            analysis = self.analyzer.analyze_intent(min_attempts=5)
+        return self._record_attempt(client_id, stroke, latent, preprocessing)
+    
+    def add_drawing_attempts(self, strokes_data: List[Dict], client_id: Optional[str] = None) -> List[Dict]:
+        """
+        Process many drawing attempts in one call (classroom replay, backfills)
+        Strokes are encoded together with encode_batch, then recorded in
+        order; a stroke's own client_id overrides client_id (its session_id
+        is ignored: in replayed attempt records that is the session the
+        attempt was made in). A stroke's timestamp is kept if it has one.
+        Returns one add_drawing_attempt result per stroke, in input order.
+        """
+        strokes, stats = [], []
+        for stroke_data in strokes_data:
+            points, (pressure, velocity), preprocessing = self.preprocessor.process(
+                stroke_data['points'],
+                [stroke_data.get('pressure', []), stroke_data.get('velocity', [])]
+            )
+            strokes.append(MathematicalStroke(
+                points=points.tolist(),
+                timestamp=stroke_data.get('timestamp', time.time()),
+                pressure=pressure,
+                velocity=velocity,
+                context=stroke_data.get('context', 'geometry'),
+                dimension=stroke_data.get('dimension', 2)
+            ))
+            stats.append(preprocessing)
+        
+        latents = self.encoder.encode_batch(strokes)
+        
+        return [self._record_attempt(stroke_data.get('client_id') or client_id, stroke, latent, preprocessing)
+                for stroke_data, stroke, latent, preprocessing in zip(strokes_data, strokes, latents, stats)]
+    
+    def stream_points(self, batch: Dict, client_id: Optional[str] = None) -> Dict:
+        """
+        Add a batch of points to the client's open stroke (pen still down)
+        The first batch opens the stroke and may carry context/dimension.
+        """
+        with self._locked_session(client_id) as session:
+            stroke = session.open_stroke
+            if stroke is None:
+                stroke = session.open_stroke = StrokeAccumulator(
+                    context=batch.get('context', 'geometry'),
+                    dimension=batch.get('dimension', 2)
+                )
+            stroke.extend(batch.get('points', []), batch.get('pressure', []), batch.get('velocity', []))
+            return {'session_id': session.session_id, 'points': len(stroke)}
+    
+    def end_stroke(self, client_id: Optional[str] = None, batch: Optional[Dict] = None) -> Dict:
+        """
+        Pen-up: close the open stroke (after an optional last batch) and
+        record it as an attempt. Returns the same result as add_drawing_attempt.
+        """
+        if batch and batch.get('points'):
+            self.stream_points(batch, client_id)
+        with self._locked_session(client_id) as session:
+            stroke, session.open_stroke = session.open_stroke, None
+        if stroke is None or not len(stroke):
+            raise ValueError("No open stroke to end")
+        
+        # Strokes the preprocessor would change take the regular path
+        if not self.preprocessor.passes_through(len(stroke)):
+            return self.add_drawing_attempt({
+                'points': stroke.points, 'pressure': stroke.pressure, 'velocity': stroke.velocity,
+                'context': stroke.context, 'dimension': stroke.dimension
+            }, client_id)
+        
+        latent = stroke.finish(self.encoder)
+        preprocessing = self.preprocessor.record_unchanged(len(stroke))
+        return self._record_attempt(client_id, stroke.to_stroke(), latent, preprocessing)
+    
+    def _record_attempt(self, client_id: Optional[str], stroke: MathematicalStroke,
+                        latent: LatentRepresentation, preprocessing: Dict) -> Dict:
+        """Add an encoded attempt to the session, analyze and suggest"""
+        with self._locked_session(client_id) as session:
+            session.attempt_count += 1
             
-            if analysis and analysis['confidence'] > 0.6:
-                # Generate suggestion
-                self.last_suggestion = self._generate_suggestion(analysis)
+            # Add to analyzer
+            session.analyzer.add_attempt(latent)
+            
+            # Save attempt
+            self._save_attempt(session, stroke, latent, preprocessing['input_points'])
+            
+            # Analyze intent after N attempts
+            analysis = None
+            if session.attempt_count >= self.ANALYSIS_MIN_ATTEMPTS:  # Analyze after every attempt from then on
+                analysis = session.analyzer.analyze_intent(min_attempts=self.ANALYSIS_MIN_ATTEMPTS)
                 
-                return {
-                    'attempt': self.attempt_count,
-                    'latent_vector': latent.vector.tolist(),
-                    'compression_rate': latent.compression_rate,
-                    'analysis': analysis,
-                    'suggestion': self.last_suggestion,
-                    'message': 'I think I understand what you\'re trying to draw. Here\'s my suggestion:'
-                }
-        
-        return {
-            'attempt': self.attempt_count,
-            'latent_vector': latent.vector.tolist(),
-            'compression_rate': latent.compression_rate,
-            'analysis': analysis,
-            'message': f'Attempt {self.attempt_count} recorded. Keep drawing, I\'m learning your intent...'
-        }
+                if analysis and analysis['confidence'] > 0.6:
+                    # Generate suggestion
+                    session.last_suggestion = self._generate_suggestion(session, analysis)
+                    session.suggestion_version += 1
+                    self.suggestion_events.publish(session.client_id, self._suggestion_etag(session),
+                                                   session.last_suggestion)
+                    
+                    return {
+                        'attempt': session.attempt_count,
+                        'session_id': session.session_id,
+                        'latent_vector': latent.vector,
+                        'compression_rate': latent.compression_rate,
+                        'analysis': analysis,
+                        'preprocessing': preprocessing,
+                        'suggestion': session.last_suggestion,
+                        'message': 'I think I understand what you\'re trying to draw. Here\'s my suggestion:'
+                    }
+            
+            result = {
+                'attempt': session.attempt_count,
+                'session_id': session.session_id,
+                'latent_vector': latent.vector,
+                'compression_rate': latent.compression_rate,
+                'analysis': analysis,
+                'preprocessing': preprocessing,
+                'message': f'Attempt {session.attempt_count} recorded. Keep drawing, I\'m learning your intent...'
+            }
+            
+            # Too few attempts to analyze: look at similar past drawings
+            if session.attempt_count < self.ANALYSIS_MIN_ATTEMPTS:
+                neighbours = self.latent_index.query(latent.vector, k=self.PRIME_NEIGHBOURS,
+                                                     exclude_session=session.session_id)
+                if neighbours:
+                    result['similar_attempts'] = [{key: value for key, value in n.items() if key != 'vector'}
+                                                  for n in neighbours]
+                    result['primed_suggestion'] = self._primed_suggestion(session, neighbours)
+            
+            return result
     
-    def _generate_suggestion(self, analysis: Dict) -> Dict:
+    def _generate_suggestion(self, session: LOLASession, analysis: Dict) -> Dict:
         """Generate optimized suggestion based on analysis"""
         suggested_latent = analysis['suggested_latent']
         dominant_type = analysis['dominant_type']
         
         # Get average properties from recent attempts
         recent_properties = {}
-        if len(self.analyzer.attempt_history) > 0:
-            recent = self.analyzer.attempt_history[-5:]
+        if len(session.analyzer.attempt_history) > 0:
+            recent = session.analyzer.recent_attempts(5)
             for prop in ['continuity', 'smoothness', 'symmetry', 'periodicity']:
                 values = [a.physical_properties.get(prop, 0) for a in recent]
-                recent_properties[prop] = np.mean(values) if values else 0
+                if values and isinstance(values[0], dict):
+                    # Nested measures (e.g. symmetry) are averaged per key
+                    recent_properties[prop] = {
+                        key: np.mean([v.get(key, 0) for v in values]) for key in values[0]
+                    }
+                else:
+                    recent_properties[prop] = np.mean(values) if values else 0
         
         # Decode to optimized result
         optimized = self.decoder.decode(
@@ -813,171 +2209,370 @@ class LOLAMathematicalIntentSystem:
         
         return optimized
     
-    def get_optimized_result(self) -> Optional[Dict]:
+    def _primed_suggestion(self, session: LOLASession, neighbours: List[Dict]) -> Dict:
+        """Suggestion decoded from the mean of similar latents of other sessions"""
+        suggested = np.mean([n['vector'] for n in neighbours], axis=0).astype(np.float64)
+        suggested /= np.linalg.norm(suggested) + 1e-8
+        dominant_type = Counter(n['type'] for n in neighbours).most_common(1)[0][0]
+        return self._generate_suggestion(session, {'suggested_latent': suggested, 'dominant_type': dominant_type})
+    
+    def get_optimized_result(self, client_id: Optional[str] = None) -> Optional[Dict]:
         """Get the current best optimized result"""
-        if self.last_suggestion:
-            return self.last_suggestion
-        
-        # Try to generate from current state
-        analysis = self.analyzer.analyze_intent(min_attempts=3)
-        if analysis and analysis['confidence'] > 0.4:
-            return self._generate_suggestion(analysis)
-        
-        return None
+        return self.tagged_result(client_id)[1]
+    
+    @staticmethod
+    def _suggestion_etag(session: LOLASession) -> str:
+        """Weak ETag of the pushed suggestion (one per suggestion_version)"""
+        return f'W/"{session.session_id}-{session.suggestion_version}"'
+    
+    def tagged_result(self, client_id: Optional[str] = None) -> Tuple[str, Optional[Dict]]:
+        """
+        get_optimized_result together with an ETag that changes with the result
+        Raises UnknownSessionError for a client id without a session.
+        """
+        with self._locked_session(client_id, create=False) as session:
+            if session.last_suggestion:
+                return self._suggestion_etag(session), session.last_suggestion
+            
+            # Nothing drawn since the last poll: reuse its answer
+            version = session.analyzer.version
+            etag = f'W/"{session.session_id}-a{version}"'
+            if session.polled_version == version:
+                return etag, session.polled_suggestion
+            
+            # Try to generate from current state
+            suggestion = None
+            analysis = session.analyzer.analyze_intent(min_attempts=3)
+            if analysis and analysis['confidence'] > 0.4:
+                suggestion = self._generate_suggestion(session, analysis)
+            
+            session.polled_version, session.polled_suggestion = version, suggestion
+            return etag, suggestion
     
-    def _save_attempt(self, stroke: MathematicalStroke, latent: LatentRepresentation):
+    def latest_suggestion(self, client_id: Optional[str] = None) -> Tuple[Optional[str], Optional[Dict]]:
+        """
+        Last pushed suggestion of the session and its ETag, (None, None) if
+        none yet; UnknownSessionError for a client id without a session
+        """
+        with self._locked_session(client_id, create=False) as session:
+            if not session.last_suggestion:
+                return None, None
+            return self._suggestion_etag(session), session.last_suggestion
+    
+    def subscribe_suggestions(self, client_id: Optional[str] = None):
+        """Context manager yielding the client's SuggestionChannel"""
+        return self.suggestion_events.subscribe(client_id or self.DEFAULT_CLIENT)
+    
+    def _save_attempt(self, session: LOLASession, stroke: MathematicalStroke, latent: LatentRepresentation,
+                      input_points: int):
         """Save attempt to disk for long-term learning"""
         attempt_data = {
-            'session_id': self.session_id,
-            'attempt': self.attempt_count,
+            'session_id': session.session_id,
+            'client_id': session.client_id,
+            'attempt': session.attempt_count,
             'timestamp': stroke.timestamp,
             'stroke': asdict(stroke),
+            'input_points': input_points,  # before preprocessing
             'latent_vector': latent.vector.tolist(),
             'compression_rate': latent.compression_rate,
             'properties': latent.physical_properties,
             'type': latent.mathematical_type
         }
         
-        # Save to JSON
-        filename = self.save_dir / f"session_{self.session_id}_attempt_{self.attempt_count:04d}.json"
-        with open(filename, 'w') as f:
-            json.dump(attempt_data, f, indent=2)
-        
-        # Also save consolidated history
-        self._update_history()
-    
-    def _update_history(self):
-        """Update consolidated history file"""
-        history_file = self.save_dir / "consolidated_history.pkl"
-        
-        history = {
-            'sessions': {},
-            'total_attempts': 0,
-            'mathematical_types': {},
-            'latent_clusters': []
-        }
-        
-        if history_file.exists():
-            with open(history_file, 'rb') as f:
-                history = pickle.load(f)
-        
-        # Update with current session
-        if self.session_id not in history['sessions']:
-            history['sessions'][self.session_id] = {
-                'start_time': time.time(),
-                'attempts': []
-            }
-        
-        history['sessions'][self.session_id]['attempts'].append(self.attempt_count)
-        history['total_attempts'] += 1
-        
-        # Save updated history
-        with open(history_file, 'wb') as f:
-            pickle.dump(history, f)
+        # Append to the attempt log (session/attempt index kept by the log);
+        # a record the writer dropped (counted in its metrics) is not indexed
+        # either, so neighbours from the index always exist in the log
+        if self.attempt_writer is not None:
+            if not self.attempt_writer.submit(attempt_data):
+                return
+        else:
+            self.attempt_log.append(attempt_data)
+        self.latent_index.add(latent.vector, session.session_id, session.attempt_count, latent.mathematical_type)
     
     def load_history(self):
         """Load previous learning history"""
-        history_file = self.save_dir / "consolidated_history.pkl"
+        history = self.attempt_log.summary()
+        
+        if history['total_attempts'] > 0:
+            print(f"Loaded history: {history['total_attempts']} total attempts from {len(history['sessions'])} sessions")
+        elif any(self.save_dir.glob("session_*_attempt_*.json")):
+            print(f"[INFO] Legacy attempt files found in {self.save_dir}; import them with:")
+            print(f"       python src/lola-integration/lola_attempt_log.py migrate {self.save_dir}")
         
-        if history_file.exists():
-            with open(history_file, 'rb') as f:
-                history = pickle.load(f)
-                print(f"Loaded history: {history['total_attempts']} total attempts from {len(history['sessions'])} sessions")
-                return history
+        if history['total_attempts'] > len(self.latent_index):
+            self._catch_up_latent_index()
         
-        return None
+        return history
     
-    def reset_session(self):
-        """Start a new session"""
-        self.session_id = self._generate_session_id()
-        self.attempt_count = 0
-        self.analyzer = IntentionAnalyzer(history_size=100)
-        self.last_suggestion = None
+    def _catch_up_latent_index(self, batch_size=4096):
+        """Index logged attempts missing from latent_index (new index, or lost tail)"""
+        indexed = self.latent_index.keys()
+        batch = []
+        
+        def flush():
+            self.latent_index.add_many(np.array([r['latent_vector'] for r in batch]),
+                                       [r['session_id'] for r in batch], [r['attempt'] for r in batch],
+                                       [r['type'] for r in batch])
+            batch.clear()
+        
+        for record in self.attempt_log.iter_records():
+            if (record['session_id'], record['attempt']) not in indexed:
+                batch.append(record)
+                if len(batch) == batch_size:
+                    flush()
+        if batch:
+            flush()
+        print(f"Latent index: {len(self.latent_index)} latents")
     
-    def export_learning_data(self) -> Dict:
-        """Export learning data for analysis"""
-        return {
-            'session_id': self.session_id,
-            'total_attempts': self.attempt_count,
-            'analyzer_history': len(self.analyzer.attempt_history),
-            'last_suggestion': self.last_suggestion,
-            'save_directory': str(self.save_dir)
-        }
+    def persistence_metrics(self) -> Dict:
+        """Queue depth and dropped/late write counters of the attempt writer"""
+        if self.attempt_writer is None:
+            return {'write_behind': False}
+        return dict(self.attempt_writer.metrics(), write_behind=True)
+    
+    def close(self):
+        """Flush pending attempts to disk (call on shutdown)"""
+        self.suggestion_events.close()
+        if self.attempt_writer is not None:
+            self.attempt_writer.close()
+        self.attempt_log.close()
+        self.latent_index.close()
+    
+    def reset_session(self, client_id: Optional[str] = None) -> str:
+        """Start a new session; returns its session id"""
+        return self.sessions.replace(client_id or self.DEFAULT_CLIENT).session_id
+    
+    def export_learning_data(self, client_id: Optional[str] = None) -> Dict:
+        """Export learning data for analysis (UnknownSessionError for an unknown client id)"""
+        with self._locked_session(client_id, create=False) as session:
+            return {
+                'session_id': session.session_id,
+                'client_id': session.client_id,
+                'total_attempts': session.attempt_count,
+                'analyzer_history': len(session.analyzer.attempt_history),
+                'last_suggestion': copy.deepcopy(session.last_suggestion),
+                'save_directory': str(self.save_dir)
+            }
 
 
 # HTTP Server for integration
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
 import json
 
+class LOLAMathHTTPServer(ThreadingHTTPServer):
+    """One thread per connection; session state is locked per student"""
+    daemon_threads = True
+    request_queue_size = 128  # a classroom connecting at once overflows the default of 5
+
+
 class LOLAMathServer(BaseHTTPRequestHandler):
     # Class variable to store the system
     system = None
+    # Seconds between keep-alive comments on idle /events streams
+    EVENT_KEEPALIVE = 15.0
     
     @classmethod
     def set_system(cls, system):
         cls.system = system
     
+    def _client_id(self, body: Optional[Dict] = None) -> Optional[str]:
+        """Session id from X-Session-Id header, ?session_id= or request body"""
+        client_id = self.headers.get('X-Session-Id')
+        if not client_id:
+            client_id = parse_qs(urlsplit(self.path).query).get('session_id', [None])[0]
+        if not client_id and body:
+            client_id = body.get('session_id')
+        return client_id or None
+    
+    def _compact(self) -> bool:
+        """?compact=1 omits arrays the client can rebuild (linspace axes, meshgrids)"""
+        return parse_qs(urlsplit(self.path).query).get('compact', ['0'])[0] not in ('0', 'false', '')
+    
+    def _send_json(self, payload, extra_headers: Optional[Dict[str, str]] = None):
+        """Send payload as JSON, gzip JSON, binary or msgpack per Accept headers"""
+        body, headers = encode_response(payload, self.headers.get('Accept', ''),
+                                        self.headers.get('Accept-Encoding', ''))
+        headers.update(extra_headers or {})
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _read_chunks(self):
+        """Yield the chunks of a Transfer-Encoding: chunked request body as they arrive"""
+        while True:
+            size = int(self.rfile.readline().split(b';')[0], 16)
+            if size == 0:
+                while self.rfile.readline().strip():  # trailers
+                    pass
+                return
+            yield self.rfile.read(size)
+            self.rfile.readline()  # CRLF after the chunk data
+    
+    def _stream_stroke(self) -> Dict:
+        """Chunked /stroke: NDJSON point batches applied on arrival, pen-up at end of body"""
+        client_id = self._client_id()
+        pending = b''
+        for chunk in self._read_chunks():
+            *lines, pending = (pending + chunk).split(b'\n')
+            for line in lines:
+                if line.strip():
+                    batch = json.loads(line)
+                    client_id = self._client_id(batch)
+                    self.system.stream_points(batch, client_id)
+        if pending.strip():
+            batch = json.loads(pending)
+            client_id = self._client_id(batch)
+            self.system.stream_points(batch, client_id)
+        return self.system.end_stroke(client_id)
+    
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers',
+                         'Content-Type, Accept, X-Session-Id, If-None-Match, Last-Event-ID')
         self.end_headers()
     
+    def _send_event(self, etag: str, suggestion: Dict):
+        """Write one Server-Sent Event carrying a suggestion"""
+        if self._compact():
+            suggestion = self.system.decoder.compact_result(suggestion)
+        data = json.dumps(suggestion, default=json_default)
+        self.wfile.write(f"id: {etag}\nevent: suggestion\ndata: {data}\n\n".encode('utf-8'))
+        self.wfile.flush()
+    
+    def _stream_suggestions(self, client_id: Optional[str]):
+        """
+        GET /events: Server-Sent Events stream of the session's suggestions
+        The current suggestion is sent first unless the client already has
+        it (Last-Event-ID, sent by EventSource on reconnect, or If-None-Match).
+        """
+        seen = self.headers.get('Last-Event-ID') or self.headers.get('If-None-Match')
+        self.system.latest_suggestion(client_id)  # unknown session: 404 before the stream starts
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        
+        try:
+            self.wfile.write(b"retry: 3000\n\n")
+            with self.system.subscribe_suggestions(client_id) as channel:
+                etag, suggestion = self.system.latest_suggestion(client_id)
+                if suggestion is not None and etag != seen:
+                    self._send_event(etag, suggestion)
+                    seen = etag
+                while not channel.closed:
+                    event = channel.wait(seen, self.EVENT_KEEPALIVE)
+                    if event is None:
+                        self.wfile.write(b": keepalive\n\n")  # also detects closed connections
+                        continue
+                    seen, suggestion = event
+                    self._send_event(seen, suggestion)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client went away
+    
     def do_GET(self):
-        if self.path == '/status':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
+        try:
+            self._get(urlsplit(self.path).path, self._client_id())
+        except UnknownSessionError:
+            self.send_error(404, "Unknown session")
+    
+    def _get(self, path: str, client_id: Optional[str]):
+        """GET routes; reads never create sessions"""
+        if path == '/status':
+            learning_data = self.system.export_learning_data(client_id)
             status = {
                 'status': 'running',
-                'session_id': self.system.session_id,
-                'attempts': self.system.attempt_count,
-                'learning_data': self.system.export_learning_data()
+                'session_id': learning_data['session_id'],
+                'attempts': learning_data['total_attempts'],
+                'learning_data': learning_data,
+                'sessions': self.system.sessions.metrics(),
+                'decoder_cache': self.system.decoder.cache_info(),
+                'preprocessing': self.system.preprocessor.metrics(),
+                'persistence': self.system.persistence_metrics(),
+                'events': self.system.suggestion_events.metrics(),
+                'latent_index': self.system.latent_index.metrics()
             }
+            self._send_json(status)
             
-            self.wfile.write(json.dumps(status).encode())
-            
-        elif self.path == '/suggestion':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
-            suggestion = self.system.get_optimized_result()
+        elif path == '/suggestion':
+            etag, suggestion = self.system.tagged_result(client_id)
+            if etag == self.headers.get('If-None-Match'):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                return
+            if suggestion and self._compact():
+                suggestion = self.system.decoder.compact_result(suggestion)
+            self._send_json(suggestion or {}, {'ETag': etag, 'Access-Control-Expose-Headers': 'ETag'})
             
-            self.wfile.write(json.dumps(suggestion or {}).encode())
+        elif path == '/events':
+            self._stream_suggestions(client_id)
     
     def do_POST(self):
-        if self.path == '/attempt':
+        path = urlsplit(self.path).path
+        
+        if path == '/attempt':
             content_length = int(self.headers['Content-Length'])
             post_data = self.rfile.read(content_length)
             
             try:
                 stroke_data = json.loads(post_data)
-                result = self.system.add_drawing_attempt(stroke_data)
+                result = self.system.add_drawing_attempt(stroke_data, self._client_id(stroke_data))
+                if result.get('suggestion') and self._compact():
+                    result['suggestion'] = self.system.decoder.compact_result(result['suggestion'])
+                self._send_json(result)
                 
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
+            except ValueError as e:
+                self.send_error(400, str(e))
+            except Exception as e:
+                self.send_error(500, str(e))
                 
-                self.wfile.write(json.dumps(result).encode())
+        elif path == '/attempts':
+            try:
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                strokes = body['strokes'] if isinstance(body, dict) else body
+                results = self.system.add_drawing_attempts(
+                    strokes, self._client_id(body if isinstance(body, dict) else None))
+                if self._compact():
+                    for result in results:
+                        if result.get('suggestion'):
+                            result['suggestion'] = self.system.decoder.compact_result(result['suggestion'])
+                self._send_json({'count': len(results), 'results': results})
                 
+            except ValueError as e:
+                self.send_error(400, str(e))
             except Exception as e:
                 self.send_error(500, str(e))
                 
-        elif self.path == '/reset':
-            self.system.reset_session()
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
-            self.wfile.write(json.dumps({'status': 'reset', 'new_session': self.system.session_id}).encode())
+        elif path == '/stroke':
+            try:
+                if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+                    result = self._stream_stroke()
+                else:
+                    batch = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                    if batch.get('end'):
+                        result = self.system.end_stroke(self._client_id(batch), batch)
+                    else:
+                        result = self.system.stream_points(batch, self._client_id(batch))
+                if result.get('suggestion') and self._compact():
+                    result['suggestion'] = self.system.decoder.compact_result(result['suggestion'])
+                self._send_json(result)
+                
+            except ValueError as e:
+                self.send_error(400, str(e))
+            except Exception as e:
+                self.send_error(500, str(e))
+                
+        elif path == '/reset':
+            new_session = self.system.reset_session(self._client_id())
+            self._send_json({'status': 'reset', 'new_session': new_session})
     
     def log_message(self, format, *args):
         # Suppress default logging
@@ -999,19 +2594,25 @@ def main():
     
     # Start server
     PORT = 8092
-    server = HTTPServer(('localhost', PORT), LOLAMathServer)
+    server = LOLAMathHTTPServer(('localhost', PORT), LOLAMathServer)
     
     print(f'[LOLA Math Intent] Server starting on http://localhost:{PORT}')
     print('[LOLA Math Intent] Endpoints:')
     print('  POST /attempt - Submit drawing attempt')
-    print('  GET /suggestion - Get optimized suggestion')
+    print('  POST /attempts - Submit many attempts at once ({"strokes": [...]}, replay/backfill)')
+    print('  POST /stroke - Stream point batches while drawing ({"end": true} or end of chunked body = pen-up)')
+    print('  GET /suggestion - Get optimized suggestion (ETag / If-None-Match)')
+    print('  GET /events - Server-Sent Events: suggestions pushed as they are made')
     print('  GET /status - Get system status')
     print('  POST /reset - Reset session')
+    print('  (send X-Session-Id header or session_id to keep students apart)')
+    print('  (Accept: application/x-lola-binary or application/msgpack; ?compact=1 drops rebuildable axes)')
     print('')
     print('[INFO] System ready for mathematical intent learning!')
     print('[INFO] Compression rate: 256x')
     print('[INFO] Latent dimension: 64')
     print('[INFO] Suggestion after 5+ attempts')
+    print(f'[INFO] Resident sessions: {system.sessions.max_resident} (idle ones spill to disk)')
     print('')
     print('Press Ctrl+C to stop')
     
@@ -1020,6 +2621,9 @@ def main():
     except KeyboardInterrupt:
         print('\n[LOLA Math Intent] Shutting down...')
         server.shutdown()
+    finally:
+        system.close()
+        print('[LOLA Math Intent] Pending attempts flushed to disk')
 
 
 if __name__ == '__main__':
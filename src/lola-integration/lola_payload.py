@@ -0,0 +1,166 @@
+"""
+Response encoding for the LOLA servers
+JSON (optionally gzipped), raw float32 binary frames, or msgpack
+
+Binary frame (application/x-lola-binary), little-endian:
+    b'LOLB' | u32 header length | header JSON | zero padding to 8 bytes | array data
+
+The header is {"payload": ..., "arrays": [{"dtype", "shape", "offset"}, ...]}
+where every NumPy array in the payload is replaced by {"$array": index}.
+Array offsets are relative to the start of the array data and aligned to
+8 bytes, so clients can view them in place (e.g. new Float32Array(buf, off, n)).
+Floating arrays are sent as float32, integer arrays as int32.
+"""
+
+import gzip
+import json
+import struct
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+JSON = 'application/json'
+BINARY = 'application/x-lola-binary'
+MSGPACK = 'application/msgpack'
+
+MAGIC = b'LOLB'
+GZIP_MIN_BYTES = 1024  # smaller bodies are not worth the gzip header
+
+
+def json_default(obj):
+    """Serialize NumPy arrays and scalars found in payloads"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _wire_array(array: np.ndarray) -> np.ndarray:
+    if np.issubdtype(array.dtype, np.floating):
+        return np.ascontiguousarray(array, dtype='<f4')
+    if np.issubdtype(array.dtype, np.integer) or array.dtype == bool:
+        return np.ascontiguousarray(array, dtype='<i4')
+    raise TypeError(f"Unsupported array dtype {array.dtype}")
+
+
+def _extract_arrays(obj, arrays: List[np.ndarray]):
+    """Replace arrays by {"$array": i} references, collecting them in order"""
+    if isinstance(obj, np.ndarray):
+        arrays.append(_wire_array(obj))
+        return {'$array': len(arrays) - 1}
+    if isinstance(obj, dict):
+        return {key: _extract_arrays(value, arrays) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_extract_arrays(value, arrays) for value in obj]
+    return obj
+
+
+def pack_binary(payload) -> bytes:
+    """Encode a payload as a binary frame"""
+    arrays: List[np.ndarray] = []
+    structure = _extract_arrays(payload, arrays)
+
+    specs, offset = [], 0
+    for array in arrays:
+        specs.append({'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset})
+        offset += -(-array.nbytes // 8) * 8
+
+    header = json.dumps({'payload': structure, 'arrays': specs},
+                        separators=(',', ':'), default=json_default).encode('utf-8')
+    prefix = MAGIC + struct.pack('<I', len(header)) + header
+    prefix += b'\0' * (-len(prefix) % 8)
+
+    body = bytearray(prefix)
+    for array, spec in zip(arrays, specs):
+        body += b'\0' * (len(prefix) + spec['offset'] - len(body))
+        body += array.tobytes()
+    return bytes(body)
+
+
+def unpack_binary(data: bytes):
+    """Decode a binary frame; arrays are read-only views into data"""
+    if data[:4] != MAGIC:
+        raise ValueError("Not a LOLA binary frame")
+    (header_len,) = struct.unpack_from('<I', data, 4)
+    header = json.loads(data[8:8 + header_len])
+    start = 8 + header_len + (-(8 + header_len) % 8)
+
+    arrays = [np.frombuffer(data, dtype=spec['dtype'], count=int(np.prod(spec['shape'])),
+                            offset=start + spec['offset']).reshape(spec['shape'])
+              for spec in header['arrays']]
+
+    def restore(obj):
+        if isinstance(obj, dict):
+            if len(obj) == 1 and '$array' in obj:
+                return arrays[obj['$array']]
+            return {key: restore(value) for key, value in obj.items()}
+        if isinstance(obj, list):
+            return [restore(value) for value in obj]
+        return obj
+
+    return restore(header['payload'])
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, np.ndarray):
+        array = _wire_array(obj)
+        return {'dtype': array.dtype.str, 'shape': list(array.shape), 'data': array.tobytes()}
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not msgpack serializable")
+
+
+def pack_msgpack(payload) -> bytes:
+    """Encode a payload with msgpack; arrays become {dtype, shape, data} maps"""
+    import msgpack
+    return msgpack.packb(payload, default=_msgpack_default, use_bin_type=True)
+
+
+def _msgpack_available() -> bool:
+    try:
+        import msgpack  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _accepts(header: str, media_type: str) -> bool:
+    """True if media_type is listed in an Accept-style header with q > 0"""
+    for item in (header or '').split(','):
+        name, *params = [part.strip() for part in item.split(';')]
+        if name.lower() != media_type:
+            continue
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    return float(param[2:]) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def encode_response(payload, accept: str = '', accept_encoding: str = '') -> Tuple[bytes, Dict[str, str]]:
+    """
+    Pick the response format from the Accept / Accept-Encoding headers
+    Returns (body, headers); JSON is the default and is gzipped when
+    the client accepts gzip and the body is large enough to benefit.
+    """
+    headers = {'Vary': 'Accept, Accept-Encoding'}
+
+    if _accepts(accept, BINARY):
+        body = pack_binary(payload)
+        headers['Content-Type'] = BINARY
+    elif _accepts(accept, MSGPACK) and _msgpack_available():
+        body = pack_msgpack(payload)
+        headers['Content-Type'] = MSGPACK
+    else:
+        body = json.dumps(payload, default=json_default).encode('utf-8')
+        headers['Content-Type'] = JSON
+        if _accepts(accept_encoding, 'gzip') and len(body) >= GZIP_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+
+    headers['Content-Length'] = str(len(body))
+    return body, headers
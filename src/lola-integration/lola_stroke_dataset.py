@@ -0,0 +1,245 @@
+"""
+Columnar stroke dataset for LOLA training and analytics
+One consolidated copy of the attempt log that loads without JSON parsing
+
+Layout of the dataset directory (every array is a plain .npy file and is
+opened memory-mapped):
+    DATASET.json       record count, column names, source log version
+    points.npy         (total_points, 2) float32, all strokes back to back
+    offsets.npy        (count + 1,) int64, stroke i is points[offsets[i]:offsets[i + 1]]
+    latent.npy         (count, latent_dim) float32 encoder latents
+    <column>.npy       one value per attempt: session_id, attempt, timestamp,
+                       context, dimension, type, input_points
+
+Only x and y are stored per point. The dataset is rebuilt from the attempt
+log by export_dataset and swapped in with a directory rename, so readers
+never see a half-written dataset.
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from lola_attempt_log import AttemptLog
+
+MANIFEST = "DATASET.json"
+POINT_DIMS = 2
+
+# Per-attempt columns: name -> (attempt record getter, dtype; None = fixed-width bytes)
+COLUMNS = {
+    'session_id': (lambda r: r['session_id'], None),
+    'attempt': (lambda r: r['attempt'], np.int32),
+    'timestamp': (lambda r: r['stroke'].get('timestamp', r.get('timestamp', 0.0)), np.float64),
+    'context': (lambda r: r['stroke'].get('context', 'geometry'), None),
+    'dimension': (lambda r: r['stroke'].get('dimension', 2), np.int8),
+    'type': (lambda r: r.get('type', ''), None),
+    'input_points': (lambda r: r.get('input_points', len(r['stroke']['points'])), np.int32),
+}
+STRING_COLUMNS = tuple(name for name, (_, dtype) in COLUMNS.items() if dtype is None)
+
+
+def _stroke_points(record: Dict) -> np.ndarray:
+    points = np.asarray(record['stroke']['points'], dtype=np.float32)
+    if points.size == 0:
+        return np.zeros((0, POINT_DIMS), dtype=np.float32)
+    return points[:, :POINT_DIMS]
+
+
+def export_records(records: Iterable[Dict], directory, source_records: Optional[int] = None,
+                   source_version: Optional[List[int]] = None, chunk_points=1 << 20) -> int:
+    """
+    Write attempt records as a columnar dataset at directory (replacing it)
+    Points are streamed to disk, so memory holds only the per-attempt
+    columns. Returns the number of records written.
+    """
+    directory = Path(directory)
+    tmp_dir = directory.with_name(directory.name + '.tmp')
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    offsets = [0]
+    columns: Dict[str, List] = {name: [] for name in COLUMNS}
+    latents = []
+    pending, pending_points = [], 0
+    raw_path = tmp_dir / "points.f32"
+    with open(raw_path, 'wb') as raw:
+        for record in records:
+            points = _stroke_points(record)
+            pending.append(points)
+            pending_points += len(points)
+            offsets.append(offsets[-1] + len(points))
+            for name, (get, _) in COLUMNS.items():
+                columns[name].append(get(record))
+            latents.append(record['latent_vector'])
+            if pending_points >= chunk_points:
+                raw.write(np.concatenate(pending).tobytes())
+                pending, pending_points = [], 0
+        if pending:
+            raw.write(np.concatenate(pending).tobytes())
+
+    # Raw point stream -> .npy (header needs the final shape)
+    total = offsets[-1]
+    points = np.lib.format.open_memmap(tmp_dir / "points.npy", mode='w+', dtype=np.float32,
+                                       shape=(total, POINT_DIMS))
+    raw = np.memmap(raw_path, dtype=np.float32, mode='r', shape=(total, POINT_DIMS)) if total else None
+    for start in range(0, total, chunk_points):
+        points[start:start + chunk_points] = raw[start:start + chunk_points]
+    points.flush()
+    del points, raw
+    raw_path.unlink()
+
+    np.save(tmp_dir / "offsets.npy", np.array(offsets, dtype=np.int64))
+    np.save(tmp_dir / "latent.npy", np.array(latents, dtype=np.float32) if latents
+            else np.zeros((0, 0), dtype=np.float32))
+    for name, (_, dtype) in COLUMNS.items():
+        if dtype is None:
+            values = np.array([str(v).encode() for v in columns[name]], dtype=bytes)
+        else:
+            values = np.array(columns[name], dtype=dtype)
+        np.save(tmp_dir / f"{name}.npy", values)
+
+    manifest = {
+        'count': len(offsets) - 1,
+        'points': total,
+        'columns': ['latent'] + list(COLUMNS),
+        'source_records': len(offsets) - 1 if source_records is None else source_records,
+        'source_version': source_version,
+        'created': time.time()
+    }
+    with open(tmp_dir / MANIFEST, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    # Swap in: the old directory is only removed after the rename
+    old_dir = directory.with_name(directory.name + '.old')
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    if directory.exists():
+        os.replace(directory, old_dir)
+    os.replace(tmp_dir, directory)
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+
+    return manifest['count']
+
+
+def export_dataset(save_dir, directory=None, log: Optional[AttemptLog] = None) -> int:
+    """Export every live attempt of save_dir's attempt log (default: save_dir/stroke_dataset)"""
+    save_dir = Path(save_dir)
+    owns_log = log is None
+    if owns_log:
+        log = AttemptLog(save_dir / "attempt_log")
+    try:
+        # Taken before reading, so appends during the export leave it stale
+        version = log.version
+        return export_records(log.iter_records(), directory or save_dir / "stroke_dataset",
+                              source_records=len(log), source_version=version)
+    finally:
+        if owns_log:
+            log.close()
+
+
+class StrokeDataset:
+    """
+    Read-only view of an exported dataset; arrays are memory-mapped and
+    per-stroke points are slices of the shared point buffer (no copies)
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        with open(self.directory / MANIFEST, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.points = self._load("points")
+        self.offsets = self._load("offsets")
+        self.columns = {name: self._load(name) for name in self.manifest['columns']}
+
+    def _load(self, name: str) -> np.ndarray:
+        path = self.directory / f"{name}.npy"
+        try:
+            return np.load(path, mmap_mode='r')
+        except ValueError:
+            return np.load(path)  # empty arrays cannot be memory-mapped
+
+    def __len__(self) -> int:
+        return self.manifest['count']
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def stroke_points(self, i: int) -> np.ndarray:
+        """(n, 2) float32 view of stroke i"""
+        return self.points[self.offsets[i]:self.offsets[i + 1]]
+
+    def column(self, name: str, i: int):
+        value = self.columns[name][i]
+        return value.decode() if name in STRING_COLUMNS else value.item() if np.ndim(value) == 0 else value
+
+    def __getitem__(self, i: int) -> Dict:
+        """Stroke i in the shape of an attempt record's 'stroke' plus its columns"""
+        item = {name: self.column(name, i) for name in self.manifest['columns']}
+        item['points'] = self.stroke_points(i)
+        return item
+
+    def packed(self, indices) -> Tuple[np.ndarray, np.ndarray]:
+        """Points of the given strokes back to back, and their start offsets"""
+        indices = np.asarray(indices)
+        lengths = self.offsets[indices + 1] - self.offsets[indices]
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        take = np.repeat(self.offsets[indices] - starts, lengths) + np.arange(lengths.sum())
+        return self.points[take], starts
+
+
+def open_dataset(save_dir, refresh=True) -> Optional[StrokeDataset]:
+    """
+    Open save_dir/stroke_dataset, re-exporting it first when refresh is set
+    and the attempt log has changed (AttemptLog.version) since the last
+    export. None if
+    there is neither a dataset nor an attempt log.
+    """
+    save_dir = Path(save_dir)
+    directory = save_dir / "stroke_dataset"
+    if refresh and (save_dir / "attempt_log").exists():
+        log = AttemptLog(save_dir / "attempt_log")
+        try:
+            stale = True
+            if (directory / MANIFEST).exists():
+                with open(directory / MANIFEST, 'r', encoding='utf-8') as f:
+                    stale = json.load(f).get('source_version') != log.version
+            if stale:
+                start = time.time()
+                count = export_dataset(save_dir, directory, log)
+                print(f"[StrokeDataset] Exported {count} strokes in {time.time() - start:.2f}s")
+        finally:
+            log.close()
+    if not (directory / MANIFEST).exists():
+        return None
+    return StrokeDataset(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LOLA columnar stroke dataset")
+    parser.add_argument('command', choices=['export', 'stats'])
+    parser.add_argument('save_dir', nargs='?', default='lola_math_data')
+    args = parser.parse_args()
+
+    save_dir = Path(args.save_dir)
+    if args.command == 'export':
+        start = time.time()
+        count = export_dataset(save_dir)
+        print(f"[StrokeDataset] Exported {count} strokes in {time.time() - start:.2f}s")
+
+    dataset = StrokeDataset(save_dir / "stroke_dataset")
+    lengths = dataset.lengths
+    print(f"[StrokeDataset] {len(dataset)} strokes, {len(dataset.points)} points"
+          + (f", {lengths.mean():.1f} points/stroke" if len(dataset) else ""))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+Stroke preprocessing for the LOLA Mathematical Intent system
+Bounds per-attempt encoding cost regardless of pointer event density
+
+Stages (applied in this order when enabled):
+    rdp       Ramer-Douglas-Peucker simplification, tolerance relative to
+              the stroke's bounding-box diagonal
+    resample  arc-length resampling to n_points; only strokes with more
+              than n_points points are resampled, sparse strokes pass through
+
+Per-point channels (pressure) and per-segment channels (velocity, one value
+fewer than points) follow the points: rdp keeps the matching samples and
+averages merged segments, resample interpolates along arc length.
+
+Points are (n, 2) or (n, d) arrays; extra columns (z for 3D strokes) are
+carried along, while simplification and arc length use x/y only.
+"""
+
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+def rdp_mask(points: np.ndarray, epsilon: float) -> np.ndarray:
+    """
+    Boolean mask of the points kept by Ramer-Douglas-Peucker
+    Every segment farther than epsilon from some interior point is split at
+    its farthest point in the same pass, so the loop runs once per recursion
+    level instead of once per segment. Points of segments that need no
+    further split drop out of later passes.
+    """
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    if n < 3:
+        keep[:] = True
+        return keep
+
+    # Unresolved interior points and the anchors of their segment
+    idx = np.arange(1, n - 1)
+    lo = np.zeros(n - 2, dtype=np.intp)
+    hi = np.full(n - 2, n - 1, dtype=np.intp)
+
+    while len(idx):
+        start = points[lo]
+        chord = points[hi] - start
+        offset = points[idx] - start
+
+        # Perpendicular distance to the chord (distance to start if degenerate)
+        length = np.hypot(chord[:, 0], chord[:, 1])
+        cross = np.abs(chord[:, 0] * offset[:, 1] - chord[:, 1] * offset[:, 0])
+        distance = np.where(length > 0, cross / np.where(length > 0, length, 1.0),
+                            np.hypot(offset[:, 0], offset[:, 1]))
+
+        # Segments are contiguous runs of equal lo
+        new_run = np.empty(len(idx), dtype=bool)
+        new_run[0] = True
+        np.not_equal(lo[1:], lo[:-1], out=new_run[1:])
+        run = np.cumsum(new_run) - 1
+        run_max = np.maximum.reduceat(distance, np.flatnonzero(new_run))
+        split = run_max > epsilon
+
+        # First farthest point of every run that splits
+        candidates = np.flatnonzero((distance == run_max[run]) & split[run])
+        if not len(candidates):
+            break
+        first = candidates[np.r_[True, run[candidates[1:]] != run[candidates[:-1]]]]
+        keep[idx[first]] = True
+
+        anchor = np.full(len(run_max), -1, dtype=np.intp)
+        anchor[run[first]] = idx[first]
+        anchor = anchor[run]
+        active = split[run] & (idx != anchor)
+        left = idx < anchor
+        hi = np.where(left, anchor, hi)[active]
+        lo = np.where(left, lo, anchor)[active]
+        idx = idx[active]
+
+    return keep
+
+
+def arc_length(points: np.ndarray) -> np.ndarray:
+    """Cumulative arc length at each point, starting at 0"""
+    steps = np.hypot(*np.diff(points, axis=0).T)
+    return np.concatenate([[0.0], np.cumsum(steps)])
+
+
+class StrokePreprocessor:
+    """Configurable simplification / resampling stage in front of encode"""
+
+    METHODS = ('none', 'rdp', 'resample', 'rdp+resample')
+
+    def __init__(self, method='resample', n_points=256, rdp_tolerance=0.002):
+        if method not in self.METHODS:
+            raise ValueError(f"method must be one of {self.METHODS}, got {method!r}")
+        self.method = method
+        self.n_points = n_points
+        self.rdp_tolerance = rdp_tolerance
+
+        self._lock = threading.Lock()
+        self.strokes = 0
+        self.input_points = 0
+        self.output_points = 0
+
+    def process(self, points, channels: Sequence = ()) -> Tuple[np.ndarray, List, Dict]:
+        """
+        Simplify/resample one stroke
+        Returns (points, channels, stats) where stats holds the input and
+        output point counts and their ratio. Raises ValueError unless points
+        is an (n, d) array with d >= 2.
+        """
+        points = np.asarray(points, dtype=np.float64)
+        if points.size == 0:
+            points = points.reshape(0, 2)
+        if points.ndim != 2 or points.shape[1] < 2:
+            raise ValueError(f"stroke points must be an (n, 2) or (n, 3) array, got shape {points.shape}")
+        xy = points[:, :2]
+        n_input = len(points)
+        channels = [np.asarray(channel, dtype=np.float64) for channel in channels]
+
+        if 'rdp' in self.method and len(points) > 2:
+            diagonal = np.hypot(*(xy.max(axis=0) - xy.min(axis=0)))
+            kept = np.flatnonzero(rdp_mask(xy, self.rdp_tolerance * diagonal))
+            channels = [self._subset(channel, kept, len(points)) for channel in channels]
+            points = points[kept]
+            xy = points[:, :2]
+
+        if 'resample' in self.method and len(points) > self.n_points:
+            arc = arc_length(xy)
+            if arc[-1] > 0:
+                positions = np.linspace(0.0, arc[-1], self.n_points)
+            else:
+                positions = arc[[0, -1]]  # every point identical
+            channels = [self._resample(channel, arc, positions, len(points)) for channel in channels]
+            points = np.column_stack([np.interp(positions, arc, column) for column in points.T])
+
+        stats = self._record(n_input, len(points))
+        return points, [channel.tolist() for channel in channels], stats
+
+    def passes_through(self, n_points: int) -> bool:
+        """True if process() returns a stroke of n_points unchanged"""
+        return self.method == 'none' or (self.method == 'resample' and n_points <= self.n_points)
+
+    def record_unchanged(self, n_points: int) -> Dict:
+        """Count a stroke that bypassed process() (see passes_through) and return its stats"""
+        return self._record(n_points, n_points)
+
+    def _record(self, n_input: int, n_output: int) -> Dict:
+        with self._lock:
+            self.strokes += 1
+            self.input_points += n_input
+            self.output_points += n_output
+        return {
+            'method': self.method,
+            'input_points': n_input,
+            'output_points': n_output,
+            'reduction_ratio': n_input / max(1, n_output)
+        }
+
+    @staticmethod
+    def _subset(channel: np.ndarray, kept: np.ndarray, n_points: int) -> np.ndarray:
+        """Per-point channels keep the kept samples, per-segment ones average merged segments"""
+        if len(channel) == n_points:
+            return channel[kept]
+        if len(channel) == n_points - 1:
+            return np.add.reduceat(channel, kept[:-1]) / np.diff(kept)
+        return channel
+
+    @staticmethod
+    def _resample(channel: np.ndarray, arc: np.ndarray, positions: np.ndarray, n_points: int) -> np.ndarray:
+        """Interpolate per-point channels at positions, per-segment ones at segment midpoints"""
+        if len(channel) == n_points:
+            return np.interp(positions, arc, channel)
+        if len(channel) == n_points - 1:
+            return np.interp((positions[:-1] + positions[1:]) / 2, (arc[:-1] + arc[1:]) / 2, channel)
+        return channel
+
+    def metrics(self) -> Dict:
+        """Totals over all processed strokes"""
+        return {
+            'method': self.method,
+            'n_points': self.n_points,
+            'strokes': self.strokes,
+            'input_points': self.input_points,
+            'output_points': self.output_points,
+            'reduction_ratio': self.input_points / max(1, self.output_points)
+        }
@@ -0,0 +1,97 @@
+"""
+Suggestion push channels for the LOLA Mathematical Intent system
+Delivers a session's suggestions to subscribers (Server-Sent Events
+connections) as soon as they are produced, instead of clients polling
+
+One channel per client id; it exists only while somebody is subscribed.
+Every suggestion carries an ETag, so a reconnecting client that sends the
+last ETag it saw (Last-Event-ID / If-None-Match) is not sent the same
+payload again.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+Event = Tuple[str, Dict]  # (etag, suggestion)
+
+
+class SuggestionChannel:
+    """Latest suggestion event of one client plus a condition to wait on"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.latest: Optional[Event] = None
+        self.subscribers = 0
+        self.closed = False
+
+    def wait(self, etag: Optional[str], timeout: float) -> Optional[Event]:
+        """
+        Return the latest event if its ETag differs from etag, otherwise
+        wait up to timeout seconds for one. None on timeout or close.
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.closed or (self.latest is not None and self.latest[0] != etag), timeout)
+            if self.closed or self.latest is None or self.latest[0] == etag:
+                return None
+            return self.latest
+
+
+class SuggestionBroker:
+    """Per-client publish/subscribe of suggestion events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels: Dict[str, SuggestionChannel] = {}
+        self.published = 0
+        self.delivered = 0  # publishes that found at least one subscriber
+        self.closed = False
+
+    @contextmanager
+    def subscribe(self, client_id: str):
+        """Hold a channel open for client_id while the block runs"""
+        with self._lock:
+            channel = self._channels.get(client_id)
+            if channel is None:
+                channel = self._channels[client_id] = SuggestionChannel()
+                channel.closed = self.closed
+            channel.subscribers += 1
+        try:
+            yield channel
+        finally:
+            with self._lock:
+                channel.subscribers -= 1
+                if channel.subscribers == 0:
+                    del self._channels[client_id]
+
+    def publish(self, client_id: str, etag: str, suggestion: Dict):
+        """Wake every subscriber of client_id with a new suggestion"""
+        with self._lock:
+            self.published += 1
+            channel = self._channels.get(client_id)
+            if channel is None:
+                return
+            self.delivered += 1
+        with channel.condition:
+            channel.latest = (etag, suggestion)
+            channel.condition.notify_all()
+
+    def close(self):
+        """Release all waiting subscribers (server shutdown)"""
+        with self._lock:
+            self.closed = True
+            channels = list(self._channels.values())
+        for channel in channels:
+            with channel.condition:
+                channel.closed = True
+                channel.condition.notify_all()
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                'channels': len(self._channels),
+                'subscribers': sum(channel.subscribers for channel in self._channels.values()),
+                'published': self.published,
+                'delivered': self.delivered
+            }
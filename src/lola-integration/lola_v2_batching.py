@@ -0,0 +1,232 @@
+"""
+Cross-request micro-batching for LOLA v2 inference
+Concurrent /attempt requests each need a batch-1 VAE encode (and sometimes
+a batch-1 decode). A MicroBatcher collects requests for up to max_wait_ms
+or max_batch rows, runs one batched forward pass on its own thread and
+hands every caller its rows back.
+
+    InferenceScheduler(system)    encode / decode batchers over the backend each
+                                  request brings (default: system.backend under
+                                  system.model_lock)
+    MicroBatcher(fn)              generic: fn(inputs, key) maps a (B, ...) tensor
+                                  to (B, ...); only requests with the same key
+                                  share a batch
+    Histogram                     fixed-bucket counts for the batch size and
+                                  queue wait statistics
+
+A request with more rows than max_batch runs as a batch of its own; rows
+of one request are never split across batches.
+"""
+
+import queue
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence
+
+import torch
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+QUEUE_WAIT_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+
+class Histogram:
+    """Counts per upper bound (inclusive) plus an overflow bucket"""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            labels = [f"{bound:g}" for bound in self.bounds] + ['+Inf']
+            return {
+                'count': self.count,
+                'mean': self.total / self.count if self.count else 0.0,
+                'max': self.max,
+                'buckets': dict(zip(labels, self.counts))
+            }
+
+
+class _Request:
+    __slots__ = ('inputs', 'key', 'enqueued', 'done', 'result', 'error')
+
+    def __init__(self, inputs: torch.Tensor, key=None):
+        self.inputs = inputs
+        self.key = key
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Runs fn on batches assembled from concurrent submit() calls. The first
+    request of a batch waits at most max_wait_ms for company; the batch
+    closes early once max_batch rows are queued or a request with another
+    key arrives. fn is called with the batch's inputs and its key.
+    """
+
+    def __init__(self, fn: Callable[[torch.Tensor, object], torch.Tensor], max_batch=16, max_wait_ms=2.0,
+                 name="LOLAv2MicroBatcher"):
+        self.fn = fn
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, max_wait_ms) / 1e3
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+        self.batches = 0
+        self.errors = 0
+
+        self._queue: queue.Queue = queue.Queue()
+        self._carry: Optional[_Request] = None
+        self._closed = False
+        self._close_lock = threading.Lock()  # nothing is queued after close()'s sentinel
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, inputs: torch.Tensor, key=None) -> torch.Tensor:
+        """Block until inputs' (B, ...) rows have gone through fn with key; returns fn's rows for them"""
+        request = _Request(inputs, key)
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _next_batch(self) -> Optional[List[_Request]]:
+        """Block for a first request, then gather more until max_batch rows or its deadline"""
+        first = self._carry if self._carry is not None else self._queue.get()
+        self._carry = None
+        if first is None:
+            return None
+        batch, rows = [first], len(first.inputs)
+        deadline = first.enqueued + self.max_wait
+        while rows < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)  # finish this batch, stop on the next
+                break
+            if rows + len(request.inputs) > self.max_batch or request.key is not first.key:
+                self._carry = request
+                break
+            batch.append(request)
+            rows += len(request.inputs)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            started = time.perf_counter()
+            for request in batch:
+                self.queue_wait_ms.observe((started - request.enqueued) * 1e3)
+            inputs = batch[0].inputs if len(batch) == 1 else torch.cat([r.inputs for r in batch])
+            self.batch_sizes.observe(len(inputs))
+            self.batches += 1
+            try:
+                outputs = self.fn(inputs, batch[0].key)
+                offset = 0
+                for request in batch:
+                    request.result = outputs[offset:offset + len(request.inputs)]
+                    offset += len(request.inputs)
+            except Exception as e:
+                self.errors += 1
+                for request in batch:
+                    request.error = e
+            for request in batch:
+                request.done.set()
+
+    def stats(self) -> Dict:
+        return {
+            'max_batch': self.max_batch,
+            'max_wait_ms': self.max_wait * 1e3,
+            'batches': self.batches,
+            'errors': self.errors,
+            'batch_size': self.batch_sizes.to_dict(),
+            'queue_wait_ms': self.queue_wait_ms.to_dict()
+        }
+
+    def close(self, timeout=None):
+        """Run what is already queued, then stop the thread"""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(timeout)
+        # Requests still queued if the join timed out would otherwise wait forever
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request.error = RuntimeError("MicroBatcher is closed")
+                request.done.set()
+
+
+class InferenceScheduler:
+    """
+    Micro-batched encode and decode for a LOLAv2IntentSystem. A request may
+    bring the backend to run on (a snapshot taken with the model version it
+    reports); requests only share a batch with requests on the same backend,
+    so a batch never mixes model versions. Without one, the batch runs on
+    system.backend under system.model_lock. Pass encode / decode (bound to
+    a backend with functools.partial) as encoder= / decoder= to
+    encode_attempt and decode_suggestion.
+
+    decode_max_batch (default: max_batch) caps decode batches separately:
+    at high compression factors the decoder's full-resolution activations
+    make it memory-bound and a batch costs as much per row as single calls.
+    """
+
+    def __init__(self, system, max_batch=16, max_wait_ms=2.0, decode_max_batch: Optional[int] = None):
+        self.system = system
+        self.encoder = MicroBatcher(self._encode, max_batch, max_wait_ms, name="LOLAv2EncodeBatcher")
+        self.decoder = MicroBatcher(self._decode, decode_max_batch or max_batch, max_wait_ms,
+                                    name="LOLAv2DecodeBatcher")
+
+    def _encode(self, images: torch.Tensor, backend) -> torch.Tensor:
+        if backend is not None:
+            return backend.encode(images)
+        with self.system.model_lock:
+            return self.system.backend.encode(images)
+
+    def _decode(self, latents: torch.Tensor, backend) -> torch.Tensor:
+        if backend is not None:
+            return backend.decode(latents)
+        with self.system.model_lock:
+            return self.system.backend.decode(latents)
+
+    def encode(self, images: torch.Tensor, backend=None) -> torch.Tensor:
+        return self.encoder.submit(images, backend)
+
+    def decode(self, latents: torch.Tensor, backend=None) -> torch.Tensor:
+        return self.decoder.submit(latents, backend)
+
+    def stats(self) -> Dict:
+        return {'encode': self.encoder.stats(), 'decode': self.decoder.stats()}
+
+    def close(self, timeout=None):
+        self.encoder.close(timeout)
+        self.decoder.close(timeout)
@@ -8,12 +8,25 @@ import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.utils.data import Dataset, DataLoader, BatchSampler, RandomSampler
 from typing import Dict, List, Tuple, Optional, Union
 import json
 import time
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field, fields
 from pathlib import Path
 import hashlib
+import os
+import copy
+import queue
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+from urllib.parse import urlparse, parse_qs
+from functools import lru_cache, partial
+
+from lola_stroke_dataset import open_dataset
+from lola_v2_inference import make_backend, export_models, quantize_models
+from lola_v2_batching import InferenceScheduler
 
 # ===========================
 # PART 1: Enhanced VAE Architecture
@@ -96,6 +109,10 @@ class EnhancedVAEEncoder(nn.Module):
         z = mu + eps * std
         
         return z, mu, logvar
+    
+    def encode_mean(self, x):
+        """Deterministic latent (mu only) for inference"""
+        return self.mu_proj(self.encoder(self.input_conv(x)))
 
 class EnhancedVAEDecoder(nn.Module):
     """
@@ -161,6 +178,9 @@ class LOLAEnhancedVAE(nn.Module):
         z, mu, logvar = self.encoder(x)
         return z
     
+    def encode_mean(self, x):
+        return self.encoder.encode_mean(x)
+    
     def decode(self, z):
         return self.decoder(z)
     
@@ -200,6 +220,12 @@ class DiffusionModel(nn.Module):
     """
     Denoising Diffusion Probabilistic Model for latent space
     Based on LOLA's approach
+    
+    sample() runs the full ancestral DDPM chain; sample_ddim() runs the
+    deterministic (eta=0) DDIM update over an evenly spaced subset of the
+    timesteps. Both take the batch size from shape, so several candidates
+    are drawn in one pass, and both accept another denoiser with the
+    signature of predict_noise (e.g. an exported inference backend).
     """
     def __init__(self, latent_channels=64, hidden_dim=256, num_steps=1000):
         super().__init__()
@@ -211,6 +237,12 @@ class DiffusionModel(nn.Module):
         self.register_buffer('alphas', 1 - self.betas)
         self.register_buffer('alphas_cumprod', torch.cumprod(self.alphas, 0))
         
+        # DDPM update coefficients (derived, so not saved with the model)
+        self.register_buffer('sqrt_recip_alphas', 1 / torch.sqrt(self.alphas), persistent=False)
+        self.register_buffer('noise_coefs', (1 - self.alphas) / torch.sqrt(1 - self.alphas_cumprod),
+                             persistent=False)
+        self.register_buffer('sigmas', torch.sqrt(self.betas), persistent=False)
+        
         # U-Net architecture for denoising
         self.denoise_net = nn.Sequential(
             nn.Conv2d(latent_channels * 2, hidden_dim, 3, 1, 1),  # *2 for concatenated noisy + time
@@ -254,8 +286,9 @@ class DiffusionModel(nn.Module):
         return predicted_noise
     
     @torch.no_grad()
-    def sample(self, shape, device):
+    def sample(self, shape, device, denoiser=None):
         """Generate samples through reverse diffusion"""
+        predict_noise = denoiser or self.predict_noise
         # Start from random noise
         x = torch.randn(shape, device=device)
         
@@ -263,22 +296,45 @@ class DiffusionModel(nn.Module):
             t_batch = torch.full((shape[0],), t, device=device, dtype=torch.long)
             
             # Predict noise
-            predicted_noise = self.predict_noise(x, t_batch)
+            predicted_noise = predict_noise(x, t_batch).to(x.device)
             
             # Denoise step
-            alpha = self.alphas[t]
-            alpha_cumprod = self.alphas_cumprod[t]
-            
+            x = self.sqrt_recip_alphas[t] * (x - self.noise_coefs[t] * predicted_noise)
             if t > 0:
-                noise = torch.randn_like(x)
-                sigma = torch.sqrt(self.betas[t])
-            else:
-                noise = 0
-                sigma = 0
+                x = x + self.sigmas[t] * torch.randn_like(x)
+        
+        return x
+    
+    def ddim_schedule(self, steps: int) -> Tuple[List[int], torch.Tensor, torch.Tensor]:
+        """
+        Timesteps visited by a steps-step DDIM run (descending) and, per step,
+        sqrt(alpha_cumprod) and sqrt(1 - alpha_cumprod) of the step and of the
+        one it lands on (alpha_cumprod = 1 after the last step)
+        """
+        steps = max(1, min(steps, self.num_steps))
+        timesteps = torch.linspace(self.num_steps - 1, 0, steps).round().long().unique_consecutive()
+        alpha_t = self.alphas_cumprod[timesteps]
+        alpha_prev = torch.cat([alpha_t[1:], alpha_t.new_ones(1)])
+        alphas = torch.stack([alpha_t, alpha_prev])
+        return timesteps.tolist(), torch.sqrt(alphas), torch.sqrt(1 - alphas)
+    
+    @torch.no_grad()
+    def sample_ddim(self, shape, device, steps=20, noise=None, denoiser=None):
+        """
+        Deterministic DDIM sampling in `steps` network evaluations
+        noise: optional starting noise of the given shape (same noise, same samples)
+        """
+        predict_noise = denoiser or self.predict_noise
+        timesteps, sqrt_alpha, sqrt_one_minus = self.ddim_schedule(steps)
+        x = torch.randn(shape, device=device) if noise is None else noise.to(device)
+        
+        for i, t in enumerate(timesteps):
+            t_batch = torch.full((shape[0],), t, device=device, dtype=torch.long)
+            predicted_noise = predict_noise(x, t_batch).to(x.device)
             
-            x = (1 / torch.sqrt(alpha)) * (
-                x - ((1 - alpha) / torch.sqrt(1 - alpha_cumprod)) * predicted_noise
-            ) + sigma * noise
+            # Predicted clean latent, then re-noised to the next timestep
+            x0 = (x - sqrt_one_minus[0, i] * predicted_noise) / sqrt_alpha[0, i]
+            x = sqrt_alpha[1, i] * x0 + sqrt_one_minus[1, i] * predicted_noise
         
         return x
 
@@ -286,15 +342,91 @@ class DiffusionModel(nn.Module):
 # PART 3: Enhanced Intent Learning System
 # ===========================
 
+@lru_cache(maxsize=8)
+def _blur_matrix(n: int, sigma: float, truncate: float = 4.0) -> torch.Tensor:
+    """
+    (n, n) matrix applying scipy.ndimage.gaussian_filter's 1-D pass
+    (mode='reflect': half-sample symmetric edges) to a length-n axis
+    """
+    radius = int(truncate * sigma + 0.5)
+    taps = torch.exp(-0.5 * (torch.arange(-radius, radius + 1, dtype=torch.float64) / sigma) ** 2)
+    taps /= taps.sum()
+    
+    # Source index of every tap of every output, reflected into [0, n)
+    source = (torch.arange(n)[:, None] + torch.arange(-radius, radius + 1)) % (2 * n)
+    source = torch.where(source >= n, 2 * n - 1 - source, source)
+    matrix = torch.zeros(n, n, dtype=torch.float64)
+    matrix.index_put_((torch.arange(n)[:, None].expand_as(source), source), taps.expand_as(source), accumulate=True)
+    return matrix.float()
+
+def gaussian_blur(images: torch.Tensor, sigma: float = 1.0) -> torch.Tensor:
+    """
+    Separable Gaussian blur of (B, C, H, W) images as two banded matrix products
+    Matches scipy.ndimage.gaussian_filter (mode='reflect', truncate=4) per channel
+    """
+    rows = _blur_matrix(images.shape[-2], sigma).to(images.device)
+    cols = _blur_matrix(images.shape[-1], sigma).to(images.device)
+    return rows @ images @ cols.T
+
+def rasterize_strokes(strokes, size=(64, 64), sigma=1.0, device='cpu') -> torch.Tensor:
+    """
+    Rasterize a list of strokes ((n, 2) points in [0, 1]) to a (B, 2, H, W) tensor
+    Channel 0 marks visited pixels, channel 1 holds the stroke order i / n of
+    the last point on the pixel; both are Gaussian blurred. Strokes with
+    fewer than two points stay empty. All strokes are scattered in one call.
+    """
+    batch = len(strokes)
+    height, width = size
+    lengths = np.array([len(points) if len(points) >= 2 else 0 for points in strokes], dtype=np.int64)
+    images = torch.zeros(batch * 2 * height * width)
+    
+    if lengths.sum():
+        points = np.concatenate([np.asarray(points, dtype=np.float64)[:, :2]
+                                 for points, n in zip(strokes, lengths) if n])
+        owner = np.repeat(np.arange(batch), lengths)
+        order = np.arange(len(points)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        
+        # int() truncation toward zero, as the per-point loop did
+        x = np.trunc(points[:, 0] * size[0]).astype(np.int64)
+        y = np.trunc(points[:, 1] * size[1]).astype(np.int64)
+        inside = (x >= 0) & (x < size[0]) & (y >= 0) & (y < size[1])
+        
+        pixel = torch.from_numpy(owner[inside] * 2 * height * width + y[inside] * width + x[inside])
+        images[pixel] = 1.0
+        # Later points overwrite earlier ones: keep the largest order per pixel
+        temporal = torch.from_numpy((order / np.repeat(lengths, lengths))[inside]).float()
+        images.scatter_reduce_(0, pixel + height * width, temporal, reduce='amax')
+    
+    return gaussian_blur(images.view(batch, 2, height, width).to(device), sigma)
+
 class LOLAv2IntentSystem:
     """
     Enhanced LOLA-based Intent Learning System v2.0
     With VAE + Diffusion Model for up to 1000x compression
+    
+    Suggestions draw n_candidates latents in one batched diffusion run:
+    sampler='ddim' takes sampling_steps deterministic steps, 'ddpm' runs
+    the full num_steps chain.
+    
+    Encoding, decoding and denoising for serving go through an inference
+    backend (lola_v2_inference): 'eager' runs these modules in eval mode,
+    'onnx' / 'torchscript' run artifacts exported to inference_dir.
+    
+    Only the last history_size latents are kept, in a preallocated ring
+    buffer on device with a running mean / variance, and only the last
+    max_strokes raw strokes (for training), so memory stays flat over a
+    long-running server and analyze_intent costs the same every attempt.
     """
-    def __init__(self, compression_factor=256, latent_dim=64, device='cuda' if torch.cuda.is_available() else 'cpu'):
+    def __init__(self, compression_factor=256, latent_dim=64, device='cuda' if torch.cuda.is_available() else 'cpu',
+                 sampler='ddim', sampling_steps=20, n_candidates=5,
+                 backend='eager', inference_dir=None, num_threads=None,
+                 history_size=10, max_strokes=256):
         self.device = device
         self.compression_factor = compression_factor
         self.latent_dim = latent_dim
+        self.sampler = sampler
+        self.sampling_steps = sampling_steps
+        self.n_candidates = n_candidates
         
         # Initialize models
         self.vae = LOLAEnhancedVAE(
@@ -313,82 +445,139 @@ class LOLAv2IntentSystem:
         self.optimizer_vae = torch.optim.Adam(self.vae.parameters(), lr=1e-4)
         self.optimizer_diffusion = torch.optim.Adam(self.diffusion.parameters(), lr=1e-4)
         
-        # Intent learning history
-        self.attempt_history = []
-        self.latent_history = []
+        # Intent learning history: recent raw strokes and a latent ring buffer
+        # (allocated on the first attempt, once the latent shape is known)
+        self.history_size = history_size
+        self.attempt_history = deque(maxlen=max_strokes)
+        self.attempt_count = 0
+        self._latents = None
+        self._head = 0
+        self._count = 0
+        
+        # Running sum / sum of squares over the ring (float64, like the ring)
+        self._sum = None
+        self._sumsq = None
         self.session_id = self._generate_session_id()
         
+        # Held by inference and by TrainingWorker while it publishes new weights
+        self.model_lock = threading.RLock()
+        self.model_version = 0
+        
+        self.backend = None
+        self.use_backend(backend, inference_dir, num_threads)
+        
     def _generate_session_id(self):
         timestamp = str(time.time())
         return hashlib.md5(timestamp.encode()).hexdigest()[:8]
     
+    def use_backend(self, name='eager', inference_dir=None, num_threads=None):
+        """Switch the inference backend; exported backends export the current weights if needed"""
+        self.backend = make_backend(name, self, inference_dir, num_threads)
+        return self.backend
+    
     def stroke_to_tensor(self, stroke_points, size=(64, 64)):
         """Convert stroke points to 2D tensor representation"""
-        tensor = torch.zeros(1, 2, size[0], size[1])
-        
-        if len(stroke_points) < 2:
-            return tensor
-        
-        # Create density map from points
-        for i, point in enumerate(stroke_points):
-            x = int(point[0] * size[0])
-            y = int(point[1] * size[1])
-            
-            if 0 <= x < size[0] and 0 <= y < size[1]:
-                # X channel: position
-                tensor[0, 0, y, x] = 1.0
-                # Y channel: temporal information (stroke order)
-                tensor[0, 1, y, x] = i / len(stroke_points)
-        
-        # Apply Gaussian blur for continuity
-        from scipy.ndimage import gaussian_filter
-        tensor[0, 0] = torch.tensor(gaussian_filter(tensor[0, 0].numpy(), sigma=1.0))
-        tensor[0, 1] = torch.tensor(gaussian_filter(tensor[0, 1].numpy(), sigma=1.0))
-        
-        return tensor.to(self.device)
+        return self.strokes_to_tensor([stroke_points], size)
+    
+    def strokes_to_tensor(self, strokes, size=(64, 64)):
+        """Convert a list of strokes to one (B, 2, H, W) tensor"""
+        return rasterize_strokes(strokes, size, device=self.device)
     
-    def encode_attempt(self, stroke_data):
-        """Encode drawing attempt to latent space using VAE"""
+    def encode_attempt(self, stroke_data, encoder=None):
+        """
+        Encode drawing attempt to latent space using VAE
+        encoder (default: backend.encode) may be a batching front end such
+        as InferenceScheduler.encode
+        """
         # Convert stroke to tensor
         stroke_tensor = self.stroke_to_tensor(stroke_data['points'])
         
-        # Encode with VAE
-        with torch.no_grad():
-            latent = self.vae.encode(stroke_tensor)
-        
-        return latent
+        # Encode with VAE (deterministic mean latent)
+        return (encoder or self.backend.encode)(stroke_tensor).to(self.device)
+    
+    def add_attempt(self, latent, stroke_data):
+        """Record an attempt: its (1, C, h, w) latent and the raw stroke"""
+        if self._latents is None:
+            shape = (self.history_size,) + tuple(latent.shape[1:])
+            self._latents = torch.zeros(shape, dtype=torch.float64, device=self.device)
+            self._sum = torch.zeros(shape[1:], dtype=torch.float64, device=self.device)
+            self._sumsq = torch.zeros_like(self._sum)
+        
+        # Evict the oldest latent once the ring is full
+        slot = self._latents[self._head]
+        if self._count == self.history_size:
+            self._sum -= slot
+            self._sumsq.addcmul_(slot, slot, value=-1)
+        else:
+            self._count += 1
+        
+        # Copy in: the latent may be a view into a larger batch output
+        slot.copy_(latent.detach()[0])
+        self._head = (self._head + 1) % self.history_size
+        self._sum += slot
+        self._sumsq.addcmul_(slot, slot)
+        
+        self.attempt_history.append(stroke_data)
+        self.attempt_count += 1
+        
+        # Periodically rebuild the running sums from the ring to bound drift
+        if self._head == 0:
+            self._sum = self._latents.sum(0)
+            self._sumsq = (self._latents * self._latents).sum(0)
+    
+    @property
+    def latents(self) -> torch.Tensor:
+        """Latents in the ring, oldest first, shape (n, C, h, w)"""
+        if self._latents is None:
+            return torch.zeros(0, device=self.device)
+        if self._count < self.history_size:
+            return self._latents[:self._count].float()
+        return torch.roll(self._latents, -self._head, dims=0).float()
+    
+    def recent_attempts(self, n: int) -> List[Dict]:
+        """Most recent n raw strokes, oldest first"""
+        start = max(0, len(self.attempt_history) - n)
+        return list(islice(self.attempt_history, start, None))
     
-    def analyze_intent(self, min_attempts=5):
-        """Analyze user intent from latent history"""
-        if len(self.latent_history) < min_attempts:
+    def latent_statistics(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Running mean and unbiased std (as torch.std) of the latents in the ring, (C, h, w) float64"""
+        mean = self._sum / self._count
+        variance = torch.addcmul(self._sumsq, self._sum, mean, value=-1)
+        return mean, variance.div_(max(1, self._count - 1)).clamp_(min=0.0).sqrt_()
+    
+    def analyze_intent(self, min_attempts=5, backend=None):
+        """Analyze user intent from latent history (denoising on backend, default: self.backend)"""
+        statistics = self.intent_statistics(min_attempts)
+        if statistics is None:
             return None
-        
-        # Stack latent vectors
-        latents = torch.stack(self.latent_history[-10:])  # Last 10 attempts
-        
-        # Analyze convergence in latent space
-        mean_latent = latents.mean(0)
-        std_latent = latents.std(0)
-        
+        return self.refine_intent(*statistics, backend=backend)
+    
+    def intent_statistics(self, min_attempts=5) -> Optional[Tuple[torch.Tensor, torch.Tensor]]:
+        """latent_statistics() once the ring holds min_attempts latents, else None (new tensors, safe to keep)"""
+        if self._count < min_attempts:
+            return None
+        return self.latent_statistics()
+    
+    def refine_intent(self, mean_latent, std_latent, backend=None):
+        """
+        Second half of analyze_intent: confidence from the latent statistics
+        and, above 0.6, a diffusion-refined latent. Reads no history, so it
+        can run outside model_lock on statistics taken under it.
+        """
         # Calculate confidence based on consistency
         confidence = 1.0 / (1.0 + std_latent.mean().item())
         
         # Use diffusion model to generate refined suggestion
         if confidence > 0.6:
-            # Generate multiple samples and pick best
-            samples = []
-            for _ in range(5):
-                sample = self.diffusion.sample(
-                    mean_latent.shape,
-                    self.device
-                )
-                samples.append(sample)
+            mean_latent = mean_latent.float().unsqueeze(0)
+            
+            # Generate multiple samples in one batch and pick best
+            samples = self.sample_latents(self.n_candidates, mean_latent.shape[1:], backend)
             
             # Select best sample (closest to mean)
-            samples = torch.stack(samples)
-            distances = ((samples - mean_latent.unsqueeze(0)) ** 2).mean(dim=(1, 2, 3))
-            best_idx = distances.argmin()
-            best_sample = samples[best_idx]
+            distances = ((samples - mean_latent) ** 2).mean(dim=(1, 2, 3))
+            best_idx = int(distances.argmin())
+            best_sample = samples[best_idx:best_idx + 1]
             
             return {
                 'latent': best_sample,
@@ -398,10 +587,17 @@ class LOLAv2IntentSystem:
         
         return None
     
-    def decode_suggestion(self, latent):
-        """Decode latent to visual suggestion"""
-        with torch.no_grad():
-            decoded = self.vae.decode(latent)
+    def sample_latents(self, n, latent_shape, backend=None):
+        """Draw n latents of latent_shape (C, H, W) with the configured sampler (denoiser: backend or self.backend)"""
+        shape = (n,) + tuple(latent_shape)
+        denoiser = (backend or self.backend).predict_noise
+        if self.sampler == 'ddim':
+            return self.diffusion.sample_ddim(shape, self.device, steps=self.sampling_steps, denoiser=denoiser)
+        return self.diffusion.sample(shape, self.device, denoiser=denoiser)
+    
+    def decode_suggestion(self, latent, decoder=None):
+        """Decode latent to visual suggestion (decoder defaults to backend.decode)"""
+        decoded = (decoder or self.backend.decode)(latent)
         
         # Convert to numpy for visualization
         decoded_np = decoded[0].cpu().numpy()
@@ -454,12 +650,13 @@ class LOLAv2IntentSystem:
     def train_on_batch(self, batch_strokes):
         """Train VAE and diffusion model on batch of strokes"""
         # Convert strokes to tensors
-        tensors = []
-        for stroke in batch_strokes:
-            tensor = self.stroke_to_tensor(stroke['points'])
-            tensors.append(tensor)
-        
-        batch = torch.cat(tensors, dim=0)
+        return self.train_on_rasters(self.strokes_to_tensor([stroke['points'] for stroke in batch_strokes]))
+    
+    def train_on_rasters(self, batch):
+        """Train VAE and diffusion model on a (B, 2, H, W) batch of rasterized strokes"""
+        # The eager backend leaves the modules in eval mode
+        self.vae.train()
+        self.diffusion.train()
         
         # Train VAE
         self.optimizer_vae.zero_grad()
@@ -512,7 +709,79 @@ class LOLAv2IntentSystem:
 # PART 4: Training Script
 # ===========================
 
-def train_lola_v2(data_path='lola_math_data', epochs=100, batch_size=32):
+def build_raster_cache(dataset, size=(64, 64), sigma=1.0, chunk=1024, dtype=np.float16) -> Path:
+    """
+    Rasterize every stroke of a StrokeDataset once into an (N, 2, H, W) .npy
+    next to its columns, and return its path. The file lives inside the
+    dataset directory, so a re-export (which replaces the directory) drops it.
+    Values are in [0, 1] and stored as float16 by default to halve the I/O.
+    """
+    path = dataset.directory / f"rasters_{size[0]}x{size[1]}_s{sigma:g}.npy"
+    if path.exists():
+        return path
+    
+    tmp_path = path.with_name(path.stem + '.tmp.npy')
+    rasters = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=(len(dataset), 2) + tuple(size))
+    for start in range(0, len(dataset), chunk):
+        stop = min(start + chunk, len(dataset))
+        points, starts = dataset.packed(np.arange(start, stop))
+        rasters[start:stop] = rasterize_strokes(np.split(points, starts[1:]), size, sigma).numpy()
+    rasters.flush()
+    del rasters
+    os.replace(tmp_path, path)
+    return path
+
+class RasterDataset(Dataset):
+    """
+    Cached stroke rasters for a DataLoader; indexed by a list of indices
+    (one batch from a BatchSampler) and returns a float32 (B, 2, H, W) tensor.
+    The file is memory-mapped lazily, so each worker process opens its own map.
+    """
+    
+    def __init__(self, path, in_memory=False):
+        self.path = Path(path)
+        self.rasters = np.load(self.path) if in_memory else None
+        self.length = len(self.rasters) if in_memory else len(np.load(self.path, mmap_mode='r'))
+    
+    def __len__(self):
+        return self.length
+    
+    def __getitem__(self, indices):
+        if self.rasters is None:
+            self.rasters = np.load(self.path, mmap_mode='r')
+        # Sorted reads stay sequential on the memory map; order within a batch is irrelevant
+        # (torch widens float16 several times faster than ndarray.astype)
+        return torch.from_numpy(self.rasters[np.sort(np.asarray(indices))]).float()
+
+def calibration_rasters(save_dir, samples=256, seed=0) -> Optional[torch.Tensor]:
+    """Rasters of up to `samples` randomly chosen stored strokes (None without data)"""
+    dataset = open_dataset(save_dir)
+    if dataset is None or len(dataset) == 0:
+        return None
+    picks = np.random.default_rng(seed).permutation(len(dataset))[:samples]
+    return RasterDataset(build_raster_cache(dataset))[picks]
+
+def raster_loader(dataset, batch_size=32, num_workers=None, size=(64, 64), in_memory=False, device='cpu'):
+    """
+    Shuffled DataLoader of whole batches over the cached rasters of a
+    StrokeDataset, with worker processes prefetching ahead of training
+    num_workers: default leaves one core to the model (0 on a single core,
+    where worker IPC costs more than reading the cache in-process)
+    """
+    if num_workers is None:
+        num_workers = min(2, (os.cpu_count() or 1) - 1)
+    rasters = RasterDataset(build_raster_cache(dataset, size), in_memory=in_memory)
+    return DataLoader(
+        rasters,
+        sampler=BatchSampler(RandomSampler(rasters), batch_size, drop_last=False),
+        batch_size=None,
+        num_workers=num_workers,
+        pin_memory=str(device).startswith('cuda'),
+        persistent_workers=num_workers > 0,
+        prefetch_factor=4 if num_workers > 0 else None
+    )
+
+def train_lola_v2(data_path='lola_math_data', epochs=100, batch_size=32, num_workers=None):
     """
     Train the enhanced LOLA v2 system
     """
@@ -539,39 +808,36 @@ def train_lola_v2(data_path='lola_math_data', epochs=100, batch_size=32):
         data_path.mkdir(parents=True)
         return
     
-    # Load all session files
-    session_files = list(data_path.glob("session_*.json"))
-    print(f"Found {len(session_files)} training samples")
+    # Load strokes from the columnar dataset (re-exported when the attempt log changed)
+    dataset = open_dataset(data_path)
+    n_samples = len(dataset) if dataset is not None else 0
+    print(f"Found {n_samples} training samples")
     
-    if len(session_files) == 0:
+    if n_samples == 0:
         print("No training data found. Please collect some drawing attempts first.")
+        if any(data_path.glob("session_*_attempt_*.json")):
+            print(f"Legacy attempt files found; import them with: "
+                  f"python src/lola-integration/lola_attempt_log.py migrate {data_path}")
         return
     
-    # Load strokes
-    all_strokes = []
-    for file in session_files:
-        with open(file, 'r') as f:
-            data = json.load(f)
-            all_strokes.append(data['stroke'])
+    # Rasterize once; every epoch reads the cached rasters through the loader
+    start = time.time()
+    loader = raster_loader(dataset, batch_size, num_workers=num_workers, device=system.device)
+    print(f"Raster cache ready in {time.time() - start:.2f}s")
     
     # Training loop
     print("\nStarting training...")
     for epoch in range(epochs):
-        # Shuffle data
-        np.random.shuffle(all_strokes)
-        
         total_vae_loss = 0
         total_diff_loss = 0
         n_batches = 0
         
-        # Process in batches
-        for i in range(0, len(all_strokes), batch_size):
-            batch = all_strokes[i:i+batch_size]
-            
+        # Process in batches (the loader reshuffles every epoch)
+        for batch in loader:
             if len(batch) < 2:  # Skip if batch too small
                 continue
             
-            losses = system.train_on_batch(batch)
+            losses = system.train_on_rasters(batch.to(system.device, non_blocking=True))
             total_vae_loss += losses['vae_loss']
             total_diff_loss += losses['diffusion_loss']
             n_batches += 1
@@ -589,19 +855,192 @@ def train_lola_v2(data_path='lola_math_data', epochs=100, batch_size=32):
     
     return system
 
+@dataclass
+class TrainingJob:
+    """One queued /train request and its progress"""
+    job_id: str
+    strokes: List[Dict]
+    steps: int = 1
+    batch_size: int = 32
+    samples: int = 0
+    status: str = 'queued'  # queued | running | done | failed
+    step: int = 0
+    losses: List[Dict] = field(default_factory=list)
+    error: Optional[str] = None
+    model_version: Optional[int] = None
+    created: float = 0.0
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    
+    def to_dict(self):
+        info = {f.name: getattr(self, f.name) for f in fields(self) if f.name != 'strokes'}
+        info['losses'] = list(self.losses)
+        return info
+
+class TrainingWorker:
+    """
+    Background trainer for a LOLAv2IntentSystem. submit() queues a job and
+    returns at once; one thread trains a private copy of the models (with
+    their optimizers) and, after each job, copies the weights into the
+    serving models under system.model_lock, together with a backend
+    snapshot of the new weights. The system's backend is a snapshot from
+    the start, so a request that takes (backend, model_version) under the
+    lock can run encode, denoising and decode on that one version.
+    
+    Requested steps and batch sizes are clamped to max_steps and
+    max_batch_size.
+    """
+    
+    def __init__(self, system, max_queue=16, max_jobs=100, max_steps=1000, max_batch_size=256):
+        self.system = system
+        self.max_jobs = max_jobs
+        self.max_steps = max_steps
+        self.max_batch_size = max_batch_size
+        
+        # Private twin: same models and optimizer state, without the histories or backend
+        self.trainer = copy.deepcopy(system, memo={
+            id(system.attempt_history): deque(maxlen=system.attempt_history.maxlen),
+            id(system.model_lock): threading.RLock(),
+            id(system.backend): None
+        })
+        
+        # Publishing loads weights into the live modules; serve from copies
+        with system.model_lock:
+            system.backend = system.backend.snapshot()
+        
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._jobs: 'OrderedDict[str, TrainingJob]' = OrderedDict()
+        self._counter = 0
+        self._closed = False
+        
+        self._thread = threading.Thread(target=self._run, name="LOLAv2TrainingWorker", daemon=True)
+        self._thread.start()
+    
+    def submit(self, strokes, steps=1, batch_size=32) -> Optional[TrainingJob]:
+        """
+        Queue training on a snapshot of strokes; None if the queue is full or
+        closed. Raises ValueError if steps or batch_size is not a number.
+        """
+        try:
+            steps, batch_size = int(steps), int(batch_size)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"steps and batch_size must be integers, got {steps!r} and {batch_size!r}") from None
+        steps = min(max(1, steps), self.max_steps)
+        batch_size = min(max(2, batch_size), self.max_batch_size)
+        with self._lock:
+            # Checked under the lock so nothing is queued behind close()'s sentinel
+            if self._closed:
+                return None
+            self._counter += 1
+            strokes = list(strokes)
+            job = TrainingJob(job_id=f"{self.system.session_id}-{self._counter}", strokes=strokes,
+                              steps=steps, batch_size=batch_size,
+                              samples=len(strokes), created=time.time())
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                return None
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        return job
+    
+    def job(self, job_id) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+    
+    def status(self) -> Dict:
+        with self._lock:
+            jobs = [job.to_dict() for job in self._jobs.values()]
+        return {
+            'queued': sum(job['status'] == 'queued' for job in jobs),
+            'running': next((job['job_id'] for job in jobs if job['status'] == 'running'), None),
+            'model_version': self.system.model_version,
+            'jobs': jobs[-10:]
+        }
+    
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            self._train(job)
+    
+    def _train(self, job: TrainingJob):
+        with self._lock:
+            job.status, job.started = 'running', time.time()
+        try:
+            for _ in range(job.steps):
+                if len(job.strokes) > job.batch_size:
+                    picks = np.random.choice(len(job.strokes), job.batch_size, replace=False)
+                    batch = [job.strokes[i] for i in picks]
+                else:
+                    batch = job.strokes
+                losses = self.trainer.train_on_batch(batch)
+                with self._lock:
+                    job.step += 1
+                    job.losses.append(losses)
+            
+            # Exported backends re-export from the twin before the swap
+            version = self.system.model_version + 1
+            backend = self.system.backend.updated(self.trainer, version)
+            
+            # Publish: inference waits at most for this copy, never for training
+            with self.system.model_lock:
+                self.system.vae.load_state_dict(self.trainer.vae.state_dict())
+                self.system.diffusion.load_state_dict(self.trainer.diffusion.state_dict())
+                self.system.backend = backend
+                self.system.model_version = version
+            with self._lock:
+                job.status, job.model_version = 'done', version
+        except Exception as e:
+            with self._lock:
+                job.status, job.error = 'failed', str(e)
+        finally:
+            with self._lock:
+                job.finished = time.time()
+                job.strokes = []  # drop the snapshot once trained
+    
+    def close(self, timeout=None):
+        """Stop after the queued jobs finish"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
 # ===========================
 # PART 5: HTTP Server Integration
 # ===========================
 
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import json
 
+class LOLAv2HTTPServer(ThreadingHTTPServer):
+    """One thread per connection, so concurrent attempts can share encode / decode batches"""
+    daemon_threads = True
+    request_queue_size = 128
+
 class LOLAv2Server(BaseHTTPRequestHandler):
     system = None
+    trainer = None
+    scheduler = None
     
     @classmethod
-    def set_system(cls, system):
+    def set_system(cls, system, max_batch=16, max_wait_ms=2.0, decode_max_batch=None):
         cls.system = system
+        cls.trainer = TrainingWorker(system)
+        cls.scheduler = InferenceScheduler(system, max_batch, max_wait_ms, decode_max_batch)
+    
+    def _send_json(self, data, status=200):
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode())
     
     def do_OPTIONS(self):
         self.send_response(200)
@@ -618,28 +1057,36 @@ class LOLAv2Server(BaseHTTPRequestHandler):
             try:
                 stroke_data = json.loads(post_data)
                 
-                # Encode attempt
-                latent = self.system.encode_attempt(stroke_data)
-                self.system.latent_history.append(latent)
-                self.system.attempt_history.append(stroke_data)
-                
-                # Analyze intent
-                analysis = self.system.analyze_intent()
+                # Encode, denoise and decode all run on the backend (and so the
+                # model version) current when the attempt arrived, even if
+                # TrainingWorker publishes meanwhile; encode and decode are
+                # batched with concurrent requests on the same backend
+                with self.system.model_lock:
+                    backend, model_version = self.system.backend, self.system.model_version
+                latent = self.system.encode_attempt(stroke_data, encoder=partial(self.scheduler.encode, backend=backend))
+                with self.system.model_lock:
+                    self.system.add_attempt(latent, stroke_data)
+                    statistics = self.system.intent_statistics()
+                    
+                    response = {
+                        'attempt': self.system.attempt_count,
+                        'compression_rate': self.system.compression_factor,
+                        'latent_dim': self.system.latent_dim,
+                        'model_version': model_version
+                    }
                 
-                response = {
-                    'attempt': len(self.system.attempt_history),
-                    'compression_rate': self.system.compression_factor,
-                    'latent_dim': self.system.latent_dim
-                }
+                # Analyze intent; the denoising chain runs outside the lock
+                analysis = self.system.refine_intent(*statistics, backend=backend) if statistics else None
                 
                 if analysis and analysis['confidence'] > 0.6:
                     # Generate suggestion
-                    suggestion = self.system.decode_suggestion(analysis['latent'])
+                    suggestion = self.system.decode_suggestion(analysis['latent'],
+                                                               decoder=partial(self.scheduler.decode, backend=backend))
                     response['suggestion'] = suggestion
                     response['confidence'] = float(analysis['confidence'])
                     response['message'] = f"Optimized with {self.system.compression_factor}x compression!"
                 else:
-                    response['message'] = f"Learning... ({len(self.system.attempt_history)}/5 attempts)"
+                    response['message'] = f"Learning... ({response['attempt']}/5 attempts)"
                 
                 self.send_response(200)
                 self.send_header('Content-type', 'application/json')
@@ -652,28 +1099,53 @@ class LOLAv2Server(BaseHTTPRequestHandler):
                 self.send_error(500, str(e))
         
         elif self.path == '/train':
-            # Train on collected data
+            # Queue training on the collected data; progress via GET /train/status
             try:
-                if len(self.system.attempt_history) > 0:
-                    losses = self.system.train_on_batch(self.system.attempt_history[-32:])
-                    
-                    self.send_response(200)
-                    self.send_header('Content-type', 'application/json')
-                    self.send_header('Access-Control-Allow-Origin', '*')
-                    self.end_headers()
+                content_length = int(self.headers.get('Content-Length') or 0)
+                options = json.loads(self.rfile.read(content_length) or b'{}') if content_length else {}
+                if not isinstance(options, dict):
+                    raise ValueError("Training options must be a JSON object")
+                
+                # Snapshot under the lock: /attempt appends to the history concurrently
+                with self.system.model_lock:
+                    strokes = self.system.recent_attempts(32)
+                
+                # BatchNorm needs at least two strokes per training batch
+                if len(strokes) >= 2:
+                    job = self.trainer.submit(strokes,
+                                              steps=options.get('steps', 1),
+                                              batch_size=options.get('batch_size', 32))
+                    if job is None:
+                        self.send_error(503, "Training queue is full")
+                        return
                     
-                    self.wfile.write(json.dumps({
-                        'status': 'training',
-                        'losses': losses
-                    }).encode())
+                    self._send_json({
+                        'status': 'queued',
+                        'job_id': job.job_id,
+                        'status_url': f"/train/status?job={job.job_id}"
+                    }, status=202)
                 else:
                     self.send_error(400, "No training data available")
                     
+            except ValueError as e:
+                self.send_error(400, str(e))
             except Exception as e:
                 self.send_error(500, str(e))
     
     def do_GET(self):
-        if self.path == '/status':
+        url = urlparse(self.path)
+        if url.path == '/train/status':
+            job_id = parse_qs(url.query).get('job', [None])[0]
+            if job_id is None:
+                self._send_json(self.trainer.status())
+                return
+            job = self.trainer.job(job_id)
+            if job is None:
+                self.send_error(404, "Unknown training job")
+                return
+            self._send_json(job)
+        
+        elif url.path == '/status':
             self.send_response(200)
             self.send_header('Content-type', 'application/json')
             self.send_header('Access-Control-Allow-Origin', '*')
@@ -685,7 +1157,10 @@ class LOLAv2Server(BaseHTTPRequestHandler):
                 'compression_factor': self.system.compression_factor,
                 'latent_dim': self.system.latent_dim,
                 'device': str(self.system.device),
-                'attempts': len(self.system.attempt_history),
+                'attempts': self.system.attempt_count,
+                'model_version': self.system.model_version,
+                'inference': self.system.backend.describe(),
+                'batching': self.scheduler.stats(),
                 'features': [
                     'VAE with physics preservation',
                     'Diffusion model for refinement',
@@ -697,8 +1172,15 @@ class LOLAv2Server(BaseHTTPRequestHandler):
             
             self.wfile.write(json.dumps(status).encode())
 
-def main():
-    """Start enhanced LOLA v2 server"""
+def main(backend='eager', num_threads=None, max_batch=16, max_wait_ms=2.0, decode_max_batch=1):
+    """
+    Start enhanced LOLA v2 server
+    backend: 'eager', 'onnx', 'onnx-int8' or 'torchscript' (exported next to
+    the models whenever the checkpoint is newer than the export; int8 is
+    calibrated on the stored strokes)
+    max_batch, max_wait_ms: micro-batching of concurrent encodes / decodes;
+    decode_max_batch stays 1 at 256x, where batched decodes save nothing
+    """
     print("=" * 60)
     print("  LOLA v2.0 Mathematical Intent Learning")
     print("  Enhanced with VAE + Diffusion Model")
@@ -722,23 +1204,45 @@ def main():
             print("[INFO] Creating new untrained system")
             system = LOLAv2IntentSystem(compression_factor=256, latent_dim=64)
     
+    # Inference backend
+    inference_dir = model_path.with_name("lola_v2_inference")
+    if backend != 'eager':
+        manifest = inference_dir / "INFERENCE.json"
+        if not manifest.exists() or (model_path.exists() and model_path.stat().st_mtime > manifest.stat().st_mtime):
+            print(f"[INFO] Exporting models for {backend} inference...")
+            export_models(system, inference_dir)
+        if backend == 'onnx-int8' and 'quantization' not in json.loads(manifest.read_text()):
+            rasters = calibration_rasters(model_path.parent)
+            if rasters is None:
+                print("[WARN] No stored strokes to calibrate int8 on; serving fp32 ONNX")
+                backend = 'onnx'
+            else:
+                print(f"[INFO] Quantizing to int8 on {len(rasters)} stored strokes...")
+                drift = quantize_models(system, inference_dir, rasters)['drift']
+                print(f"[INFO] int8 drift: suggestion relative error "
+                      f"{drift['suggestion']['mean_relative_error']:.4f}")
+    system.use_backend(backend, inference_dir, num_threads)
+    
     # Set system for server
-    LOLAv2Server.set_system(system)
+    LOLAv2Server.set_system(system, max_batch, max_wait_ms, decode_max_batch)
     
     # Start server
     PORT = 8093  # Different port for v2
-    server = HTTPServer(('localhost', PORT), LOLAv2Server)
+    server = LOLAv2HTTPServer(('localhost', PORT), LOLAv2Server)
     
     print(f"\n[LOLA v2.0] Server starting on http://localhost:{PORT}")
     print("[LOLA v2.0] Endpoints:")
     print("  POST /attempt - Submit drawing attempt")
-    print("  POST /train - Train on recent attempts")
+    print("  POST /train - Queue training on recent attempts")
+    print("  GET /train/status?job=<id> - Training progress and losses")
     print("  GET /status - Get system status")
     print("")
     print("[INFO] Features:")
     print(f"  ✓ Compression: {system.compression_factor}x")
     print(f"  ✓ Latent Dimension: {system.latent_dim}")
     print(f"  ✓ Device: {system.device}")
+    print(f"  ✓ Inference: {system.backend.name} ({torch.get_num_threads() if num_threads is None else num_threads} threads)")
+    print(f"  ✓ Micro-batching: up to {max_batch} encodes / {decode_max_batch} decodes, {max_wait_ms:g} ms wait")
     print("  ✓ VAE + Diffusion Model")
     print("  ✓ Physics-preserving loss")
     print("")
@@ -748,6 +1252,8 @@ def main():
         server.serve_forever()
     except KeyboardInterrupt:
         print("\n[LOLA v2.0] Shutting down...")
+        LOLAv2Server.trainer.close()
+        LOLAv2Server.scheduler.close()
         
         # Save models before shutdown
         save_path = Path("C:/palantir/math/lola_math_data/lola_v2_models_final.pth")
@@ -757,4 +1263,14 @@ def main():
         server.shutdown()
 
 if __name__ == '__main__':
-    main()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="LOLA v2 intent learning server")
+    parser.add_argument('--backend', choices=['eager', 'onnx', 'onnx-int8', 'torchscript'], default='eager')
+    parser.add_argument('--threads', type=int, default=None, help="intra-op threads for inference")
+    parser.add_argument('--max-batch', type=int, default=16, help="most strokes per batched encode / decode")
+    parser.add_argument('--max-wait-ms', type=float, default=2.0,
+                        help="longest a request waits for others to share its batch")
+    parser.add_argument('--decode-max-batch', type=int, default=1, help="most suggestions per batched decode")
+    args = parser.parse_args()
+    main(args.backend, args.threads, args.max_batch, args.max_wait_ms, args.decode_max_batch)
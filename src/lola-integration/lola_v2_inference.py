@@ -0,0 +1,505 @@
+"""
+Inference backends for LOLA v2
+The encoder, decoder and denoiser run in eval mode for serving, either as
+the eager PyTorch modules or as exported ONNX (ONNX Runtime, CPU, fp32 or
+int8) or TorchScript artifacts
+
+Every backend takes and returns torch tensors:
+    encode(images)        (B, 2, H, W) rasters -> (B, C, h, w) mean latents (mu, no sampling)
+    decode(latents)       (B, C, h, w) -> (B, 2, H', W') density maps
+    predict_noise(x, t)   denoiser output for latents x at int64 timesteps t
+    updated(system, v)    backend serving system's current weights as model
+                          version v (exported backends re-export; called by
+                          TrainingWorker before it publishes)
+    snapshot()            backend whose weights never change afterwards
+                          (exported backends already are; eager copies)
+
+Backends returned by updated() are snapshots, so a request holding on to
+one backend runs every stage on the same model version.
+
+Export directory layout (export_models, quantize_models):
+    INFERENCE.json              formats, input size, latent shape, model version,
+                                quantization settings and drift report
+    encoder.onnx, decoder.onnx, denoiser.onnx
+    encoder.pt, decoder.pt, denoiser.pt      (TorchScript)
+    encoder.int8.onnx, ...      int8 models ('onnx-int8' backend)
+    calibration.npy             float16 rasters the int8 models were calibrated on
+
+The batch axis is dynamic in every artifact. ONNX export uses the
+torch.export-based exporter (needs onnxscript); ONNX Runtime is only
+imported by OnnxInference and quantize_models.
+"""
+
+import os
+import copy
+import json
+import time
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+MANIFEST = "INFERENCE.json"
+FORMATS = ('onnx', 'torchscript')
+PARTS = ('encoder', 'decoder', 'denoiser')
+QUANT_MODES = ('static', 'dynamic')
+CALIBRATION = "calibration.npy"
+
+
+class _MeanEncoder(nn.Module):
+    def __init__(self, encoder):
+        super().__init__()
+        self.encoder = encoder
+
+    def forward(self, x):
+        return self.encoder.encode_mean(x)
+
+
+class _Denoiser(nn.Module):
+    def __init__(self, diffusion):
+        super().__init__()
+        self.diffusion = diffusion
+
+    def forward(self, x, t):
+        return self.diffusion.predict_noise(x, t)
+
+
+def _set_threads(num_threads: Optional[int]):
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
+
+class EagerInference:
+    """
+    The system's own modules in eval mode (BatchNorm running statistics)
+    under torch.inference_mode. Training flips the modules back to train
+    mode, so every call re-asserts eval mode (a no-op when already set).
+    num_threads sets torch's intra-op thread count for the whole process.
+    snapshot() and updated() return backends over eval copies instead,
+    which training and load_state_dict no longer reach.
+    """
+
+    name = 'eager'
+
+    def __init__(self, vae, diffusion, num_threads: Optional[int] = None):
+        self.vae = vae
+        self.diffusion = diffusion
+        self.num_threads = num_threads
+        _set_threads(num_threads)
+
+    def _eval(self):
+        if self.vae.training:
+            self.vae.eval()
+        if self.diffusion.training:
+            self.diffusion.eval()
+
+    def encode(self, images: torch.Tensor) -> torch.Tensor:
+        self._eval()
+        with torch.inference_mode():
+            return self.vae.encode_mean(images)
+
+    def decode(self, latents: torch.Tensor) -> torch.Tensor:
+        self._eval()
+        with torch.inference_mode():
+            return self.vae.decode(latents)
+
+    def predict_noise(self, x: torch.Tensor, t: torch.Tensor) -> torch.Tensor:
+        self._eval()
+        with torch.inference_mode():
+            return self.diffusion.predict_noise(x, t)
+
+    def snapshot(self) -> 'EagerInference':
+        return EagerInference(copy.deepcopy(self.vae).eval(), copy.deepcopy(self.diffusion).eval(),
+                              self.num_threads)
+
+    def updated(self, system, model_version: Optional[int] = None) -> 'EagerInference':
+        return EagerInference(system.vae, system.diffusion, self.num_threads).snapshot()
+
+    def describe(self) -> Dict:
+        return {'backend': self.name, 'threads': torch.get_num_threads()}
+
+
+def export_models(system, directory, formats: Sequence[str] = FORMATS, input_size=(64, 64),
+                  model_version: Optional[int] = None) -> Path:
+    """
+    Export the mu-only encoder, the decoder and the denoiser of a
+    LOLAv2IntentSystem (eval mode, CPU copies) to directory, replacing it
+    with a directory rename so loaders never see a half-written export
+    """
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown export formats {sorted(unknown)}; expected {FORMATS}")
+
+    directory = Path(directory)
+    tmp_dir = directory.with_name(directory.name + '.tmp')
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    # Export from CPU copies so the live (possibly training) modules keep their mode and device
+    vae = _cpu_eval_copy(system.vae)
+    diffusion = _cpu_eval_copy(system.diffusion)
+    images = torch.zeros(2, 2, *input_size)
+    with torch.no_grad():
+        latents = vae.encode_mean(images)
+    timesteps = torch.zeros(2, dtype=torch.long)
+
+    parts = {
+        'encoder': (_MeanEncoder(vae.encoder).eval(), (images,), ['images'], ['latents']),
+        'decoder': (vae.decoder, (latents,), ['latents'], ['images']),
+        'denoiser': (_Denoiser(diffusion).eval(), (latents, timesteps), ['latents', 'timesteps'], ['noise']),
+    }
+    batch = torch.export.Dim('batch', min=1, max=4096)
+    for name, (module, inputs, input_names, output_names) in parts.items():
+        if 'onnx' in formats:
+            torch.onnx.export(module, inputs, str(tmp_dir / f"{name}.onnx"), input_names=input_names,
+                              output_names=output_names, dynamic_shapes=tuple({0: batch} for _ in inputs),
+                              dynamo=True, verbose=False)
+        if 'torchscript' in formats:
+            with torch.no_grad():
+                torch.jit.save(torch.jit.trace(module, inputs), str(tmp_dir / f"{name}.pt"))
+
+    manifest = {
+        'formats': list(formats),
+        'input_size': list(input_size),
+        'latent_shape': list(latents.shape[1:]),
+        'compression_factor': system.compression_factor,
+        'num_steps': diffusion.num_steps,
+        'model_version': getattr(system, 'model_version', 0) if model_version is None else model_version,
+        'created': time.time()
+    }
+    with open(tmp_dir / MANIFEST, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    old_dir = directory.with_name(directory.name + '.old')
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    if directory.exists():
+        os.replace(directory, old_dir)
+    os.replace(tmp_dir, directory)
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    return directory
+
+
+def _cpu_eval_copy(module: nn.Module) -> nn.Module:
+    return copy.deepcopy(module).cpu().eval()
+
+
+class _ExportedInference:
+    """Shared manifest handling of the exported backends"""
+
+    name = None
+    format = None
+
+    def __init__(self, directory, num_threads: Optional[int] = None):
+        self.directory = Path(directory)
+        self.num_threads = num_threads
+        with open(self.directory / MANIFEST, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.format not in self.manifest['formats']:
+            raise FileNotFoundError(f"{self.directory} has no {self.format} export")
+
+    def updated(self, system, model_version: Optional[int] = None) -> '_ExportedInference':
+        """Re-export system's weights over this directory and load them"""
+        export_models(system, self.directory, self.manifest['formats'], tuple(self.manifest['input_size']),
+                      model_version=model_version)
+        return type(self)(self.directory, self.num_threads)
+
+    def snapshot(self) -> '_ExportedInference':
+        return self  # artifacts are loaded into memory once; re-exports build a new backend
+
+    def describe(self) -> Dict:
+        return {'backend': self.name, 'threads': self.num_threads, 'directory': str(self.directory),
+                'model_version': self.manifest['model_version']}
+
+
+class OnnxInference(_ExportedInference):
+    """
+    Exported artifacts on ONNX Runtime's CPU execution provider; quantized
+    loads the int8 models written by quantize_models instead
+    """
+
+    name = 'onnx'
+    format = 'onnx'
+
+    def __init__(self, directory, num_threads: Optional[int] = None, quantized=False):
+        super().__init__(directory, num_threads)
+        import onnxruntime as ort
+
+        self.quantized = quantized
+        if quantized:
+            if 'quantization' not in self.manifest:
+                raise FileNotFoundError(f"{self.directory} has no int8 models; "
+                                        f"run: python lola_v2_inference.py quantize <checkpoint> {self.directory}")
+            self.name = 'onnx-int8'
+        suffix = '.int8.onnx' if quantized else '.onnx'
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self.sessions = {
+            part: ort.InferenceSession(str(self.directory / f"{part}{suffix}"), options,
+                                       providers=['CPUExecutionProvider'])
+            for part in PARTS
+        }
+
+    def updated(self, system, model_version: Optional[int] = None) -> 'OnnxInference':
+        if not self.quantized:
+            return super().updated(system, model_version)
+        # Re-export, then re-quantize with the same settings and calibration rasters
+        settings = self.manifest['quantization']
+        images = torch.from_numpy(np.load(self.directory / CALIBRATION).astype(np.float32))
+        export_models(system, self.directory, self.manifest['formats'], tuple(self.manifest['input_size']),
+                      model_version=model_version)
+        quantize_models(system, self.directory, images, mode=settings['mode'],
+                        per_channel=settings['per_channel'])
+        return OnnxInference(self.directory, self.num_threads, quantized=True)
+
+    def describe(self) -> Dict:
+        info = super().describe()
+        if self.quantized:
+            info['quantization'] = {key: self.manifest['quantization'][key] for key in ('mode', 'per_channel')}
+        return info
+
+    def _run(self, part, *inputs):
+        session = self.sessions[part]
+        feeds = {arg.name: value.detach().cpu().numpy() for arg, value in zip(session.get_inputs(), inputs)}
+        return torch.from_numpy(session.run(None, feeds)[0])
+
+    def encode(self, images: torch.Tensor) -> torch.Tensor:
+        return self._run('encoder', images.float())
+
+    def decode(self, latents: torch.Tensor) -> torch.Tensor:
+        return self._run('decoder', latents.float())
+
+    def predict_noise(self, x: torch.Tensor, t: torch.Tensor) -> torch.Tensor:
+        return self._run('denoiser', x.float(), t.long())
+
+
+class TorchScriptInference(_ExportedInference):
+    """Exported TorchScript artifacts, run on CPU under torch.inference_mode"""
+
+    name = 'torchscript'
+    format = 'torchscript'
+
+    def __init__(self, directory, num_threads: Optional[int] = None):
+        super().__init__(directory, num_threads)
+        _set_threads(num_threads)
+        self.modules = {part: torch.jit.load(str(self.directory / f"{part}.pt"), map_location='cpu').eval()
+                        for part in PARTS}
+
+    def _run(self, part, *inputs):
+        with torch.inference_mode():
+            return self.modules[part](*(value.cpu() for value in inputs))
+
+    def encode(self, images: torch.Tensor) -> torch.Tensor:
+        return self._run('encoder', images)
+
+    def decode(self, latents: torch.Tensor) -> torch.Tensor:
+        return self._run('decoder', latents)
+
+    def predict_noise(self, x: torch.Tensor, t: torch.Tensor) -> torch.Tensor:
+        return self._run('denoiser', x, t)
+
+
+class _FeedReader:
+    """
+    onnxruntime CalibrationDataReader over prepared feed dicts, with the
+    len / set_range protocol of strided calibration (CalibStridedMinMax)
+    """
+
+    def __init__(self, feeds: List[Dict]):
+        self.feeds = feeds
+        self.iterator = iter(feeds)
+
+    def __len__(self):
+        return len(self.feeds)
+
+    def get_next(self):
+        return next(self.iterator, None)
+
+    def set_range(self, start_index: int, end_index: int):
+        self.iterator = iter(self.feeds[start_index:end_index])
+
+
+def _part_inputs(system, reference, images: torch.Tensor, batch_size: int):
+    """
+    Per batch of rasters, the inputs each part sees in serving: the
+    rasters, their fp32 mean latents, and those latents noised to random
+    timesteps (fixed seed, so calibration and reports are repeatable)
+    """
+    generator = torch.Generator().manual_seed(0)
+    diffusion = system.diffusion
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size].float()
+        latents = reference.encode(batch)
+        t = torch.randint(0, diffusion.num_steps, (len(batch),), generator=generator)
+        alpha = diffusion.alphas_cumprod.cpu()[t].view(-1, 1, 1, 1)
+        noise = torch.randn(latents.shape, generator=generator)
+        yield batch, latents, alpha.sqrt() * latents + (1 - alpha).sqrt() * noise, t
+
+
+def quantize_models(system, directory, images: torch.Tensor, eval_images: Optional[torch.Tensor] = None,
+                    mode='static', per_channel=False, batch_size=4) -> Dict:
+    """
+    Write int8 copies ({part}.int8.onnx) of the fp32 ONNX export in
+    directory, exporting system first if there is none, and return the
+    drift report (also stored in the manifest under 'quantization')
+        'static'   Conv and Linear: int8 weights, uint8 activations with
+                   ranges calibrated on images (the rasters of stored strokes)
+        'dynamic'  Linear (MatMul / Gemm) only: int8 weights, activations
+                   quantized per call; no calibration
+    eval_images (default: images) are the rasters the drift report runs on.
+    Activation ranges are folded in after every batch: the decoder's full
+    resolution activations of many batches would not fit in memory.
+    """
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    if mode not in QUANT_MODES:
+        raise ValueError(f"mode must be one of {QUANT_MODES}")
+    directory = Path(directory)
+    if not (directory / MANIFEST).exists() or not (directory / "encoder.onnx").exists():
+        export_models(system, directory, ('onnx',))
+
+    reference = OnnxInference(directory)
+    feeds = {part: [] for part in PARTS}
+    for batch, latents, noisy, t in _part_inputs(system, reference, images, batch_size):
+        feeds['encoder'].append({'images': batch.numpy()})
+        feeds['decoder'].append({'latents': latents.numpy()})
+        feeds['denoiser'].append({'latents': noisy.numpy(), 'timesteps': t.numpy()})
+
+    for part in PARTS:
+        prepared = directory / f"{part}.prep.onnx"
+        quant_pre_process(str(directory / f"{part}.onnx"), str(prepared))
+        target = str(directory / f"{part}.int8.onnx")
+        if mode == 'static':
+            quantize_static(str(prepared), target, _FeedReader(feeds[part]), quant_format=QuantFormat.QDQ,
+                            per_channel=per_channel, activation_type=QuantType.QUInt8,
+                            weight_type=QuantType.QInt8, extra_options={'CalibStridedMinMax': 1})
+        else:
+            quantize_dynamic(str(prepared), target, op_types_to_quantize=['MatMul', 'Gemm'],
+                             weight_type=QuantType.QInt8)
+        for leftover in directory.glob(f"{part}.prep.onnx*"):
+            leftover.unlink()
+    np.save(directory / CALIBRATION, images.numpy().astype(np.float16))
+
+    # Record the settings first: the int8 backend refuses to load without them
+    with open(directory / MANIFEST, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest['quantization'] = {'mode': mode, 'per_channel': per_channel,
+                                'calibration_samples': len(images), 'created': time.time()}
+    with open(directory / MANIFEST, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    quantized = OnnxInference(directory, quantized=True)
+    manifest['quantization']['drift'] = drift_report(system, reference, quantized,
+                                                     images if eval_images is None else eval_images, batch_size)
+    with open(directory / MANIFEST, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest['quantization']
+
+
+def _relative_errors(reference: torch.Tensor, other: torch.Tensor) -> torch.Tensor:
+    reference, other = reference.flatten(1), other.flatten(1)
+    return (other - reference).norm(dim=1) / reference.norm(dim=1).clamp_min(1e-12)
+
+
+def drift_report(system, reference, candidate, images: torch.Tensor, batch_size=4, sampling_steps=20) -> Dict:
+    """
+    How far candidate's outputs drift from reference's (e.g. int8 against
+    fp32) on the same inputs: per-sample relative L2 error of each part,
+    encoder latent cosine similarity, and the relative error of whole DDIM
+    suggestions drawn from the same starting noise
+    """
+    errors = {part: [] for part in PARTS + ('suggestion',)}
+    cosines = []
+    generator = torch.Generator().manual_seed(1)
+    for batch, latents, noisy, t in _part_inputs(system, reference, images, batch_size):
+        encoded = candidate.encode(batch)
+        errors['encoder'].append(_relative_errors(latents, encoded))
+        cosines.append(torch.nn.functional.cosine_similarity(latents.flatten(1), encoded.flatten(1), dim=1))
+        errors['decoder'].append(_relative_errors(reference.decode(latents), candidate.decode(latents)))
+        errors['denoiser'].append(_relative_errors(reference.predict_noise(noisy, t), candidate.predict_noise(noisy, t)))
+
+        noise = torch.randn(latents.shape, generator=generator)
+        samples = [system.diffusion.sample_ddim(noise.shape, 'cpu', steps=sampling_steps, noise=noise,
+                                                denoiser=backend.predict_noise).cpu()
+                   for backend in (reference, candidate)]
+        errors['suggestion'].append(_relative_errors(*samples))
+
+    report = {'samples': len(images)}
+    for part, values in errors.items():
+        values = torch.cat(values)
+        report[part] = {'mean_relative_error': values.mean().item(), 'max_relative_error': values.max().item()}
+    cosines = torch.cat(cosines)
+    report['encoder'].update(mean_cosine=cosines.mean().item(), min_cosine=cosines.min().item())
+    return report
+
+
+BACKENDS = {'eager': EagerInference, 'onnx': OnnxInference, 'onnx-int8': OnnxInference,
+            'torchscript': TorchScriptInference}
+
+
+def make_backend(name, system, directory=None, num_threads: Optional[int] = None):
+    """
+    Backend by name for system; the exported ones load directory,
+    exporting system's current weights there first if it has no export yet
+    ('onnx-int8' needs a prior quantize_models: calibration needs data)
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {name!r}; expected one of {sorted(BACKENDS)}")
+    if name == 'eager':
+        return EagerInference(system.vae, system.diffusion, num_threads)
+    directory = Path(directory)
+    if not (directory / MANIFEST).exists():
+        export_models(system, directory)
+    if name == 'onnx-int8':
+        return OnnxInference(directory, num_threads, quantized=True)
+    return BACKENDS[name](directory, num_threads)
+
+
+def main():
+    import argparse
+    from lola_v2_enhanced import LOLAv2IntentSystem, calibration_rasters
+
+    parser = argparse.ArgumentParser(description="Export / quantize LOLA v2 models for inference")
+    parser.add_argument('command', choices=['export', 'quantize'])
+    parser.add_argument('checkpoint', help="lola_v2_models.pth written by save_models")
+    parser.add_argument('directory', nargs='?', default='lola_v2_inference')
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=list(FORMATS))
+    parser.add_argument('--data', default='lola_math_data', help="save_dir whose stored strokes calibrate int8")
+    parser.add_argument('--samples', type=int, default=256, help="strokes to calibrate on (as many again for the report)")
+    parser.add_argument('--mode', choices=QUANT_MODES, default='static')
+    parser.add_argument('--per-channel', action='store_true')
+    args = parser.parse_args()
+
+    checkpoint = torch.load(args.checkpoint, map_location='cpu')
+    system = LOLAv2IntentSystem(compression_factor=checkpoint['compression_factor'],
+                                latent_dim=checkpoint['latent_dim'], device='cpu')
+    system.load_models(args.checkpoint)
+    start = time.time()
+    if args.command == 'export':
+        export_models(system, args.directory, args.formats)
+        print(f"[LOLA v2] Exported {', '.join(args.formats)} to {args.directory} in {time.time() - start:.1f}s")
+        return
+
+    rasters = calibration_rasters(args.data, 2 * args.samples)
+    if rasters is None:
+        raise SystemExit(f"[LOLA v2] No stored strokes in {args.data} to calibrate on")
+    calibration, held_out = rasters[:args.samples], rasters[args.samples:]
+    export_models(system, args.directory, args.formats)
+    result = quantize_models(system, args.directory, calibration, held_out if len(held_out) else None,
+                             mode=args.mode, per_channel=args.per_channel)
+    print(f"[LOLA v2] Quantized ({args.mode}) on {len(calibration)} strokes in {time.time() - start:.1f}s")
+    print(json.dumps(result['drift'], indent=2))
+
+
+if __name__ == '__main__':
+    main()